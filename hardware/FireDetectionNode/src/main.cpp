@@ -26,6 +26,14 @@ unsigned long lastAlertTime = 0;
 const unsigned long ALERT_INTERVAL = 5000;    // Send alert every 5 seconds
 const char* NODE_ID = "ROOM_301_SENSOR";      // 👈 Recommended: Use a fixed ID
 
+// --- Packet Format ---
+// 1 sends the compact binary packet (server/Server-Receiver/wire.py): ~25 bytes instead of ~100,
+// no JSON heap work. Needs a server that understands it; 0 keeps the JSON packet.
+#define COMPACT_PACKETS 0
+#define SENSOR_MAGIC 0xF1
+#define SENSOR_VERSION 1
+#define SENSOR_TYPE_FIRE_ALERT 0
+
 void sendFireAlert(int smokeLevel);
 
 // Function Prototype
@@ -99,6 +107,32 @@ void loop() {
 
 // --- UPDATED Function to Broadcast Alert using ArduinoJson ---
 void sendFireAlert(int smokeLevel) {
+#if COMPACT_PACKETS
+  // Big-endian: magic, version, type, smoke level (u16), threshold (u16), IPv4, ID length, ID
+  uint8_t packet[12 + 32];
+  size_t idLength = strlen(NODE_ID);
+  if (idLength > 32) idLength = 32;
+  IPAddress ip = WiFi.localIP();
+  packet[0] = SENSOR_MAGIC;
+  packet[1] = SENSOR_VERSION;
+  packet[2] = SENSOR_TYPE_FIRE_ALERT;
+  packet[3] = (smokeLevel >> 8) & 0xFF;
+  packet[4] = smokeLevel & 0xFF;
+  packet[5] = (SMOKE_THRESHOLD >> 8) & 0xFF;
+  packet[6] = SMOKE_THRESHOLD & 0xFF;
+  for (int i = 0; i < 4; i++) packet[7 + i] = ip[i];
+  packet[11] = idLength;
+  memcpy(packet + 12, NODE_ID, idLength);
+
+  udp.beginPacket(broadcast_ip, udp_port);
+  udp.write(packet, 12 + idLength);
+  udp.endPacket();
+
+  Serial.println("\n🚨 FIRE ALERT BROADCASTED (compact) 🚨");
+  Serial.print("Smoke level: ");
+  Serial.println(smokeLevel);
+  Serial.println();
+#else
   // Define the memory size needed for the JSON object (5 keys)
   const size_t capacity = JSON_OBJECT_SIZE(5);
   StaticJsonDocument<capacity> doc;
@@ -123,4 +157,5 @@ void sendFireAlert(int smokeLevel) {
   Serial.print("Message: ");
   Serial.println(output);
   Serial.println();
+#endif
 }
\ No newline at end of file
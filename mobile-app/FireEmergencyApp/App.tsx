@@ -63,7 +63,7 @@ function App() {
   const [fcmToken, setFcmToken] = useState(null); 
   const [isNameModalVisible, setIsNameModalVisible] = useState(true);
 
-  const [mapBase64, setMapBase64] = useState(null);
+  const [mapUri, setMapUri] = useState(null);
   const [mapFileName, setMapFileName] = useState(null);
 
   const ws = useRef(null); 
@@ -166,13 +166,13 @@ function App() {
         
         if (type === 'fire_alert') {
             setIsAlertActive(true);
-            setMapBase64(null);
+            setMapUri(null);
             setAlertMessage(message || 'FIRE DETECTED!');
             startSiren();
             Alert.alert('🚨 FCM ALERT', message);
         } else if (type === 'clear_alert') {
             setIsAlertActive(false);
-            setMapBase64(null);
+            setMapUri(null);
             setAlertMessage('Alert cleared. Proceed with caution.');
             stopSiren();
             Alert.alert('✅ FCM ALL CLEAR', message);
@@ -196,7 +196,7 @@ function App() {
       case 'fire_alert':
         if (isAlertActive) return; // Ignore if already active from FCM
         setIsAlertActive(true);
-        setMapBase64(null); 
+        setMapUri(null); 
         setAlertMessage(data.message || 'FIRE DETECTED! EVACUATE IMMEDIATELY');
         startSiren(); 
         Alert.alert('🚨 WS ALERT', data.message); // Show WS alert type
@@ -205,15 +205,16 @@ function App() {
       case 'clear_alert':
         if (!isAlertActive) return;
         setIsAlertActive(false);
-        setMapBase64(null); 
+        setMapUri(null); 
         setAlertMessage('Alert cleared. Proceed with caution.');
         stopSiren(); 
         Alert.alert('✅ WS ALL CLEAR', data.message);
         break;
         
       case 'broadcast':
-        if (data.map_data) {
-            setMapBase64(data.map_data); 
+        if (data.map_url || data.map_data) {
+            // Maps are served by content hash; the Image cache reuses a plan it already has
+            setMapUri(data.map_url ? `http://${SERVER_IP}:8080${data.map_url}` : data.map_data); 
             setMapFileName(data.map_filename);
             Alert.alert('🗺️ Map Received', data.message);
         } else {
@@ -311,12 +312,12 @@ function App() {
         </>
       )}
       
-      {mapBase64 && (
+      {mapUri && (
         <View style={styles.mapContainer}>
           <Text style={styles.mapTitle}>🗺️ Evacuation Map: {mapFileName}</Text>
           <Image
             style={styles.mapImage}
-            source={{ uri: mapBase64 }}
+            source={{ uri: mapUri }}
             resizeMode="contain"
           />
         </View>
@@ -204,10 +204,10 @@ function handleAllClear(message) {
 function handleBroadcast(data) {
     const message = data.message || '';
     
-    // Display map if available
-    if (data.map_data) {
+    // Display map if available (served by content hash, so it is cached after the first load)
+    if (data.map_url || data.map_data) {
         const filename = data.map_filename || 'Evacuation Map';
-        displayMap(data.map_data);
+        displayMap(data.map_url ? `http://${SERVER_IP}:8080${data.map_url}` : data.map_data, data.map_hash);
         updateStatus(`🗺️ New Evacuation Route: ${filename}`, false);
     }
 
@@ -260,8 +260,12 @@ function updateStatus(message, isAlert) {
     statusMessage.className = isAlert ? 'status-message alert' : 'status-message';
 }
 
-function displayMap(base64Data) {
-    mapDisplay.innerHTML = `<img src="${base64Data}" alt="Evacuation Map">`;
+let currentMapHash = null;
+
+function displayMap(src, mapHash) {
+    if (mapHash && mapHash === currentMapHash) return;
+    currentMapHash = mapHash || null;
+    mapDisplay.innerHTML = `<img src="${src}" alt="Evacuation Map">`;
 }
 
 // Siren functions 
@@ -0,0 +1,119 @@
+import asyncio
+import os
+from collections import deque
+
+from occupants import EVENT_REMOVE, STATUS_UNKNOWN
+
+DEFAULT_TICK = 0.1          # Seconds of changes coalesced into one delta frame
+DEFAULT_REPLAY_SIZE = 2048  # Delta frames kept for resuming admins
+
+
+class AdminStatusStream:
+    """Versioned snapshot-plus-delta feed of occupant status for admin dashboards.
+
+    Admins get one `status_update` snapshot stamped with the stream ID and
+    sequence number, then `status_delta` frames carrying only upserts and
+    removes. Changes landing within one tick are coalesced per occupant into a
+    single frame. The last `replay_size` deltas are kept so a reconnecting
+    admin can resume from its last sequence instead of taking a new snapshot.
+    """
+
+    def __init__(self, registry, publish, state, tick=DEFAULT_TICK, replay_size=DEFAULT_REPLAY_SIZE):
+        self.registry = registry
+        self.publish = publish          # callable(frame) that fans a frame out to admins
+        self.state = state              # callable() -> {'alert_active': ..., 'connected_clients': ...}
+        self.tick = tick
+        self.stream_id = os.urandom(4).hex()  # Changes on restart, forcing a fresh snapshot
+        self.seq = 0
+        self.frames_sent = 0
+        self._log = deque(maxlen=replay_size)
+        self._pending = {}              # stable_id -> status entry, or None for a remove
+        self._dirty = False
+        self._flush_handle = None
+        registry.subscribe(self._on_occupant_event)
+
+    def _on_occupant_event(self, event, occupant):
+        if event == EVENT_REMOVE:
+            self._pending[occupant.stable_id] = None
+        elif occupant.status != STATUS_UNKNOWN:
+            self._pending[occupant.stable_id] = occupant.to_status()
+        else:
+            return  # Registered but nothing to show yet
+        self._schedule()
+
+    def mark_dirty(self):
+        """Connection count or alarm state changed; send a (possibly empty) delta next tick."""
+        self._dirty = True
+        self._schedule()
+
+    def _schedule(self):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.tick, self.flush)
+
+    def flush(self):
+        """Emit everything that changed since the last tick as one delta frame."""
+        self._flush_handle = None
+        if not self._pending and not self._dirty:
+            return None
+
+        upserts = {}
+        removes = []
+        for stable_id, entry in self._pending.items():
+            if entry is None:
+                removes.append(stable_id)
+            else:
+                upserts[stable_id] = entry
+        self._pending = {}
+        self._dirty = False
+
+        self.seq += 1
+        frame = {
+            'type': 'status_delta',
+            'stream': self.stream_id,
+            'seq': self.seq,
+            'prev': self.seq - 1,
+            'upserts': upserts,
+            'removes': removes,
+            **self.state()
+        }
+        self._log.append(frame)
+        self.frames_sent += 1
+        self.publish(frame)
+        return frame
+
+    def snapshot(self):
+        """Full state at the current sequence number."""
+        return {
+            'type': 'status_update',
+            'stream': self.stream_id,
+            'seq': self.seq,
+            'user_status': self.registry.user_status(),
+            **self.state()
+        }
+
+    def handshake(self, stream_id=None, since=None):
+        """Frames to send a newly connected admin: a replay if it can resume, else a snapshot."""
+        if stream_id == self.stream_id and since is not None and 0 <= since <= self.seq:
+            if since == self.seq:
+                missed = []
+            elif self._log and self._log[0]['seq'] <= since + 1:
+                missed = [frame for frame in self._log if frame['seq'] > since]
+            else:
+                missed = None  # Fell off the replay log
+            if missed is not None:
+                return missed + [{
+                    'type': 'resumed',
+                    'stream': self.stream_id,
+                    'seq': self.seq,
+                    **self.state()
+                }]
+        return [self.snapshot()]
+
+    def stats(self):
+        return {
+            'stream': self.stream_id,
+            'seq': self.seq,
+            'frames_sent': self.frames_sent,
+            'replay_log': len(self._log),
+            'pending': len(self._pending)
+        }
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+# Frames that are never shed, rate limited or dropped from a full socket queue ahead of anything else
+PRIORITY_TYPES = frozenset(('fire_alert', 'clear_alert'))
+
+MAX_KEYS = 65536          # Per-IP buckets remembered (least recently used go first)
+SHED_CHECK = 0.5          # Seconds between overload checks
+SHED_LAG = 0.25           # Event-loop lag (s) above which non-alarm work is shed
+SHED_QUEUED = 200000      # Frames waiting in socket queues above which non-alarm work is shed
+
+
+class IngressLimits:
+    """Every knob in one place; a rate or cap of 0 turns that check off."""
+
+    def __init__(self, max_connections=20000, max_per_ip=64,
+                 connect_rate=5.0, connect_burst=30,
+                 api_rate=10.0, api_burst=30,
+                 admin_rate=1.0, admin_burst=10,
+                 alarm_rate=1.0, alarm_burst=5,
+                 message_rate=10.0, message_burst=30, abuse_limit=200,
+                 status_rate=1.0, status_burst=3,
+                 max_client_frame=4096, max_admin_frame=4 * 1024 * 1024):
+        self.max_connections = max_connections    # Sockets per worker
+        self.max_per_ip = max_per_ip              # Sockets per remote address
+        self.connect_rate = connect_rate          # WebSocket upgrades per IP per second
+        self.connect_burst = connect_burst
+        self.api_rate = api_rate                  # /api requests per IP per second
+        self.api_burst = api_burst
+        self.admin_rate = admin_rate              # Admin writes (broadcast, login, maps) per IP per second
+        self.admin_burst = admin_burst
+        self.alarm_rate = alarm_rate              # Trigger/clear per IP per second (own bucket, never shed)
+        self.alarm_burst = alarm_burst
+        self.message_rate = message_rate          # WebSocket messages per socket per second
+        self.message_burst = message_burst
+        self.abuse_limit = abuse_limit            # Messages dropped in a row before a socket is closed
+        self.status_rate = status_rate            # status_update applied per socket per second; the rest coalesce
+        self.status_burst = status_burst
+        self.max_client_frame = max_client_frame  # Bytes; larger frames close the socket (1009)
+        self.max_admin_frame = max_admin_frame    # Older dashboards still send maps inline
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `burst` saved up; a rate of 0 never limits."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp')
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic() if now is None else now
+
+    def take(self, cost=1, now=None):
+        if not self.rate:
+            return True
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def wait_time(self, cost=1):
+        """Seconds until `cost` tokens are available (as of the last take)."""
+        if not self.rate:
+            return 0.0
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+
+class KeyedLimiter:
+    """One TokenBucket per key (e.g. remote IP), forgetting the least recently used beyond `max_keys`."""
+
+    def __init__(self, name, rate, burst, max_keys=MAX_KEYS):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+
+    def allow(self, key, cost=1):
+        if not self.rate:
+            return True
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        if bucket.take(cost):
+            self.allowed += 1
+            return True
+        self.limited += 1
+        return False
+
+    def retry_after(self, key):
+        bucket = self._buckets.get(key)
+        return bucket.wait_time() if bucket is not None else 0.0
+
+    def stats(self):
+        return {'rate': self.rate, 'burst': self.burst, 'keys': len(self._buckets),
+                'allowed': self.allowed, 'limited': self.limited}
+
+
+class ConnectionAdmission:
+    """Caps on open sockets, in total and per remote address."""
+
+    def __init__(self, max_connections, max_per_ip):
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.open = 0
+        self._per_ip = {}
+        self.rejected = 0
+
+    def admit(self, ip):
+        """Count the connection in and return None, or return why it was refused."""
+        if self.max_connections and self.open >= self.max_connections:
+            self.rejected += 1
+            return 'server full'
+        if self.max_per_ip and self._per_ip.get(ip, 0) >= self.max_per_ip:
+            self.rejected += 1
+            return 'too many connections from this address'
+        self.open += 1
+        self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+        return None
+
+    def release(self, ip):
+        self.open -= 1
+        count = self._per_ip.get(ip, 0) - 1
+        if count > 0:
+            self._per_ip[ip] = count
+        else:
+            self._per_ip.pop(ip, None)
+
+    def stats(self):
+        return {'open': self.open, 'max_connections': self.max_connections, 'max_per_ip': self.max_per_ip,
+                'addresses': len(self._per_ip), 'rejected': self.rejected}
+
+
+class StatusCoalescer:
+    """Applies at most `rate` updates per key per second; in between only the latest one is kept.
+
+    `offer(key, value)` applies at once while the key's bucket has tokens.
+    Past that the value is parked, overwriting any parked before it, and
+    applied when the next token is due, so a client spamming status
+    changes costs one applied update per interval however fast it sends.
+    `flush(key)` applies a parked value immediately (on disconnect: the
+    latest status must not be lost).
+    """
+
+    def __init__(self, apply, rate, burst):
+        self.apply = apply          # callable(key, value)
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._pending = {}          # key -> latest value not yet applied
+        self._timers = {}
+        self.applied = 0
+        self.coalesced = 0
+
+    def offer(self, key, value, defer=False):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+        if not defer and key not in self._pending and bucket.take():
+            self._apply(key, value)
+            return True
+        if key in self._pending:
+            self.coalesced += 1     # Superseded before it was applied
+        self._pending[key] = value
+        if key not in self._timers:
+            delay = max(bucket.wait_time(), 1.0 / self.rate if self.rate else 0.0)
+            self._timers[key] = asyncio.get_running_loop().call_later(delay, self._due, key)
+        return False
+
+    def _due(self, key):
+        self._timers.pop(key, None)
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.take()
+        if key in self._pending:
+            self._apply(key, self._pending.pop(key))
+
+    def _apply(self, key, value):
+        self.applied += 1
+        try:
+            self.apply(key, value)
+        except Exception:
+            log.exception("⚠️ Coalesced update for %s failed", key)
+
+    def flush(self, key):
+        """Apply anything parked for `key` now and forget it."""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self._buckets.pop(key, None)
+        if key in self._pending:
+            self._apply(key, self._pending.pop(key))
+
+    def stats(self):
+        return {'rate': self.rate, 'burst': self.burst, 'applied': self.applied,
+                'coalesced': self.coalesced, 'pending': len(self._pending)}
+
+
+class LoadShedder:
+    """Decides, twice a second, whether the server is overloaded and should shed non-alarm work.
+
+    Overloaded means the event loop is running late or socket queues are
+    backing up. It stays on until both fall below half their thresholds, so
+    shedding does not flap. While on, new client sockets and non-alarm admin
+    writes are refused and status updates are all coalesced; alarms are
+    never shed.
+    """
+
+    def __init__(self, lag, queued, max_lag=SHED_LAG, max_queued=SHED_QUEUED, interval=SHED_CHECK):
+        self.lag = lag              # callable() -> recent event-loop lag, seconds
+        self.queued = queued        # callable() -> frames waiting in socket queues
+        self.max_lag = max_lag
+        self.max_queued = max_queued
+        self.interval = interval
+        self.shedding = False
+        self.episodes = 0
+        self.shed = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None and (self.max_lag or self.max_queued):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                log.exception("Overload check failed")
+
+    def check(self):
+        lag, queued = self.lag(), self.queued()
+        if not self.shedding:
+            if (self.max_lag and lag > self.max_lag) or (self.max_queued and queued > self.max_queued):
+                self.shedding = True
+                self.episodes += 1
+                log.warning("🛑 Overloaded (loop lag %.0f ms, %d queued frames): shedding non-alarm work",
+                            lag * 1000, queued)
+        elif lag <= self.max_lag / 2 and queued <= self.max_queued / 2:
+            self.shedding = False
+            log.info("✓ Load back to normal after shedding %d request(s)", self.shed)
+        return self.shedding
+
+    def refuse(self):
+        """True (and counted) if a sheddable request should be turned away now."""
+        if self.shedding:
+            self.shed += 1
+        return self.shedding
+
+    def stats(self):
+        return {'shedding': self.shedding, 'episodes': self.episodes, 'shed': self.shed,
+                'max_lag_ms': self.max_lag * 1000, 'max_queued': self.max_queued}
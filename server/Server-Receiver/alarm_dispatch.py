@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+
+from metrics import Histogram
+
+DEFAULT_HISTORY = 100    # Alarm timelines kept for /api/alarms
+
+CHANNEL_OK = 'ok'
+CHANNEL_TIMEOUT = 'timeout'
+CHANNEL_CANCELLED = 'cancelled'
+CHANNEL_ERROR = 'error'
+
+
+class ChannelRun:
+    """One delivery channel of one alarm: when it started, when it ended and how."""
+
+    __slots__ = ('name', 'deadline', 'started_at', 'finished_at', 'status', 'detail', 'task')
+
+    def __init__(self, name, deadline):
+        self.name = name
+        self.deadline = deadline
+        self.started_at = None
+        self.finished_at = None
+        self.status = None
+        self.detail = None
+        self.task = None
+
+
+class AlarmTimeline:
+    """Everything that happened to one alarm, on the perf_counter() clock.
+
+    `origin` is when the alarm really began (the sensor packet's arrival, or
+    the admin request); `dispatched_at` is when channels were started. All
+    offsets in `to_dict` are milliseconds since `origin`.
+    """
+
+    def __init__(self, alarm_id, kind, origin, info=None):
+        self.alarm_id = alarm_id
+        self.kind = kind
+        self.info = info or {}
+        self.dispatched_at = time.perf_counter()
+        self.origin = origin if origin is not None else self.dispatched_at
+        self.wall_origin = time.time() - (self.dispatched_at - self.origin)
+        self.channels = OrderedDict()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def offset_ms(self, at):
+        return None if at is None else round((at - self.origin) * 1000, 2)
+
+    def to_dict(self):
+        finished = [run.finished_at for run in self.channels.values() if run.status == CHANNEL_OK]
+        return {
+            'alarm_id': self.alarm_id,
+            'kind': self.kind,
+            'info': self.info,
+            'origin': round(self.wall_origin, 3),
+            'dispatched_ms': self.offset_ms(self.dispatched_at),
+            'first_notified_ms': self.offset_ms(min(finished)) if finished else None,
+            'completed_ms': self.offset_ms(self.finished_at),
+            'channels': {
+                run.name: {
+                    'status': run.status or 'running',
+                    'deadline_s': run.deadline,
+                    'started_ms': self.offset_ms(run.started_at),
+                    'finished_ms': self.offset_ms(run.finished_at),
+                    'detail': run.detail
+                }
+                for run in self.channels.values()
+            }
+        }
+
+
+class AlarmDispatcher:
+    """Starts every delivery channel of an alarm at once and records its timeline.
+
+    A channel is a zero-argument coroutine function returning a small detail
+    dict (counts, errors). Each runs as its own task under its own deadline,
+    so a slow FCM batch never holds back the WebSocket fan-out or vice versa.
+    `cancel` stops whatever an earlier alarm still has in flight, e.g. fire
+    pushes still retrying when the all-clear goes out.
+    """
+
+    def __init__(self, history=DEFAULT_HISTORY):
+        self._ids = itertools.count(1)
+        self._history = OrderedDict()   # alarm_id -> AlarmTimeline, oldest first
+        self.history_size = history
+        self.dispatched = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.delivery_histograms = {}   # channel name -> Histogram of origin-to-delivered seconds
+
+    async def dispatch(self, kind, channels, origin=None, info=None):
+        """Run `channels` ({name: (coroutine_fn, deadline_seconds)}) concurrently; returns the timeline."""
+        timeline = AlarmTimeline(f"{kind}-{next(self._ids)}", kind, origin, info)
+        self._remember(timeline)
+        self.dispatched += 1
+
+        loop = asyncio.get_running_loop()
+        runs = []
+        for name, (channel, deadline) in channels.items():
+            run = ChannelRun(name, deadline)
+            timeline.channels[name] = run
+            run.started_at = time.perf_counter()
+            run.task = loop.create_task(self._run_channel(run, channel))
+            runs.append(run)
+
+        if runs:
+            await asyncio.wait([run.task for run in runs])
+        timeline.finished_at = time.perf_counter()
+        for run in runs:
+            run.task = None
+            if run.status is None:
+                # Cancelled before its task got to start, so _run_channel never ran
+                run.status, run.finished_at = CHANNEL_CANCELLED, timeline.finished_at
+                self.cancelled += 1
+            if run.status == CHANNEL_OK:
+                histogram = self.delivery_histograms.get(run.name)
+                if histogram is None:
+                    histogram = self.delivery_histograms[run.name] = Histogram()
+                histogram.observe(run.finished_at - timeline.origin)
+        return timeline
+
+    async def _run_channel(self, run, channel):
+        try:
+            run.detail = await asyncio.wait_for(channel(), run.deadline)
+            run.status = CHANNEL_OK
+        except asyncio.TimeoutError:
+            run.status = CHANNEL_TIMEOUT
+            self.timeouts += 1
+        except asyncio.CancelledError:
+            run.status = CHANNEL_CANCELLED
+            self.cancelled += 1
+        except Exception as e:
+            run.status = CHANNEL_ERROR
+            run.detail = {'error': str(e)}
+        finally:
+            run.finished_at = time.perf_counter()
+
+    def cancel(self, alarm_id=None, kind=None):
+        """Cancel in-flight channels of one alarm, or of every unfinished alarm (optionally of one kind)."""
+        count = 0
+        for timeline in self._history.values():
+            if timeline.done or (alarm_id is not None and timeline.alarm_id != alarm_id):
+                continue
+            if kind is not None and timeline.kind != kind:
+                continue
+            for run in timeline.channels.values():
+                if run.task is not None and not run.task.done():
+                    run.task.cancel()
+                    count += 1
+        return count
+
+    def _remember(self, timeline):
+        self._history[timeline.alarm_id] = timeline
+        while len(self._history) > self.history_size:
+            self._history.popitem(last=False)
+
+    def get(self, alarm_id):
+        return self._history.get(alarm_id)
+
+    def recent(self, limit=20):
+        """Newest first."""
+        return list(itertools.islice(reversed(self._history.values()), limit))
+
+    def stats(self):
+        return {
+            'dispatched': self.dispatched,
+            'timeouts': self.timeouts,
+            'cancelled': self.cancelled,
+            'in_flight': sum(1 for timeline in self._history.values() if not timeline.done),
+            'history': len(self._history)
+        }
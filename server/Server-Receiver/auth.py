@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+# Passwords are stored as 'pbkdf2_sha256$<iterations>$<salt>$<hash>'; `python auth.py <username>` makes one
+ALGORITHM = 'pbkdf2_sha256'
+ITERATIONS = 600000          # OWASP 2023 guidance for PBKDF2-SHA256
+SALT_BYTES = 16
+TOKEN_TTL = 12 * 3600.0      # Seconds a login lasts: one shift
+HASH_WORKERS = 2             # Threads verifying passwords; more logins than this wait their turn
+# Browsers cannot set headers on a WebSocket, so the dashboard offers its token as an extra
+# subprotocol. Unlike a ?token= query it stays out of access logs, which record the request line.
+TOKEN_PROTOCOL = 'fire.token.'
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def hash_password(password, iterations=ITERATIONS, salt=None):
+    salt = salt or os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f'{ALGORITHM}${iterations}${_b64encode(salt)}${_b64encode(digest)}'
+
+
+def verify_password(password, encoded):
+    """True if `password` matches an encoded hash (constant-time comparison)."""
+    try:
+        algorithm, iterations, salt, expected = encoded.split('$')
+        if algorithm != ALGORITHM:
+            return False
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), _b64decode(salt), int(iterations))
+        return hmac.compare_digest(digest, _b64decode(expected))
+    except (ValueError, AttributeError):
+        return False
+
+
+def token_from_protocols(header):
+    """The token offered as a 'fire.token.<token>' WebSocket subprotocol, or None."""
+    for protocol in (header or '').split(','):
+        protocol = protocol.strip()
+        if protocol.startswith(TOKEN_PROTOCOL):
+            return protocol[len(TOKEN_PROTOCOL):]
+    return None
+
+
+class TokenSigner:
+    """Issues and checks '<payload>.<signature>' tokens, where the payload is 'username:expiry'.
+
+    Verification is one HMAC-SHA256 over a few dozen bytes plus a
+    constant-time compare (a few microseconds). Changing the secret
+    (e.g. restarting without --auth-secret) logs everyone out.
+    """
+
+    def __init__(self, secret, ttl=TOKEN_TTL):
+        self._key = secret if isinstance(secret, bytes) else secret.encode('utf-8')
+        self.ttl = ttl
+        self.issued = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    def _sign(self, payload):
+        return hmac.new(self._key, payload, hashlib.sha256).digest()
+
+    def issue(self, username, now=None):
+        """A token for `username` and the Unix time it expires."""
+        expires = int((time.time() if now is None else now) + self.ttl)
+        payload = f'{username}:{expires}'.encode('utf-8')
+        self.issued += 1
+        return f'{_b64encode(payload)}.{_b64encode(self._sign(payload))}', expires
+
+    def verify(self, token, now=None):
+        """The username a valid, unexpired token was issued to, else None."""
+        try:
+            encoded, signature = token.split('.')
+            payload = _b64decode(encoded)
+            if not hmac.compare_digest(_b64decode(signature), self._sign(payload)):
+                raise ValueError('bad signature')
+            username, expires = payload.decode('utf-8').rsplit(':', 1)
+            if int(expires) < (time.time() if now is None else now):
+                raise ValueError('expired')
+        except (ValueError, AttributeError):
+            self.rejected += 1
+            return None
+        self.accepted += 1
+        return username
+
+    def stats(self):
+        return {'ttl_s': self.ttl, 'issued': self.issued, 'accepted': self.accepted, 'rejected': self.rejected}
+
+
+class CredentialStore:
+    """Admin accounts as {username: encoded hash}.
+
+    Each check is ~0.3 s of PBKDF2, run on a small thread pool of its own so
+    a burst of logins neither stalls the event loop nor queues up behind
+    (or in front of) journal and map-store work on the default executor.
+    """
+
+    def __init__(self, accounts, workers=HASH_WORKERS):
+        self.accounts = dict(accounts)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='auth')
+        # Unknown usernames are checked against this, so they take as long as known ones
+        self._decoy = f'{ALGORITHM}${ITERATIONS}${_b64encode(os.urandom(SALT_BYTES))}${_b64encode(os.urandom(32))}'
+        self.logins = 0
+        self.failures = 0
+
+    @classmethod
+    def load(cls, path, defaults):
+        """Accounts from a JSON file if it exists, else `defaults`."""
+        if not path or not os.path.exists(path):
+            return cls(defaults)
+        with open(path, encoding='utf-8') as f:
+            accounts = json.load(f)
+        log.info("✓ Loaded %d admin account(s) from %s", len(accounts), path)
+        return cls(accounts)
+
+    async def check(self, username, password):
+        """True if the username exists and the password matches."""
+        if not isinstance(username, str) or not isinstance(password, str):
+            self.failures += 1
+            return False
+        encoded = self.accounts.get(username, self._decoy)
+        ok = await asyncio.get_running_loop().run_in_executor(self._executor, verify_password, password, encoded)
+        ok = ok and username in self.accounts
+        if ok:
+            self.logins += 1
+        else:
+            self.failures += 1
+        return ok
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        return {'accounts': len(self.accounts), 'logins': self.logins, 'failures': self.failures}
+
+
+if __name__ == '__main__':
+    import getpass
+    import sys
+
+    if len(sys.argv) != 2:
+        sys.exit('usage: python auth.py <username>')
+    print(json.dumps({sys.argv[1]: hash_password(getpass.getpass('Password: '))}))
@@ -0,0 +1,250 @@
+import abc
+import asyncio
+import json
+import logging
+import struct
+
+from payloads import dumps
+
+log = logging.getLogger(__name__)
+
+# Topics workers exchange
+TOPIC_CLIENTS = 'clients'        # Broadcast to every client socket
+TOPIC_ADMINS = 'admins'          # Broadcast to every admin socket
+TOPIC_ALARM = 'alarm'            # alert_active changed
+TOPIC_OCCUPANT = 'occupant'      # Occupant registered / status changed / removed
+TOPIC_TOKEN = 'token'            # FCM token reported unregistered
+TOPIC_PRESENCE = 'presence'      # A worker's connected-socket count
+TOPIC_HELLO = 'hello'            # A worker (re)joined and wants everyone's state
+
+_HEADER = struct.Struct('!I')    # Frame length prefix
+MAX_FRAME = 16 * 1024 * 1024
+PEER_BUFFER_LIMIT = 8 * 1024 * 1024  # Hub drops a worker whose unsent backlog grows past this
+RECONNECT_DELAY = 0.5
+
+
+class Backplane(abc.ABC):
+    """Pub/sub between the workers of one deployment.
+
+    `publish(topic, message)` reaches every *other* worker; the publisher
+    applies its own change locally. Subscribers are called on the event
+    loop as callback(topic, message, worker_id). Messages are JSON-able
+    dicts. A single-process server uses LocalBackplane with no peers, which
+    makes publishing a no-op. Subclasses implement `publish`.
+    """
+
+    def __init__(self, worker_id=0):
+        self.worker_id = worker_id
+        self._subscribers = []
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def _deliver(self, topic, message, worker_id):
+        self.received += 1
+        for callback in self._subscribers:
+            try:
+                callback(topic, message, worker_id)
+            except Exception:
+                log.exception("⚠️ Backplane subscriber failed on %s", topic)
+
+    async def start(self):
+        return self
+
+    @abc.abstractmethod
+    def publish(self, topic, message):
+        """Send `message` on `topic` to every other worker, without waiting."""
+
+    async def close(self):
+        pass
+
+    @property
+    def peers(self):
+        return 0
+
+    def stats(self):
+        return {
+            'backend': type(self).__name__,
+            'worker_id': self.worker_id,
+            'peers': self.peers,
+            'published': self.published,
+            'received': self.received,
+            'dropped': self.dropped
+        }
+
+
+class LocalHub:
+    """Connects LocalBackplanes living in the same process (tests, benchmarks, single worker)."""
+
+    def __init__(self):
+        self.members = []
+
+
+class LocalBackplane(Backplane):
+    """In-process backplane; messages are handed over on the next loop iteration."""
+
+    def __init__(self, worker_id=0, hub=None):
+        super().__init__(worker_id)
+        self.hub = hub if hub is not None else LocalHub()
+        self.hub.members.append(self)
+
+    def publish(self, topic, message):
+        self.published += 1
+        loop = None
+        for member in self.hub.members:
+            if member is self:
+                continue
+            loop = loop or asyncio.get_running_loop()
+            loop.call_soon(member._deliver, topic, message, self.worker_id)
+
+    async def close(self):
+        if self in self.hub.members:
+            self.hub.members.remove(self)
+
+    @property
+    def peers(self):
+        return len(self.hub.members) - 1
+
+
+def encode_frame(topic, message, worker_id):
+    body = dumps({'t': topic, 'w': worker_id, 'm': message})
+    return _HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f'backplane frame of {length} bytes exceeds {MAX_FRAME}')
+    return await reader.readexactly(length)
+
+
+class BackplaneHub:
+    """Relay run by the supervisor: every frame a worker sends goes to all other workers.
+
+    Listens on a Unix domain socket, so workers on one host need no outside
+    broker. Frames are relayed as opaque bytes without being parsed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._server = None
+        self._writers = set()
+        self._handlers = set()
+        self.relayed = 0
+        self.dropped_peers = 0
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        return self
+
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                body = await read_frame(reader)
+                frame = _HEADER.pack(len(body)) + body
+                for peer in list(self._writers):
+                    if peer is writer:
+                        continue
+                    if peer.transport.get_write_buffer_size() > PEER_BUFFER_LIMIT:
+                        # A wedged worker must not make the hub buffer without bound
+                        self.dropped_peers += 1
+                        self._writers.discard(peer)
+                        peer.close()
+                        continue
+                    peer.write(frame)
+                self.relayed += 1
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        # Let per-worker handlers see EOF and exit rather than being cancelled mid-read
+        if self._handlers:
+            await asyncio.wait(list(self._handlers), timeout=1.0)
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    def stats(self):
+        return {'workers': len(self._writers), 'relayed': self.relayed, 'dropped_peers': self.dropped_peers}
+
+
+class SocketBackplane(Backplane):
+    """Worker side of BackplaneHub: a Unix socket connection that reconnects on loss.
+
+    Publishing never waits; frames published while the hub is unreachable
+    are counted as dropped. After every (re)connect a TOPIC_HELLO goes out so
+    peers re-announce their state.
+    """
+
+    def __init__(self, path, worker_id=0):
+        super().__init__(worker_id)
+        self.path = path
+        self._writer = None
+        self._task = None
+        self._connected = None
+        self.reconnects = 0
+
+    async def start(self):
+        self._connected = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        await self._connected.wait()
+        return self
+
+    async def _run(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            self._writer = writer
+            self._connected.set()
+            self.publish(TOPIC_HELLO, {})
+            try:
+                while True:
+                    frame = json.loads(await read_frame(reader))
+                    self._deliver(frame['t'], frame['m'], frame['w'])
+            except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                pass
+            finally:
+                self._writer = None
+                writer.close()
+            self.reconnects += 1
+            log.warning("⚠️ Worker %s lost the backplane hub, reconnecting...", self.worker_id)
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def publish(self, topic, message):
+        if self._writer is None or self._writer.is_closing():
+            self.dropped += 1
+            return
+        self._writer.write(encode_frame(topic, message, self.worker_id))
+        self.published += 1
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    @property
+    def peers(self):
+        return None  # Only the hub knows
+
+    def stats(self):
+        stats = super().stats()
+        stats['connected'] = self._writer is not None
+        stats['reconnects'] = self.reconnects
+        return stats
@@ -0,0 +1,131 @@
+"""Cost of admin authentication: token checks, the auth middleware, and login bursts.
+
+Token issue/verify are timed in isolation. The middleware is timed on the
+real server's handler chain with mocked requests, against calling the
+handler directly, so the number is what auth adds to each admin request.
+Logins are raised in a burst while a probe measures event-loop lag, once
+with PBKDF2 on the auth thread pool and once inline (the naive way).
+
+Run from server/Server-Receiver:  python benchmarks/bench_auth.py [--requests 20000 --logins 8]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import make_mocked_request  # noqa: E402
+
+from auth import CredentialStore, TokenSigner, hash_password, verify_password  # noqa: E402
+
+LAG_INTERVAL = 0.005
+
+
+def per_op(label, count, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34}{elapsed * 1e6 / count:>10.2f} µs/op   ({count} ops, {elapsed * 1000:.1f} ms)")
+    return elapsed / count
+
+
+async def per_op_async(label, count, make_coro):
+    start = time.perf_counter()
+    for _ in range(count):
+        await make_coro()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34}{elapsed * 1e6 / count:>10.2f} µs/op   ({count} ops, {elapsed * 1000:.1f} ms)")
+    return elapsed / count
+
+
+async def bench_middleware(count):
+    from fake_fcm import FakeFcmClient, install_fake_firebase
+    install_fake_firebase()
+    import server
+
+    instance = server.FireEmergencyServer(journal=False, ingest_udp=False, fcm_client=FakeFcmClient(),
+                                          map_dir=tempfile.mkdtemp())
+    token, _ = instance.tokens.issue('admin1')
+
+    async def handler(request):
+        return web.Response()
+
+    guarded = make_mocked_request('GET', '/api/admin/session', headers={'Authorization': f'Bearer {token}'})
+    forged = make_mocked_request('GET', '/api/admin/session', headers={'Authorization': f'Bearer {token[:-2]}xx'})
+    open_route = make_mocked_request('GET', '/api/status')
+
+    base = await per_op_async('handler alone', count, lambda: handler(guarded))
+    await per_op_async('auth middleware, open route', count, lambda: instance.auth_middleware(open_route, handler))
+    valid = await per_op_async('auth middleware, valid token', count, lambda: instance.auth_middleware(guarded, handler))
+    await per_op_async('auth middleware, forged token', count, lambda: instance.auth_middleware(forged, handler))
+    print(f"→ auth adds {(valid - base) * 1e6:.2f} µs per admin request")
+    instance.credentials.close()
+
+
+async def lag_during(label, logins, login):
+    """Run `logins` concurrent logins; report wall time and the worst event-loop lag meanwhile."""
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    done = False
+
+    async def probe():
+        nonlocal worst
+        while not done:
+            expected = loop.time() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            worst = max(worst, loop.time() - expected)
+
+    probe_task = loop.create_task(probe())
+    await asyncio.sleep(LAG_INTERVAL * 2)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    done = True
+    await probe_task
+    print(f"{label:<34}{elapsed:>8.2f} s for {logins} logins, {sum(results)} ok, "
+          f"worst loop lag {worst * 1000:.1f} ms")
+
+
+async def bench_logins(logins):
+    encoded = hash_password('correct horse')
+    store = CredentialStore({'admin': encoded})
+
+    async def pooled():
+        return await store.check('admin', 'correct horse')
+
+    async def inline():
+        return verify_password('correct horse', encoded)
+
+    await lag_during('login burst, auth thread pool', logins, pooled)
+    await lag_during('login burst, inline on the loop', logins, inline)
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--logins', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU(s)\n")
+    signer = TokenSigner(os.urandom(32))
+    token, _ = signer.issue('admin1')
+    count = args.requests
+    per_op('issue token', count, lambda: [signer.issue('admin1') for _ in range(count)])
+    per_op('verify token', count, lambda: [signer.verify(token) for _ in range(count)])
+    per_op('verify forged token', count, lambda: [signer.verify(token[:-2] + 'xx') for _ in range(count)])
+    encoded = hash_password('x')
+    per_op('verify password (PBKDF2)', 3, lambda: [verify_password('x', encoded) for _ in range(3)])
+    print()
+    asyncio.run(bench_middleware(count))
+    print()
+    asyncio.run(bench_logins(args.logins))
+
+
+if __name__ == '__main__':
+    main()
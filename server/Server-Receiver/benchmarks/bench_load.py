@@ -0,0 +1,485 @@
+"""End-to-end load test of the alert pipeline, with machine-readable results.
+
+Starts one FireEmergencyServer in a child process against a stubbed
+Firebase (FakeFcmClient, no SDK or key needed), then opens --clients
+/ws/client sockets from several load-generator processes that register and
+send status updates like the PWA does. It measures, in phases:
+
+  connect   handshake + register_name rate, server RSS per connection
+  alerts    firmware FIRE_ALERT packet sent over UDP -> fire_alert on every
+            socket (p50/p99/max), then clear, --rounds times
+  broadcast admin broadcasts delivered per second across all sockets
+  stream    sensor heartbeat streams replayed at --rate while every client
+            keeps sending status updates; packets handled and dropped
+
+Event-loop lag is sampled inside the server for every phase. Results are
+written as JSON (see --output) so runs can be compared across commits;
+--baseline prints the change against an earlier file.
+
+Run from server/Server-Receiver:  python benchmarks/bench_load.py [--clients 2000 --rounds 5 --baseline results/load-....json]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from bench_udp import firmware_packet, sender  # noqa: E402
+from fanout import percentile  # noqa: E402
+
+STATUSES = ['SAFE', 'NEED_HELP', 'INJURED', 'TRAPPED']
+LAG_INTERVAL = 0.01          # Seconds between event-loop lag samples
+HANDSHAKES_IN_FLIGHT = 64    # Per generator, so connecting doesn't become a SYN flood
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+# Every simulated phone connects from 127.0.0.1, so the per-address limits are lifted
+LOOPBACK_LIMITS = dict(max_per_ip=0, connect_rate=0, api_rate=0, admin_rate=0, alarm_rate=0)
+DEMO_ADMIN = {'username': 'admin1', 'password': 'admin123'}   # Built into server.py
+
+
+async def admin_headers(session, base):
+    """Log in as the demo admin; returns the headers admin routes need."""
+    async with session.post(f'{base}/api/admin/login', json=DEMO_ADMIN) as response:
+        return {'Authorization': f"Bearer {(await response.json())['token']}"}
+
+# Metrics compared by --baseline: (phase, key, True if higher is better)
+TRACKED = [
+    ('connect', 'connections_per_sec', True),
+    ('connect', 'rss_per_connection_kb', False),
+    ('alerts', 'p50_ms', False),
+    ('alerts', 'p99_ms', False),
+    ('alerts', 'max_ms', False),
+    ('broadcast', 'deliveries_per_sec', True),
+    ('stream', 'packets_per_sec', True),
+    ('stream', 'status_updates_per_sec', True),
+    ('stream', 'lag_p99_ms', False),
+]
+
+
+# ==========================================================
+# SERVER PROCESS
+# ==========================================================
+
+class LoopLagProbe:
+    """Samples how late a LAG_INTERVAL sleep wakes up on the server's loop (/bench/lag)."""
+
+    def __init__(self):
+        self.samples = []
+
+    async def start(self, app):
+        asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    async def handle(self, request):
+        """Lag since the previous call, then start over"""
+        samples, self.samples = self.samples, []
+        return web.json_response(lag_summary(samples))
+
+
+def lag_summary(samples):
+    return {
+        'lag_samples': len(samples),
+        'lag_p50_ms': round(percentile(samples, 50) * 1000, 2) if samples else None,
+        'lag_p99_ms': round(percentile(samples, 99) * 1000, 2) if samples else None,
+        'lag_max_ms': round(max(samples) * 1000, 2) if samples else None
+    }
+
+
+def run_server(http_port, udp_port, fcm_latency):
+    """Child process: the real server with Firebase stubbed out and its output silenced."""
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    from fake_fcm import FakeFcmClient, install_fake_firebase
+    install_fake_firebase()
+    import server
+    from admission import IngressLimits
+
+    workdir = tempfile.mkdtemp(prefix='bench-load-')
+    instance = server.FireEmergencyServer(udp_port=udp_port, http_port=http_port,
+                                          limits=IngressLimits(**LOOPBACK_LIMITS),
+                                          map_dir=os.path.join(workdir, 'maps'),
+                                          journal_dir=os.path.join(workdir, 'journal'),
+                                          fcm_client=FakeFcmClient(latency=fcm_latency, jitter=fcm_latency / 4))
+    probe = LoopLagProbe()
+    instance.app.on_startup.append(probe.start)
+    instance.app.router.add_get('/bench/lag', probe.handle)
+    instance.run()
+
+
+def rss_kb(pid):
+    """Resident set size of `pid` in KiB (Linux only; None elsewhere)."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+# ==========================================================
+# LOAD GENERATORS
+# ==========================================================
+
+class SimulatedClient:
+    """One PWA socket: remembers when each message type arrived."""
+
+    __slots__ = ('ws', 'seen', 'reader')
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.seen = {}
+        self.reader = None
+
+    async def read(self):
+        async for msg in self.ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                at = time.time()
+                self.seen.setdefault(json.loads(msg.data).get('type'), []).append(at)
+
+    def nth(self, msg_type, count):
+        times = self.seen.get(msg_type, ())
+        return times[count - 1] if len(times) >= count else None
+
+
+async def generator_main(url, count, generator, commands, replies):
+    rng = random.Random(generator)
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        clients = []
+        failures = 0
+        gate = asyncio.Semaphore(HANDSHAKES_IN_FLIGHT)
+
+        async def connect(i):
+            nonlocal failures
+            async with gate:
+                try:
+                    ws = await session.ws_connect(url)
+                    await ws.receive_json()
+                    await ws.send_json({'type': 'register_name', 'name': f'load-{generator}-{i}',
+                                        'fcm_token': f'token-{generator}-{i}', 'zone': f'B1/F{i % 5}/Z{i % 8}'})
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                    failures += 1
+                    return
+            client = SimulatedClient(ws)
+            client.reader = asyncio.get_running_loop().create_task(client.read())
+            clients.append(client)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connect(i) for i in range(count)))
+        replies.put(('ready', len(clients), failures, time.perf_counter() - started))
+
+        while True:
+            command, *params = await asyncio.to_thread(commands.get)
+            if command == 'status':
+                # Every client sends `rounds` status updates, `interval` apart
+                rounds, interval = params
+                started = time.perf_counter()
+                sent = 0
+                for _ in range(rounds):
+                    for client in clients:
+                        if not client.ws.closed:
+                            await client.ws.send_json({'type': 'status_update', 'status': rng.choice(STATUSES)})
+                            sent += 1
+                    if interval:
+                        await asyncio.sleep(interval)
+                replies.put(('status', sent, time.perf_counter() - started))
+            elif command == 'await':
+                # Until every client has seen `nth` messages of `msg_type`, or the timeout
+                msg_type, nth, timeout = params
+                deadline = time.perf_counter() + timeout
+                while time.perf_counter() < deadline:
+                    if all(client.nth(msg_type, nth) is not None for client in clients):
+                        break
+                    await asyncio.sleep(0.005)
+                replies.put(('await', [client.nth(msg_type, nth) for client in clients]))
+            elif command == 'stop':
+                break
+
+        for client in clients:
+            await client.ws.close()
+            client.reader.cancel()
+
+
+def load_generator(url, count, generator, commands, replies):
+    asyncio.run(generator_main(url, count, generator, commands, replies))
+
+
+# ==========================================================
+# PHASES
+# ==========================================================
+
+class Harness:
+    def __init__(self, args, ctx):
+        self.args = args
+        self.ctx = ctx
+        self.base = f'http://127.0.0.1:{args.port}'
+        self.auth = {}
+        self.replies = ctx.Queue()
+        self.commands = []
+        self.generators = []
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    async def collect(self, kind, timeout=120):
+        replies = []
+        for _ in self.generators:
+            reply = await asyncio.to_thread(self.replies.get, True, timeout)
+            assert reply[0] == kind, reply
+            replies.append(reply[1:])
+        return replies
+
+    async def command(self, *command, timeout=120):
+        for queue in self.commands:
+            queue.put(command)
+        return await self.collect(command[0], timeout)
+
+    async def arrivals(self, msg_type, nth, timeout):
+        times = []
+        for (received,) in await self.command('await', msg_type, nth, timeout, timeout=timeout + 30):
+            times.extend(received)
+        return times
+
+    async def get_json(self, session, path):
+        async with session.get(self.base + path) as response:
+            return await response.json()
+
+    async def post(self, session, path, payload=None):
+        async with session.post(self.base + path, json=payload or {}, headers=self.auth) as response:
+            return await response.json()
+
+    async def wait_for_server(self, session, timeout=15.0):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            try:
+                return await self.get_json(session, '/api/status')
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+        raise RuntimeError(f'server did not come up on {self.base}')
+
+    async def phase_connect(self, server_pid):
+        args = self.args
+        rss_before = rss_kb(server_pid)
+        share = args.clients // args.generators
+        for g in range(args.generators):
+            commands = self.ctx.Queue()
+            self.commands.append(commands)
+            self.generators.append(self.ctx.Process(
+                target=load_generator,
+                args=(f'{self.base}/ws/client', share, g, commands, self.replies)))
+        started = time.perf_counter()
+        for generator in self.generators:
+            generator.start()
+        ready = await self.collect('ready')
+        elapsed = time.perf_counter() - started
+        connected = sum(count for count, _, _ in ready)
+        await asyncio.sleep(1.0)  # Registrations drain and the journal catches up
+        rss_after = rss_kb(server_pid)
+        return {
+            'connected': connected,
+            'failed': sum(failures for _, failures, _ in ready),
+            'seconds': round(elapsed, 3),
+            'connections_per_sec': round(connected / elapsed, 1),
+            'rss_before_kb': rss_before,
+            'rss_after_kb': rss_after,
+            'rss_per_connection_kb': (round((rss_after - rss_before) / connected, 2)
+                                      if rss_before is not None and rss_after is not None and connected else None)
+        }
+
+    async def phase_alerts(self, session):
+        """Sensor packet -> fire_alert latency, one alarm per round"""
+        latencies = []
+        missed = 0
+        for round_no in range(1, self.args.rounds + 1):
+            sent_at = time.time()
+            self.udp.sendto(firmware_packet(round_no), ('127.0.0.1', self.args.udp_port))
+            received = await self.arrivals('fire_alert', round_no, self.args.timeout)
+            latencies.extend(at - sent_at for at in received if at is not None)
+            missed += sum(1 for at in received if at is None)
+            await self.post(session, '/api/admin/clear_alarm')
+            await self.arrivals('clear_alert', round_no, self.args.timeout)
+            await asyncio.sleep(0.2)  # The cancelled alarm task finishes before the next packet
+        return {
+            'rounds': self.args.rounds,
+            'deliveries': len(latencies),
+            'missed': missed,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+            'max_ms': round(max(latencies) * 1000, 2) if latencies else None
+        }
+
+    async def phase_broadcast(self, session):
+        """Admin broadcasts posted back to back; deliveries/s until the last socket has them all"""
+        count = self.args.broadcasts
+        started = time.time()
+        for i in range(count):
+            await self.post(session, '/api/admin/broadcast', {'message': f'Load test notice {i}'})
+        received = await self.arrivals('admin_message', count, self.args.timeout)
+        done = [at for at in received if at is not None]
+        elapsed = (max(done) - started) if done else None
+        deliveries = len(done) * count
+        return {
+            'broadcasts': count,
+            'sockets_complete': len(done),
+            'seconds': round(elapsed, 3) if elapsed else None,
+            'deliveries_per_sec': round(deliveries / elapsed, 1) if elapsed else None
+        }
+
+    async def phase_stream(self, session):
+        """Firmware heartbeats from --sensors nodes at --rate while clients update their status"""
+        args = self.args
+        before = await self.get_json(session, '/api/stats/udp')
+        rounds = max(1, int(args.rate * args.duration / args.sensors))
+        stream = self.ctx.Process(target=sender, args=(args.udp_port, args.sensors, rounds, args.rate))
+        started = time.perf_counter()
+        stream.start()
+        statuses = await self.command('status', args.status_rounds, args.duration / args.status_rounds)
+        await asyncio.to_thread(stream.join)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.5)  # Let the listener finish what is already queued
+        after = await self.get_json(session, '/api/stats/udp')
+        sent = rounds * args.sensors
+        handled = after['packets'] - before['packets']
+        status_sent = sum(count for count, _ in statuses)
+        return {
+            'packets_sent': sent,
+            'packets_handled': handled,
+            'packets_dropped': after['dropped'] - before['dropped'],
+            'packets_per_sec': round(handled / elapsed, 1),
+            'status_updates': status_sent,
+            'status_updates_per_sec': round(status_sent / elapsed, 1)
+        }
+
+    async def run(self):
+        args = self.args
+        results = {}
+        server = self.ctx.Process(target=run_server, args=(args.port, args.udp_port, args.fcm_latency))
+        server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                await self.wait_for_server(session)
+                self.auth = await admin_headers(session, self.base)
+                lag = await self.get_json(session, '/bench/lag')  # Discard startup
+                for name, phase in (('connect', lambda: self.phase_connect(server.pid)),
+                                    ('alerts', lambda: self.phase_alerts(session)),
+                                    ('broadcast', lambda: self.phase_broadcast(session)),
+                                    ('stream', lambda: self.phase_stream(session))):
+                    print(f"… {name}", flush=True)
+                    results[name] = await phase()
+                    lag = await self.get_json(session, '/bench/lag')
+                    results[name].update(lag)
+                results['server'] = {
+                    'fanout': await self.get_json(session, '/api/stats/fanout'),
+                    'fcm': await self.get_json(session, '/api/stats/fcm'),
+                    'journal': await self.get_json(session, '/api/stats/journal')
+                }
+            for queue in self.commands:
+                queue.put(('stop',))
+            for generator in self.generators:
+                await asyncio.to_thread(generator.join, 10)
+        finally:
+            for generator in self.generators:
+                if generator.is_alive():
+                    generator.terminate()
+            server.terminate()
+            server.join(10)
+            self.udp.close()
+        return results
+
+
+# ==========================================================
+# REPORTING
+# ==========================================================
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def print_report(results):
+    for phase in ('connect', 'alerts', 'broadcast', 'stream'):
+        values = ', '.join(f'{key}={value}' for key, value in results[phase].items())
+        print(f"{phase:<10} {values}")
+
+
+def compare(results, baseline):
+    print(f"\nvs. baseline {baseline['environment'].get('commit')} ({baseline['environment'].get('timestamp')}):")
+    for phase, key, higher_is_better in TRACKED:
+        old = baseline.get(phase, {}).get(key)
+        new = results.get(phase, {}).get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        worse = change < 0 if higher_is_better else change > 0
+        flag = '  ⚠️ regression' if worse and abs(change) >= 10 else ''
+        print(f"  {phase + '.' + key:<32} {old:>12} -> {new:<12} {change:+6.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--generators', type=int, default=4, help='load-generator processes')
+    parser.add_argument('--rounds', type=int, default=5, help='alarms raised and cleared')
+    parser.add_argument('--broadcasts', type=int, default=20)
+    parser.add_argument('--sensors', type=int, default=200, help='nodes in the replayed heartbeat stream')
+    parser.add_argument('--rate', type=int, default=2000, help='stream packets/sec')
+    parser.add_argument('--duration', type=float, default=5.0, help='stream phase seconds')
+    parser.add_argument('--status-rounds', type=int, default=5, help='status updates per client during the stream')
+    parser.add_argument('--fcm-latency', type=float, default=0.1, help='stubbed FCM round trip, seconds')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-phase delivery timeout')
+    parser.add_argument('--port', type=int, default=18600)
+    parser.add_argument('--udp-port', type=int, default=18601)
+    parser.add_argument('--output', help=f'JSON results path (default: {RESULTS_DIR}/load-<commit>-<time>.json)')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU(s), {args.clients} clients from {args.generators} generators\n")
+    results = asyncio.run(Harness(args, multiprocessing.get_context('fork')).run())
+    results['environment'] = environment()
+    results['config'] = vars(args)
+    print()
+    print_report(results)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"load-{results['environment']['commit'] or 'unknown'}-{stamp}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Memory footprint and microbenchmarks for OccupantRegistry.
+
+Run from server/Server-Receiver:  python benchmarks/bench_occupants.py [--occupants 50000]
+"""
+import argparse
+import gc
+import hashlib
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from occupants import OccupantRegistry  # noqa: E402
+
+STATUSES = ['SAFE', 'NEED_HELP', 'INJURED', 'TRAPPED']
+ZONES = [f'B1-F{floor}-Z{zone}' for floor in range(1, 6) for zone in range(1, 9)]
+
+
+def make_people(count):
+    people = []
+    for i in range(count):
+        token = f'fcm-token-{i:08d}-' + 'x' * 140  # Real FCM tokens are ~160 chars
+        stable_id = hashlib.sha256(f'user{i}:{token}'.encode()).hexdigest()[:12]
+        people.append((f'transient_{i}', stable_id, f'User {i}', token, ZONES[i % len(ZONES)]))
+    return people
+
+
+def fill(registry, people):
+    ws = object()
+    for client_id, stable_id, name, token, zone in people:
+        registry.connect(client_id, ws)
+        registry.register(client_id, stable_id, name, token, zone)
+
+
+def per_op(label, count, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{elapsed * 1e6 / count:>10.2f} µs/op   ({count} ops, {elapsed * 1000:.1f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--occupants', type=int, default=50000)
+    args = parser.parse_args()
+    count = args.occupants
+    people = make_people(count)
+
+    # --- Memory: everything the registry allocates for `count` occupants ---
+    gc.collect()
+    tracemalloc.start()
+    registry = OccupantRegistry()
+    fill(registry, people)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Memory for {count} occupants: {current / 1e6:.1f} MB "
+          f"({current / count:.0f} B/occupant incl. name+token strings), peak {peak / 1e6:.1f} MB")
+
+    # --- Microbenchmarks ---
+    registry = OccupantRegistry()
+    per_op('register', count, lambda: fill(registry, people))
+
+    stamp = '2024-01-01T12:00:00'
+    updates = [(p[1], random.choice(STATUSES)) for p in people]
+
+    def status_updates():
+        for stable_id, status in updates:
+            registry.set_status(stable_id, status, stamp)
+    per_op('status update', count, status_updates)
+
+    queries = 1000
+    per_op('count_by_status', queries, lambda: [registry.count_by_status() for _ in range(queries)])
+    per_op("with_status('TRAPPED')", queries, lambda: [registry.with_status('TRAPPED') for _ in range(queries)])
+    per_op('in_zone', queries, lambda: [registry.in_zone(ZONES[0]) for _ in range(queries)])
+
+    # Baseline: what a full scan of the old user_status dict costs per query
+    user_status = registry.user_status()
+    per_op('full-scan count (old dicts)', 100, lambda: [
+        sum(1 for entry in user_status.values() if entry['status'] == 'TRAPPED') for _ in range(100)])
+
+    def disconnects():
+        for client_id, *_ in people:
+            registry.disconnect(client_id)
+    per_op('disconnect', count, disconnects)
+    assert len(registry) == 0 and registry.connection_count == 0
+
+
+if __name__ == '__main__':
+    main()
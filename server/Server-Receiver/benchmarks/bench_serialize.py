@@ -0,0 +1,109 @@
+"""CPU time per broadcast: per-client send_json vs. serialize-once PreparedMessage.
+
+Run from server/Server-Receiver:  python benchmarks/bench_serialize.py [--map-kb 512]
+
+Sockets are in-memory fakes, so the numbers are pure serialization/compression
+cost on the event loop, with no network I/O.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import JSON_BACKEND, PreparedMessage, send_prepared  # noqa: E402
+
+
+class FakeProtocol:
+    writing_paused = False
+
+
+class FakeWriter:
+    """Mimics the aiohttp WebSocketWriter attributes send_prepared looks at."""
+
+    def __init__(self, compress):
+        self.compress = compress
+        self.notakeover = True
+        self.protocol = FakeProtocol()
+        self.bytes_out = 0
+
+    def _write_websocket_frame(self, message, opcode, rsv):
+        self.bytes_out += len(message)
+
+
+class FakeSocket:
+    def __init__(self, compress=0):
+        self._writer = FakeWriter(compress) if compress else None
+        self.bytes_out = 0
+
+    async def send_json(self, data, dumps=json.dumps):
+        # What aiohttp's send_json does: encode for this socket, then send
+        payload = dumps(data).encode('utf-8')
+        if self._writer is not None:
+            compressor = zlib.compressobj(zlib.Z_BEST_SPEED, zlib.DEFLATED, -self._writer.compress)
+            payload = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.bytes_out += len(payload)
+
+    async def send_frame(self, data, opcode):
+        self.bytes_out += len(data)
+
+
+async def per_client(sockets, message):
+    for ws in sockets:
+        await ws.send_json(message)
+
+
+async def serialize_once(sockets, message):
+    prepared = PreparedMessage(message)
+    for ws in sockets:
+        await send_prepared(ws, prepared)
+
+
+def measure(strategy, sockets, message, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        asyncio.run(strategy(sockets, message))
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--map-kb', type=int, default=256, help='size of the base64 map payload')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    alert = {
+        'type': 'fire_alert',
+        'source': 'esp8266_sensor',
+        'message': '🚨 FIRE DETECTED - EVACUATE IMMEDIATELY 🚨',
+        'timestamp': '2024-01-01T12:00:00.000000'
+    }
+    map_broadcast = {
+        'type': 'broadcast',
+        'message': 'Use the east stairwell',
+        'from': 'admin_1',
+        'timestamp': '2024-01-01T12:00:00.000000',
+        'map_data': 'data:image/png;base64,' + os.urandom(args.map_kb * 768).hex()[:args.map_kb * 1024],
+        'map_filename': 'floor-3.png'
+    }
+
+    print(f"JSON backend: {JSON_BACKEND}")
+    print(f"{'payload':<10}{'clients':>8}{'deflate':>9}{'send_json ms':>15}{'prepared ms':>14}{'speedup':>9}")
+    for name, message in (('alert', alert), ('map', map_broadcast)):
+        for count in args.clients:
+            for compress in (0, 15):
+                sockets = [FakeSocket(compress) for _ in range(count)]
+                repeat = 1 if name == 'map' and count >= 1000 else args.repeat
+                baseline = measure(per_client, sockets, message, repeat)
+                prepared = measure(serialize_once, sockets, message, repeat)
+                print(f"{name:<10}{count:>8}{'yes' if compress else 'no':>9}"
+                      f"{baseline * 1000:>15.1f}{prepared * 1000:>14.1f}{baseline / max(prepared, 1e-9):>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
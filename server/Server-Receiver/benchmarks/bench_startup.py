@@ -0,0 +1,191 @@
+"""Time to first served socket with eager vs. background Firebase, and event-loop lag while parsing frames.
+
+Start-up: a server is forked per mode and a client retries a WebSocket
+handshake on /ws/client every couple of milliseconds; the time from fork to the
+first handshake is how long phones would wait after a restart. The UDP
+port is bound by an earlier startup hook, so it is ready by then too.
+Firebase is the offline stand-in from fake_fcm, made to take
+--firebase-delay seconds like the real SDK's import and credential load.
+"eager" initializes it before serving, as the server used to; "lazy" is
+the background loader; "no sdk" has no key file and must still serve.
+
+Loop lag: a probe asks to sleep 1 ms while the loop parses a burst of
+small status frames and inline-map admin frames, once with the stdlib
+parser the handlers used before and once with payloads.loads, on the
+asyncio loop and, if installed, on uvloop.
+
+Run from server/Server-Receiver:  python benchmarks/bench_startup.py [--runs 3 --firebase-delay 0.8]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp  # noqa: E402
+
+from fanout import percentile  # noqa: E402
+from payloads import loads  # noqa: E402
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+PROBE_INTERVAL = 0.001
+_LAG_MAX = re.compile(r'^fire_event_loop_lag_max_seconds\{[^}]*\} (\S+)$', re.MULTILINE)
+
+
+def run_server(port, mode, firebase_delay):
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    from fake_fcm import install_fake_firebase
+    if mode != 'no sdk':
+        install_fake_firebase(firebase_delay)
+    import server
+    from admission import IngressLimits
+    from bench_load import LOOPBACK_LIMITS
+    directory = tempfile.mkdtemp()
+    options = dict(http_port=port, udp_port=port + 1, map_dir=directory, journal=False, telemetry=False,
+                   limits=IngressLimits(**LOOPBACK_LIMITS),
+                   firebase_credentials=os.path.join(directory, 'serviceAccountKey.json'))
+    if mode == 'eager':
+        # What the server did before: the SDK ready before anything is served
+        client = server.LazyFirebaseClient(options['firebase_credentials'])
+        client.initialize()
+        options['fcm_client'] = client
+    server.FireEmergencyServer(**options, performance=mode == 'lazy+uvloop').run()
+
+
+async def first_handshake(base, deadline=30.0):
+    """Seconds until a /ws/client handshake succeeds, retrying every 2 ms."""
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() - started < deadline:
+            try:
+                async with session.ws_connect(base + '/ws/client'):
+                    return time.perf_counter() - started
+            except aiohttp.ClientConnectionError:
+                await asyncio.sleep(0.002)
+    raise TimeoutError('server did not start')
+
+
+async def firebase_settled(session, base):
+    """Seconds until /api/stats/fcm no longer reports Firebase loading, and its final state."""
+    started = time.perf_counter()
+    while True:
+        async with session.get(base + '/api/stats/fcm') as response:
+            firebase = (await response.json())['firebase']
+        if firebase is None or firebase['state'] != 'loading':
+            return time.perf_counter() - started, firebase['state'] if firebase else 'ready'
+        await asyncio.sleep(0.005)
+
+
+async def bench_start(mode, port, firebase_delay):
+    base = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    process = multiprocessing.get_context('fork').Process(target=run_server, args=(port, mode, firebase_delay))
+    process.start()
+    try:
+        await first_handshake(base)
+        serving = time.perf_counter() - started
+        async with aiohttp.ClientSession() as session:
+            settled, state = await firebase_settled(session, base)
+            async with session.get(base + '/metrics') as response:
+                match = _LAG_MAX.search(await response.text())
+        return serving, serving + settled, state, float(match.group(1)) if match else None
+    finally:
+        process.terminate()
+        process.join()
+
+
+def frames(status_count, map_count, map_bytes):
+    status = json.dumps({'type': 'status_update', 'status': 'SAFE', 'name': 'Occupant 0042'})
+    inline_map = json.dumps({'type': 'trigger_alarm', 'building': 'A', 'floor': 3, 'map_filename': 'plan.png',
+                             'map_data': 'data:image/png;base64,' + base64.b64encode(os.urandom(map_bytes)).decode()})
+    burst = [status] * status_count
+    step = max(1, status_count // max(1, map_count))
+    for i in range(map_count):
+        burst.insert(i * (step + 1), inline_map)
+    return burst
+
+
+async def parse_burst(parse, burst):
+    loop = asyncio.get_running_loop()
+    lags = []
+
+    async def probe():
+        while True:
+            expected = loop.time() + PROBE_INTERVAL
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(max(0.0, loop.time() - expected))
+
+    task = loop.create_task(probe())
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+    started = time.perf_counter()
+    for frame in burst:
+        parse(frame)
+        await asyncio.sleep(0)  # The socket reader yields between frames
+    elapsed = time.perf_counter() - started
+    task.cancel()
+    return elapsed, lags
+
+
+def bench_lag(args):
+    burst = frames(args.status_frames, args.map_frames, args.map_bytes)
+    loops = [('asyncio', asyncio.new_event_loop)]
+    loops.append(('uvloop', uvloop.new_event_loop) if uvloop is not None else ('uvloop', None))
+    for loop_name, factory in loops:
+        for parser_name, parse in (('json', json.loads), ('payloads', loads)):
+            if factory is None:
+                print(f"{loop_name:<10}{parser_name:<10}   (not installed)")
+                continue
+            loop = factory()
+            try:
+                elapsed, lags = loop.run_until_complete(parse_burst(parse, burst))
+            finally:
+                loop.close()
+            print(f"{loop_name:<10}{parser_name:<10}{len(burst) / elapsed:>11.0f}"
+                  f"{percentile(lags, 50) * 1000:>9.2f}{percentile(lags, 99) * 1000:>9.2f}{max(lags) * 1000:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='start-ups per mode (the median is shown)')
+    parser.add_argument('--firebase-delay', type=float, default=0.8,
+                        help='seconds the stand-in SDK takes to import and initialize')
+    parser.add_argument('--status-frames', type=int, default=20000)
+    parser.add_argument('--map-frames', type=int, default=40)
+    parser.add_argument('--map-bytes', type=int, default=3_000_000, help='decoded size of each inline map')
+    parser.add_argument('--port', type=int, default=18090)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU(s), Firebase start-up {args.firebase_delay * 1000:.0f} ms, "
+          f"uvloop {'installed' if uvloop is not None else 'not installed'}\n")
+    print(f"{'mode':<14}{'serving ms':>12}{'firebase ms':>13}{'lag max ms':>12}   firebase state")
+    modes = ['eager', 'lazy', 'no sdk'] + (['lazy+uvloop'] if uvloop is not None else [])
+    for offset, mode in enumerate(modes):
+        results = [asyncio.run(bench_start(mode, args.port + offset * 2, args.firebase_delay))
+                   for _ in range(args.runs)]
+        results.sort()
+        serving, ready, state, lag = results[len(results) // 2]
+        lag = f"{lag * 1000:>12.1f}" if lag is not None else f"{'n/a':>12}"
+        print(f"{mode:<14}{serving * 1000:>12.0f}{ready * 1000:>13.0f}{lag}   {state}")
+
+    print(f"\n{args.status_frames} status + {args.map_frames} inline-map frames, lag probed every "
+          f"{PROBE_INTERVAL * 1000:.0f} ms\n")
+    print(f"{'loop':<10}{'parser':<10}{'frames/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    bench_lag(args)
+
+
+if __name__ == '__main__':
+    main()
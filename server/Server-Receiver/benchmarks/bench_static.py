@@ -0,0 +1,135 @@
+"""Reload stampede on the static pages: aiohttp's add_static (disk) vs. the in-memory asset layer.
+
+For each mode a server is started in its own process (FCM replaced by the
+offline FakeFcmClient). --clients browsers then load every page and what
+it references, all at once: first with empty caches and again revalidating
+with the ETags they got (a reload). The server's CPU time and the bytes it
+sent are read from /proc, so the load generator's own cost is left out.
+
+Run from server/Server-Receiver:  python benchmarks/bench_static.py [--clients 500 --concurrency 100]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp  # noqa: E402
+
+from fanout import percentile  # noqa: E402
+
+PAGES = ('/static/client.html', '/static/admin.html', '/static/mobile.html')
+IMAGES = ('/static/images/emergency-evacuation-plan-2.jpg',)
+_REFERENCE = re.compile(r'''(?:src|href)=["'](/static/[^"']+)["']''')
+
+
+def run_server(port, static_cache):
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    from fake_fcm import FakeFcmClient, install_fake_firebase
+    install_fake_firebase()
+    import server
+    directory = tempfile.mkdtemp()
+    server.FireEmergencyServer(http_port=port, udp_port=port + 1, map_dir=directory, journal=False, telemetry=False,
+                               static_cache=static_cache, fcm_client=FakeFcmClient()).run()
+
+
+def cpu_seconds(pid):
+    """utime + stime of a process, or None off Linux."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+async def page_set(session, base):
+    """Every URL a browser fetches to show the pages."""
+    urls = list(PAGES) + list(IMAGES)
+    for page in PAGES:
+        async with session.get(base + page) as response:
+            urls.extend(_REFERENCE.findall(await response.text()))
+    return sorted(set(urls))
+
+
+async def stampede(session, base, urls, clients, concurrency, etags=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    sent = 0
+    statuses = {}
+    seen = {}
+
+    async def fetch(url):
+        nonlocal sent
+        headers = {'Accept-Encoding': 'gzip, br'}
+        if etags and url in etags:
+            headers['If-None-Match'] = etags[url]
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.get(base + url, headers=headers) as response:
+                body = await response.read()
+            latencies.append(time.perf_counter() - started)
+        sent += len(body)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        if 'ETag' in response.headers:
+            seen[url] = response.headers['ETag']
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(url) for _ in range(clients) for url in urls))
+    return time.perf_counter() - started, latencies, sent, statuses, seen
+
+
+async def bench_mode(label, port, args):
+    process = multiprocessing.get_context('fork').Process(target=run_server, args=(port, label == 'memory'))
+    process.start()
+    base = f'http://127.0.0.1:{port}'
+    try:
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector, auto_decompress=False) as session:
+            for _ in range(100):
+                try:
+                    async with session.get(base + '/api/status'):
+                        break
+                except aiohttp.ClientConnectionError:
+                    await asyncio.sleep(0.1)
+            async with aiohttp.ClientSession() as plain:
+                urls = await page_set(plain, base)
+
+            etags = None
+            for phase in ('first load', 'reload'):
+                cpu_before = cpu_seconds(process.pid)
+                elapsed, latencies, sent, statuses, etags = await stampede(
+                    session, base, urls, args.clients, args.concurrency, etags)
+                cpu = cpu_seconds(process.pid)
+                cpu = f"{(cpu - cpu_before) * 1000:>8.0f}" if cpu is not None else f"{'n/a':>8}"
+                print(f"{label:<8}{phase:<12}{len(latencies) / elapsed:>9.0f}{cpu:>10}"
+                      f"{sent / 1e6:>9.2f}{percentile(latencies, 50) * 1000:>9.2f}{percentile(latencies, 99) * 1000:>9.2f}"
+                      f"   {dict(sorted(statuses.items()))}")
+    finally:
+        process.terminate()
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=500, help='browsers loading every page')
+    parser.add_argument('--concurrency', type=int, default=100, help='requests in flight')
+    parser.add_argument('--port', type=int, default=18080)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU(s), {args.clients} clients, {args.concurrency} in flight\n")
+    print(f"{'mode':<8}{'phase':<12}{'req/s':>9}{'cpu ms':>10}{'MB sent':>9}{'p50 ms':>9}{'p99 ms':>9}   statuses")
+    for offset, label in enumerate(('disk', 'memory')):
+        asyncio.run(bench_mode(label, args.port + offset * 2, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Sensor history store: recording cost, segment writes, start-up load and query latency.
+
+Weeks of rollups for hundreds of sensors are synthesized straight into
+segment files (recording them one packet at a time would take as long as
+the weeks themselves), then the last hour is recorded packet by packet
+through `record`. Queries pick a random sensor each time and are timed
+from memory (the recording worker) and from the segments alone (a cluster
+worker without the UDP port).
+
+Run from server/Server-Receiver:  python benchmarks/bench_telemetry.py [--sensors 300 --days 28 --queries 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fanout import percentile  # noqa: E402
+from telemetry import (DAY, HOUR, MINUTE, MINUTE_POINTS, SEGMENT_PREFIX, TelemetryStore,  # noqa: E402
+                       encode_segment)
+
+PACKET_INTERVAL = 5.0   # Seconds between packets from one alerting sensor (the firmware's ALERT_INTERVAL)
+
+
+def rollups(start, step, count, seed):
+    """Columns of `count` plausible rollup rows from `start`, `step` seconds apart."""
+    rng = random.Random(seed)
+    per_row = int(step // PACKET_INTERVAL)
+    rows = []
+    for i in range(count):
+        low = 300 + rng.randrange(200)
+        high = low + rng.randrange(300)
+        rows.append((start + i * step, per_row, (low + high) / 2 * per_row, low, high, high, 400))
+    return [list(column) for column in zip(*rows)]
+
+
+def synthesize(directory, sensors, days, minute_days, until):
+    """Write hour segments for `days` and minute segments for `minute_days`, ending at `until`."""
+    started = time.perf_counter()
+    written = 0
+    for step, span, back in ((HOUR, DAY, days * DAY), (MINUTE, HOUR, minute_days * DAY)):
+        first = int((until - back) // span * span)
+        for segment in range(first, int(until), span):
+            count = int(min(span, until - segment) // step)
+            per_sensor = {sensor_id: rollups(segment, step, count, hash((sensor_id, segment)))
+                          for sensor_id in sensors}
+            data = encode_segment(step, segment, per_sensor)
+            with open(os.path.join(directory, f'{SEGMENT_PREFIX[step]}-{segment:010d}.seg'), 'wb') as f:
+                f.write(data)
+            written += len(data)
+    print(f"{'synthesize segments':<34}{time.perf_counter() - started:>9.2f} s   "
+          f"({written / 1e6:.1f} MB, {len(os.listdir(directory))} files)")
+
+
+def record_last_hour(store, sensors, until):
+    """Every sensor alerting for the last hour, one packet per PACKET_INTERVAL, in arrival order."""
+    packets = [(t, sensor_id) for sensor_id in sensors
+               for t in range(int(until - HOUR), int(until), int(PACKET_INTERVAL))]
+    packets.sort()
+    started = time.perf_counter()
+    for t, sensor_id in packets:
+        store.record(sensor_id, 400 + (t // 7) % 300, 400, now=t + 0.5)
+    elapsed = time.perf_counter() - started
+    print(f"{'record':<34}{elapsed * 1e6 / len(packets):>9.2f} µs/packet   ({len(packets)} packets)")
+
+
+async def time_queries(label, store, sensors, span, resolution, count, now):
+    times = []
+    points = 0
+    for _ in range(count):
+        sensor_id = random.choice(sensors)
+        started = time.perf_counter()
+        history = await store.history(sensor_id, now - span, now, resolution)
+        times.append(time.perf_counter() - started)
+        points += history['points']
+    print(f"{label:<34}p50 {percentile(times, 50) * 1000:>7.2f} ms   p99 {percentile(times, 99) * 1000:>7.2f} ms   "
+          f"({points // count} points, {history['resolution']})")
+
+
+async def run(args):
+    directory = tempfile.mkdtemp(prefix='fire-telemetry-')
+    sensors = [f'NODE_{i:04d}' for i in range(args.sensors)]
+    now = time.time()
+    try:
+        # Rollups end an hour ago; the last hour arrives as packets
+        synthesize(directory, sensors, args.days, args.minute_days, now - HOUR)
+
+        store = TelemetryStore(directory)
+        store.load(now - HOUR)
+        print(f"{'load':<34}{store.load_ms:>9.2f} ms   ({store.loaded_rows} rows)")
+        record_last_hour(store, sensors, now)
+        store.tick(now)
+        started = time.perf_counter()
+        dirty = len(store._dirty)
+        await store.flush()
+        print(f"{'flush':<34}{(time.perf_counter() - started) * 1000:>9.2f} ms   ({dirty} segments)")
+        stats = store.stats()
+        print(f"{'memory':<34}{stats['memory_bytes'] / 1e6:>9.2f} MB   "
+              f"({stats['memory_bytes'] / max(1, stats['sensors']) / 1024:.1f} KiB per sensor)\n")
+
+        reader = TelemetryStore(directory, writable=False)
+        for label, target, span, resolution in (
+                ('raw, last hour', store, HOUR, 'raw'),
+                ('minute, last day', store, MINUTE_POINTS * MINUTE, 'minute'),
+                (f'hour, last {args.days} days', store, args.days * DAY, 'hour'),
+                ('minute, 2 days (disk)', store, 2 * DAY, 'minute'),
+                (f'hour, {args.days} days (read-only)', reader, args.days * DAY, 'hour'),
+                ('minute, last day (read-only)', reader, DAY, 'minute')):
+            await time_queries(label, target, sensors, span, resolution, args.queries, now)
+        await store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensors', type=int, default=300)
+    parser.add_argument('--days', type=int, default=28, help='days of hour rollups on disk')
+    parser.add_argument('--minute-days', type=int, default=2, help='days of minute rollups on disk')
+    parser.add_argument('--queries', type=int, default=200, help='queries per kind')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
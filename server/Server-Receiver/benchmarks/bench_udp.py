@@ -0,0 +1,139 @@
+"""Replay benchmark for sensor UDP ingestion.
+
+Simulates hundreds of FireDetectionNode units sending the firmware's
+FIRE_ALERT packet, compresses their 5-second ALERT_INTERVAL heartbeats into
+a burst, and counts how many packets the listener actually handled.
+It compares the asyncio SensorIngest against the old blocking thread that
+scheduled one run_coroutine_threadsafe future per packet.
+
+Run from server/Server-Receiver:  python benchmarks/bench_udp.py [--sensors 500 --rounds 20 --rate 0]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from udp_ingest import SensorIngest  # noqa: E402
+
+
+def firmware_packet(node):
+    """Same fields and key order as sendFireAlert() in hardware/FireDetectionNode/src/main.cpp."""
+    return json.dumps({
+        'type': 'FIRE_ALERT',
+        'smoke_level': 400 + node % 600,
+        'threshold': 400,
+        'sensor_id': f'ROOM_{node:03d}_SENSOR',
+        'ip': f'192.168.{1 + node // 250}.{node % 250 + 1}'
+    }, separators=(',', ':')).encode()
+
+
+def sender(port, sensors, rounds, rate):
+    """Child process: every round, each sensor sends one heartbeat; `rate` caps packets/sec."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    packets = [firmware_packet(node) for node in range(sensors)]
+    interval = 1.0 / rate if rate else 0
+    next_send = time.perf_counter()
+    for _ in range(rounds):
+        for packet in packets:
+            sock.sendto(packet, ('127.0.0.1', port))
+            if interval:
+                next_send += interval
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    sock.close()
+
+
+async def run_asyncio(args):
+    received = 0
+
+    def on_packet(packet, addr, received_at):
+        nonlocal received
+        if packet.get('type') == 'FIRE_ALERT':
+            received += 1
+
+    ingest = await SensorIngest(on_packet, 0, host='127.0.0.1').start()
+    return ingest, lambda: received
+
+
+async def run_thread(args):
+    """The pre-asyncio listener: blocking recvfrom + one threadsafe future per packet."""
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    counter = {'received': 0}
+
+    async def handle(alert_data):
+        counter['received'] += 1
+
+    def listen():
+        while True:
+            try:
+                data, addr = sock.recvfrom(1024)
+            except OSError:
+                return
+            alert_data = json.loads(data.decode('utf-8'))
+            if alert_data.get('type') == 'FIRE_ALERT':
+                asyncio.run_coroutine_threadsafe(handle(alert_data), loop)
+
+    threading.Thread(target=listen, daemon=True).start()
+    return sock, lambda: counter['received']
+
+
+async def measure(mode, args):
+    if mode == 'asyncio':
+        ingest, received = await run_asyncio(args)
+        port = ingest.port
+    else:
+        sock, received = await run_thread(args)
+        port = sock.getsockname()[1]
+
+    total = args.sensors * args.rounds
+    proc = multiprocessing.Process(target=sender, args=(port, args.sensors, args.rounds, args.rate))
+    start = time.perf_counter()
+    proc.start()
+    while proc.is_alive():
+        await asyncio.sleep(0.01)
+    # Give the listener a moment to finish what is already queued
+    deadline = time.perf_counter() + 2.0
+    while received() < total and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    extra = ''
+    if mode == 'asyncio':
+        stats = ingest.stats()
+        extra = f" rcvbuf={stats['rcvbuf_bytes']} batches={stats['batches']} dropped={stats['dropped']} parse_errors={stats['parse_errors']}"
+        ingest.close()
+    else:
+        sock.close()
+
+    got = received()
+    print(f"{mode:<8} sent={total} handled={got} lost={total - got} "
+          f"({100.0 * (total - got) / total:.2f}%) in {elapsed:.2f}s "
+          f"→ {got / elapsed:,.0f} pkt/s{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensors', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=20, help='heartbeats per sensor')
+    parser.add_argument('--rate', type=int, default=10000,
+                        help='packets/sec cap, 0 = unthrottled burst (default 10k/s, 100x the load of 500 nodes)')
+    parser.add_argument('--mode', choices=['asyncio', 'thread', 'both'], default='both')
+    args = parser.parse_args()
+
+    modes = ['thread', 'asyncio'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        asyncio.run(measure(mode, args))
+
+
+if __name__ == '__main__':
+    main()
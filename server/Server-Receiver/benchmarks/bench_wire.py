@@ -0,0 +1,102 @@
+"""Bytes and CPU per frame: JSON vs. the compact MessagePack wire format, and JSON vs. binary sensor packets.
+
+Run from server/Server-Receiver:  python benchmarks/bench_wire.py [--users 500 --repeat 20000]
+
+Sizes are the uncompressed frame; the deflated column is what a socket with
+permessage-deflate actually puts on the air for one frame. Encode/decode
+times are per frame, in microseconds. Without msgpack installed the binary
+columns read n/a (those sockets would negotiate JSON).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire  # noqa: E402
+from payloads import JSON_BACKEND, dumps, loads  # noqa: E402
+
+STAMP = '2024-01-01T12:00:00.000000'
+
+
+def frames(users):
+    statuses = ('SAFE', 'TRAPPED', 'UNKNOWN')
+    snapshot = {
+        f'client_{i}': {'name': f'Occupant {i}', 'status': statuses[i % 3], 'timestamp': STAMP,
+                        'building': 'A', 'floor': i % 5, 'zone': 'east' if i % 2 else 'west', 'online': True}
+        for i in range(users)
+    }
+    return {
+        'fire_alert': {'type': 'fire_alert', 'seq': 412, 'source': 'esp8266_sensor',
+                       'message': '🚨 FIRE DETECTED - EVACUATE IMMEDIATELY 🚨', 'timestamp': STAMP,
+                       'zones': ['A/3/east']},
+        'clear_alert': {'type': 'clear_alert', 'seq': 413, 'message': 'All clear', 'timestamp': STAMP},
+        'admin_message': {'type': 'admin_message', 'seq': 7, 'message': 'Use the east stairwell',
+                          'from': 'admin1', 'timestamp': STAMP},
+        'broadcast+map': {'type': 'broadcast', 'seq': 8, 'message': 'Use the east stairwell', 'from': 'admin1',
+                          'timestamp': STAMP, 'map_hash': 'a3f1c2d4e5b6a7980112233445566778',
+                          'map_url': '/maps/a3f1c2d4e5b6a7980112233445566778.png', 'map_filename': 'floor-3.png'},
+        'status_delta': {'type': 'status_delta', 'seq': 900, 'prev': 899, 'timestamp': STAMP,
+                         'upserts': {'client_17': {'name': 'Occupant 17', 'status': 'TRAPPED', 'timestamp': STAMP}},
+                         'removes': []},
+        f'status_update x{users}': {'type': 'status_update', 'seq': 901, 'user_status': snapshot,
+                                    'alert_active': True, 'connected_clients': users},
+        'sensor_update': {'type': 'sensor_update', 'sensor_id': 'ROOM_301_SENSOR', 'state': 'alerting',
+                          'level': 712, 'peak': 740, 'threshold': 400, 'trend': 'rising', 'rate': 0.5,
+                          'ip': '192.168.1.101', 'timestamp': STAMP},
+    }
+
+
+def per_frame(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1e6 / repeat
+
+
+def deflated(data):
+    compressor = zlib.compressobj(zlib.Z_BEST_SPEED, zlib.DEFLATED, -15)
+    return len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500, help='occupants in the status_update snapshot')
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+
+    binary = wire.msgpack is not None
+    print(f"JSON backend: {JSON_BACKEND}, MessagePack: {'yes' if binary else 'not installed'}\n")
+    print(f"{'frame':<20}{'json B':>9}{'msgpack B':>11}{'saved':>7}{'json defl':>11}{'mp defl':>9}"
+          f"{'json enc':>10}{'mp enc':>9}{'json dec':>10}{'mp dec':>9}")
+    for name, message in frames(args.users).items():
+        repeat = max(1, args.repeat // 100) if name.startswith('status_update') else args.repeat
+        text = dumps(message)
+        json_enc = per_frame(lambda: dumps(message), repeat)
+        json_dec = per_frame(lambda: loads(text), repeat)
+        row = f"{name:<20}{len(text):>9}"
+        if binary:
+            packed = wire.encode_binary(message)
+            mp_enc = per_frame(lambda: wire.encode_binary(message), repeat)
+            mp_dec = per_frame(lambda: wire.decode_binary(packed), repeat)
+            row += (f"{len(packed):>11}{1 - len(packed) / len(text):>7.0%}{deflated(text):>11}{deflated(packed):>9}"
+                    f"{json_enc:>10.2f}{mp_enc:>9.2f}{json_dec:>10.2f}{mp_dec:>9.2f}")
+        else:
+            row += f"{'n/a':>11}{'':>7}{deflated(text):>11}{'n/a':>9}{json_enc:>10.2f}{'n/a':>9}{json_dec:>10.2f}{'n/a':>9}"
+        print(row)
+
+    packet = {'type': 'FIRE_ALERT', 'smoke_level': 712, 'threshold': 400,
+              'sensor_id': 'ROOM_301_SENSOR', 'ip': '192.168.1.101'}
+    text = json.dumps(packet).encode('utf-8')
+    packed = wire.pack_sensor(packet)
+    assert wire.unpack_sensor(packed) == packet
+    print(f"\n{'sensor packet':<20}{'bytes':>7}{'parse µs':>10}")
+    print(f"{'JSON':<20}{len(text):>7}{per_frame(lambda: loads(text), args.repeat):>10.2f}")
+    print(f"{'binary':<20}{len(packed):>7}{per_frame(lambda: wire.unpack_sensor(packed), args.repeat):>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Connection capacity and alert latency versus worker count.
+
+For each worker count, starts a WorkerPool on a fresh port (FCM replaced by
+the offline FakeFcmClient), opens --clients occupant WebSockets from several
+load-generator processes, registers them, then triggers one alarm and
+measures how long each socket takes to receive its fire_alert. Like
+server.py, this needs firebase_admin importable.
+
+Run from server/Server-Receiver:  python benchmarks/bench_workers.py [--clients 2000 --workers 1 2 4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp  # noqa: E402
+
+from bench_load import LOOPBACK_LIMITS, admin_headers  # noqa: E402
+from fanout import percentile  # noqa: E402
+
+
+def run_cluster(port, udp_port, workers):
+    """Child process: a WorkerPool with its output silenced."""
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    import server
+    from fake_fcm import FakeFcmClient
+    from workers import WorkerPool
+    from admission import IngressLimits
+
+    map_dir = tempfile.mkdtemp()
+    auth_secret = os.urandom(32)  # Shared, so a token from one worker is good on all of them
+
+    def make_server(worker_id, backplane):
+        return server.FireEmergencyServer(udp_port=udp_port, http_port=port, map_dir=map_dir,
+                                          worker_id=worker_id, backplane=backplane,
+                                          ingest_udp=worker_id == 0,
+                                          journal=worker_id == 0, journal_dir=os.path.join(map_dir, 'journal'),
+                                          limits=IngressLimits(**LOOPBACK_LIMITS), auth_secret=auth_secret,
+                                          fcm_client=FakeFcmClient(latency=0.0, jitter=0.0))
+
+    WorkerPool(make_server, workers).run()
+
+
+async def open_clients(url, count, ready, results, generator):
+    # The default connector stops at 100 connections per session
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        sockets = []
+        for i in range(count):
+            ws = await session.ws_connect(url)
+            await ws.receive_json()
+            await ws.send_json({'type': 'register_name', 'name': f'load-{generator}-{i}',
+                                'fcm_token': f'token-{generator}-{i}'})
+            sockets.append(ws)
+        ready.put(count)
+
+        async def wait_alert(ws):
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT and '"fire_alert"' in msg.data:
+                    return time.time()
+            return None
+
+        received = await asyncio.gather(*(wait_alert(ws) for ws in sockets))
+        results.put(received)
+        for ws in sockets:
+            await ws.close()
+
+
+def load_generator(url, count, ready, results, generator):
+    asyncio.run(open_clients(url, count, ready, results, generator))
+
+
+async def wait_for_port(base, workers, timeout=15.0):
+    """Until every worker answers /api/status (SO_REUSEPORT spreads our probes across them)."""
+    deadline = time.perf_counter() + timeout
+    seen = set()
+    while time.perf_counter() < deadline and len(seen) < workers:
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f'{base}/api/status') as response:
+                    seen.add((await response.json())['worker'])
+        except aiohttp.ClientError:
+            await asyncio.sleep(0.1)
+    await asyncio.sleep(0.5)  # Let the backplane hellos settle
+
+
+async def measure(args, workers, port):
+    ctx = multiprocessing.get_context('fork')
+    cluster = ctx.Process(target=run_cluster, args=(port, port + 1000, workers))
+    cluster.start()
+    base = f'http://127.0.0.1:{port}'
+    try:
+        await wait_for_port(base, workers)
+
+        ready, results = ctx.Queue(), ctx.Queue()
+        share = args.clients // args.generators
+        generators = [ctx.Process(target=load_generator,
+                                  args=(f'{base}/ws/client', share, ready, results, g))
+                      for g in range(args.generators)]
+        start = time.perf_counter()
+        for generator in generators:
+            generator.start()
+        connected = 0
+        for _ in generators:
+            connected += await asyncio.to_thread(ready.get, True, 120)
+        connect_time = time.perf_counter() - start
+        await asyncio.sleep(1.0)  # Registrations propagate over the backplane
+
+        async with aiohttp.ClientSession() as session:
+            headers = await admin_headers(session, base)
+            triggered = time.time()
+            async with session.post(f'{base}/api/admin/trigger_alarm', headers=headers) as response:
+                await response.read()
+        latencies = []
+        for _ in generators:
+            received = await asyncio.to_thread(results.get, True, 60)
+            latencies.extend(at - triggered for at in received if at is not None)
+        for generator in generators:
+            generator.join(10)
+
+        missed = connected - len(latencies)
+        print(f"{workers:>7} {connected:>8} {connect_time:>9.2f} {connected / connect_time:>10,.0f} "
+              f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} "
+              f"{max(latencies, default=0) * 1000:>8.1f} {missed:>7}")
+    finally:
+        cluster.terminate()
+        cluster.join(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--generators', type=int, default=4, help='load-generator processes')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--port', type=int, default=18500)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU(s)\n")
+    print(f"{'workers':>7} {'clients':>8} {'connect s':>9} {'conn/s':>10} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'missed':>7}")
+    for index, workers in enumerate(args.workers):
+        asyncio.run(measure(args, workers, args.port + index))
+
+
+if __name__ == '__main__':
+    main()
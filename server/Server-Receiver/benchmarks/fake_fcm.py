@@ -0,0 +1,90 @@
+"""Offline stand-in for FirebaseClient, for load-testing push dispatch.
+
+Sleeps like a real FCM round trip, fails a fraction of tokens with
+UnavailableError (retried by FcmDispatcher) and reports a fixed set of
+tokens as UnregisteredError (pruned). Thread-safe, since the dispatcher
+calls it from its worker pool.
+"""
+import random
+import threading
+import time
+
+
+class UnavailableError(Exception):
+    """Same class name as firebase_admin.messaging.UnavailableError."""
+
+
+class UnregisteredError(Exception):
+    """Same class name as firebase_admin.messaging.UnregisteredError."""
+
+
+class FakeFcmClient:
+    MAX_TOKENS = 500
+
+    def __init__(self, latency=0.15, jitter=0.05, transient_rate=0.0, unregistered=(), seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.transient_rate = transient_rate
+        self.unregistered = set(unregistered)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.delivered = 0
+        self.max_concurrent = 0
+        self._in_flight = 0
+
+    def send(self, tokens, data):
+        if len(tokens) > self.MAX_TOKENS:
+            raise ValueError(f'tokens must not contain more than {self.MAX_TOKENS} elements')
+        with self._lock:
+            self.calls += 1
+            self._in_flight += 1
+            self.max_concurrent = max(self.max_concurrent, self._in_flight)
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            rolls = [self._random.random() for _ in tokens]
+        try:
+            time.sleep(delay)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        outcomes = []
+        for token, roll in zip(tokens, rolls):
+            if token in self.unregistered:
+                outcomes.append(UnregisteredError('Requested entity was not found.'))
+            elif roll < self.transient_rate:
+                outcomes.append(UnavailableError('The server is temporarily unavailable.'))
+            else:
+                outcomes.append(None)
+        with self._lock:
+            self.delivered += outcomes.count(None)
+        return outcomes
+
+
+def install_fake_firebase(init_delay=0.0):
+    """Make `import firebase_admin` succeed without the SDK or serviceAccountKey.json.
+
+    Benchmarks that start a real server call this first and pass a
+    FakeFcmClient as `fcm_client`, so nothing ever reaches Google.
+    `init_delay` makes initialize_app take as long as the real SDK's
+    import and credential loading, for start-up measurements.
+    """
+    import sys
+    import types
+
+    firebase_admin = types.ModuleType('firebase_admin')
+    credentials = types.ModuleType('firebase_admin.credentials')
+    messaging = types.ModuleType('firebase_admin.messaging')
+    firebase_admin.initialize_app = lambda *args, **kwargs: time.sleep(init_delay)
+    credentials.Certificate = lambda path: path
+    messaging.UnavailableError = UnavailableError
+    messaging.UnregisteredError = UnregisteredError
+    # Enough of the messaging API for FirebaseClient; every token "succeeds" without leaving the machine
+    messaging.MulticastMessage = messaging.AndroidConfig = messaging.APNSConfig = types.SimpleNamespace
+    messaging.send_each_for_multicast = lambda message: types.SimpleNamespace(
+        responses=[types.SimpleNamespace(success=True, exception=None) for _ in message.tokens])
+    firebase_admin.credentials = credentials
+    firebase_admin.messaging = messaging
+    sys.modules.update({'firebase_admin': firebase_admin,
+                        'firebase_admin.credentials': credentials,
+                        'firebase_admin.messaging': messaging})
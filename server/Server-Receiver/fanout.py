@@ -0,0 +1,324 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+
+from admission import PRIORITY_TYPES
+from metrics import Histogram
+from payloads import prepare, send_prepared
+
+log = logging.getLogger(__name__)
+
+# Slow-consumer policies applied when a socket's outbound queue is full
+POLICY_DROP = 'drop'            # Drop the oldest queued frame, keep the newest
+POLICY_COALESCE = 'coalesce'    # Replace a queued full-state frame of the same type, else drop oldest (see offer)
+POLICY_DISCONNECT = 'disconnect'  # Close the socket; it will reconnect and resync
+
+# Full-state frames: a newer one makes a queued one of the same type redundant
+COALESCE_TYPES = frozenset(('status_update', 'sensor_snapshot'))
+
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_SEND_TIMEOUT = 5.0
+LATENCY_WINDOW = 512
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class BroadcastRecord:
+    """Tracks one broadcast until every targeted socket has been written or given up on."""
+
+    __slots__ = ('message_type', 'origin', 'enqueued_at', 'pending', 'delivered',
+                 'failed', 'finished_at', '_done', '_engine')
+
+    def __init__(self, engine, message_type, origin):
+        self._engine = engine
+        self.message_type = message_type
+        self.origin = origin
+        self.enqueued_at = time.perf_counter()
+        self.pending = 0
+        self.delivered = 0
+        self.failed = 0
+        self.finished_at = None
+        self._done = None
+
+    def _settle(self, ok):
+        if ok:
+            self.delivered += 1
+        else:
+            self.failed += 1
+        self.pending -= 1
+        if self.pending == 0:
+            self._finish()
+
+    def _finish(self):
+        self.finished_at = time.perf_counter()
+        self._engine._record_completion(self)
+        if self._done is not None and not self._done.done():
+            self._done.set_result(self)
+
+    @property
+    def latency(self):
+        """Seconds from the alert origin to the last delivery (None while in flight)."""
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.origin
+
+    async def wait(self, timeout=None):
+        """Wait until the last targeted socket has been written (or dropped)."""
+        if self.finished_at is not None:
+            return self
+        if self._done is None:
+            self._done = asyncio.get_running_loop().create_future()
+        await asyncio.wait_for(asyncio.shield(self._done), timeout)
+        return self
+
+
+def _droppable(message):
+    """Whether losing `message` loses nothing for good: unsequenced, or full state a later frame repeats."""
+    return message.type not in PRIORITY_TYPES and (message.seq is None or message.type in COALESCE_TYPES)
+
+
+class ClientChannel:
+    """A single socket with its own bounded outbound queue and writer task."""
+
+    def __init__(self, engine, client_id, ws, maxsize, policy, binary=False):
+        self.engine = engine
+        self.client_id = client_id
+        self.ws = ws
+        self.binary = binary    # Negotiated compact MessagePack frames instead of JSON
+        self.maxsize = maxsize
+        self.policy = policy
+        self.queue = deque()
+        self.dropped = 0
+        self.sent = 0
+        self.written_seq = 0    # Highest sequenced frame handed to the socket
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._writer())
+
+    def offer(self, message, record):
+        """Enqueue a PreparedMessage without blocking; apply the slow-consumer policy when full.
+
+        Alarm frames (PRIORITY_TYPES) go ahead of queued unsequenced frames
+        (status deltas, presence) and are never the ones dropped to make room.
+        Under POLICY_COALESCE only COALESCE_TYPES are replaced in place, and
+        sequenced notices (broadcasts, admin messages) are never dropped: when
+        nothing else can go, the socket is evicted and resumes from the replay ring.
+        """
+        if self.closed:
+            return False
+
+        priority = message.type in PRIORITY_TYPES
+        if len(self.queue) >= self.maxsize:
+            if self.policy == POLICY_DISCONNECT:
+                self.engine._evict(self, 'queue full')
+                return False
+
+            coalesce = self.policy == POLICY_COALESCE
+            if coalesce and message.type in COALESCE_TYPES:
+                for index, (queued, queued_record) in enumerate(self.queue):
+                    if queued.type == message.type:
+                        self.queue[index] = (message, record)
+                        self.dropped += 1
+                        if queued_record is not None:
+                            queued_record._settle(False)
+                        self._wakeup.set()
+                        return True
+
+            index = self._victim(priority, keep_notices=coalesce)
+            if index is None and coalesce and not _droppable(message):
+                self.engine._evict(self, 'queue full of sequenced frames')
+                return False
+            self.dropped += 1
+            if index is None:
+                return False    # Nothing queued may go: this frame is the one to go
+            _, victim_record = self.queue[index]
+            del self.queue[index]
+            if victim_record is not None:
+                victim_record._settle(False)
+
+        if priority:
+            # Never ahead of sequenced frames, so clients still see seqs in order
+            index = len(self.queue)
+            while index and self.queue[index - 1][0].seq is None \
+                    and self.queue[index - 1][0].type not in PRIORITY_TYPES:
+                index -= 1
+            self.queue.insert(index, (message, record))
+        else:
+            self.queue.append((message, record))
+        self._wakeup.set()
+        return True
+
+    def _victim(self, priority, keep_notices=False):
+        """Index of the frame to drop for a new one: the oldest non-alarm frame (never a notice if `keep_notices`)."""
+        for index, (queued, _) in enumerate(self.queue):
+            if queued.type not in PRIORITY_TYPES and (not keep_notices or _droppable(queued)):
+                return index
+        if keep_notices:
+            return None
+        return 0 if priority else None   # Only alarms queued: a newer alarm supersedes the oldest
+
+    async def _writer(self):
+        """Drain the queue into the socket, one frame at a time."""
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                message, record = self.queue.popleft()
+                try:
+                    await asyncio.wait_for(send_prepared(self.ws, message, self.binary), self.engine.send_timeout)
+                except Exception as e:
+                    if record is not None:
+                        record._settle(False)
+                    self.engine._evict(self, f'send failed: {e!r}')
+                    return
+
+                self.sent += 1
+                if message.seq is not None:
+                    self.written_seq = max(self.written_seq, message.seq)
+                if record is not None:
+                    record._settle(True)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._fail_pending()
+
+    def _fail_pending(self):
+        while self.queue:
+            _, record = self.queue.popleft()
+            if record is not None:
+                record._settle(False)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._wakeup.set()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._fail_pending()
+
+
+class FanoutEngine:
+    """Per-socket queued fan-out: a broadcast is one non-blocking enqueue per socket."""
+
+    def __init__(self, name='clients', queue_size=DEFAULT_QUEUE_SIZE,
+                 policy=POLICY_COALESCE, send_timeout=DEFAULT_SEND_TIMEOUT,
+                 on_evict=None):
+        self.name = name
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.on_evict = on_evict
+        self.channels = {}
+        self.evicted = 0
+        self.broadcasts = 0
+        self.targeted = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._enqueue_times = deque(maxlen=LATENCY_WINDOW)
+        self.fanout_histogram = Histogram()   # Enqueue to last socket written, per broadcast
+
+    def __len__(self):
+        return len(self.channels)
+
+    def queued(self):
+        """Frames waiting in all socket queues."""
+        return sum(len(channel.queue) for channel in self.channels.values())
+
+    def register(self, client_id, ws, binary=False):
+        channel = ClientChannel(self, client_id, ws, self.queue_size, self.policy, binary)
+        self.channels[client_id] = channel
+        return channel
+
+    def unregister(self, client_id):
+        channel = self.channels.pop(client_id, None)
+        if channel is not None:
+            channel.close()
+        return channel
+
+    def send(self, client_id, message):
+        """Queue a frame for a single socket (keeps ordering with broadcasts)."""
+        channel = self.channels.get(client_id)
+        if channel is None:
+            return False
+        return channel.offer(prepare(message), None)
+
+    def broadcast(self, message, origin=None, audience=None):
+        """Enqueue `message` on every channel and return its BroadcastRecord immediately.
+
+        The message is serialized once here and the same bytes are shared by every
+        queue. `origin` is the perf_counter() timestamp the alert originated at (for example
+        when the sensor packet arrived); it defaults to now. `audience`, if given, is the
+        set of client IDs to reach instead of everyone.
+        """
+        prepared = prepare(message)
+        record = BroadcastRecord(self, prepared.type,
+                                 origin if origin is not None else time.perf_counter())
+        self.broadcasts += 1
+
+        if audience is None:
+            channels = list(self.channels.values())
+        else:
+            channels = [channel for channel in map(self.channels.get, audience) if channel is not None]
+            self.targeted += 1
+        record.pending = len(channels)
+        if not channels:
+            record._finish()
+            return record
+
+        # Writers cannot run during this loop, so the record cannot finish early
+        for channel in channels:
+            if not channel.offer(prepared, record):
+                record._settle(False)
+        self._enqueue_times.append(time.perf_counter() - record.enqueued_at)
+        return record
+
+    def _evict(self, channel, reason):
+        if self.channels.get(channel.client_id) is channel:
+            del self.channels[channel.client_id]
+        channel.close()
+        self.evicted += 1
+        log.info("✗ Evicted %s from %s fan-out: %s", channel.client_id, self.name, reason)
+        if self.on_evict is not None:
+            self.on_evict(channel.client_id, channel.ws)
+
+    def _record_completion(self, record):
+        self._latencies.append(record.finished_at - record.origin)
+        self.fanout_histogram.observe(record.finished_at - record.enqueued_at)
+
+    def stats(self):
+        """Snapshot of fan-out health, latencies in milliseconds."""
+        latencies = list(self._latencies)
+        enqueue_times = list(self._enqueue_times)
+        depths = [len(channel.queue) for channel in self.channels.values()]
+        return {
+            'sockets': len(self.channels),
+            'binary_sockets': sum(1 for channel in self.channels.values() if channel.binary),
+            'policy': self.policy,
+            'queue_size': self.queue_size,
+            'broadcasts': self.broadcasts,
+            'targeted': self.targeted,
+            'evicted': self.evicted,
+            'dropped': sum(channel.dropped for channel in self.channels.values()),
+            'max_queue_depth': max(depths) if depths else 0,
+            'delivery_p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'delivery_p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'enqueue_p50_ms': round(percentile(enqueue_times, 50) * 1000, 3),
+            'enqueue_p99_ms': round(percentile(enqueue_times, 99) * 1000, 3),
+        }
+
+    async def close(self):
+        for channel in list(self.channels.values()):
+            channel.close()
+        self.channels.clear()
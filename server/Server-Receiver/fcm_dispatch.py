@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from fanout import percentile
+from metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+MAX_BATCH = 500          # FCM multicast limit per request
+DEFAULT_WORKERS = 8      # Concurrent batches in flight
+MAX_RETRIES = 3          # Extra attempts for transiently failed tokens
+BACKOFF_BASE = 0.5       # Seconds; doubled per attempt, then fully jittered
+BACKOFF_CAP = 8.0
+LATENCY_SAMPLES = 1024
+CREDENTIALS_FILE = 'serviceAccountKey.json'
+FIREBASE_WAIT = 10.0     # Seconds a push waits for an SDK that is still initializing
+
+# LazyFirebaseClient states
+FIREBASE_LOADING = 'loading'
+FIREBASE_READY = 'ready'
+FIREBASE_UNAVAILABLE = 'unavailable'
+
+# firebase_admin.messaging exception class names, so this module never imports the SDK
+UNREGISTERED_ERRORS = frozenset({'UnregisteredError', 'SenderIdMismatchError'})
+TRANSIENT_ERRORS = frozenset({
+    'UnavailableError', 'InternalError', 'QuotaExceededError', 'DeadlineExceededError',
+    'ConnectionError', 'TimeoutError', 'ConnectTimeout', 'ReadTimeout'
+})
+
+
+def is_unregistered(exc):
+    return type(exc).__name__ in UNREGISTERED_ERRORS
+
+
+def is_transient(exc):
+    return type(exc).__name__ in TRANSIENT_ERRORS
+
+
+class FirebaseClient:
+    """The real FCM backend: one multicast request per call.
+
+    Any object with the same `send(tokens, data)` method can stand in for it;
+    `send` returns one entry per token, None on success or the exception that
+    token failed with.
+    """
+
+    def __init__(self, messaging=None):
+        if messaging is None:
+            from firebase_admin import messaging
+        self.messaging = messaging
+        # send_multicast is deprecated (and removed in newer SDKs) in favour of send_each_for_multicast
+        self._send = getattr(messaging, 'send_each_for_multicast', None) or messaging.send_multicast
+
+    def send(self, tokens, data):
+        message = self.messaging.MulticastMessage(
+            data=data,
+            tokens=tokens,
+            android=self.messaging.AndroidConfig(
+                priority="high"
+            ),
+            apns=self.messaging.APNSConfig(
+                headers={"apns-priority": "10"}
+            )
+        )
+        batch_response = self._send(message)
+        return [None if response.success else (response.exception or RuntimeError('FCM send failed'))
+                for response in batch_response.responses]
+
+
+class FirebaseUnavailable(Exception):
+    """Firebase could not be initialized (or not in time); the push was not attempted."""
+
+
+class LazyFirebaseClient:
+    """FirebaseClient whose SDK is imported and initialized on a background thread.
+
+    Importing firebase_admin and the Google libraries under it, then reading
+    the service account, takes most of a second; `start` begins it and
+    returns at once, so WebSocket and UDP alerts are served meanwhile. A
+    push sent before it finishes waits up to `wait` seconds on the dispatcher
+    pool. Without the SDK or the key file the client stays unavailable
+    instead of stopping the server, and alarms go out over WebSockets only.
+    """
+
+    def __init__(self, credentials_path=CREDENTIALS_FILE, wait=FIREBASE_WAIT):
+        self.credentials_path = credentials_path
+        self.wait = wait
+        self.state = FIREBASE_LOADING
+        self.error = None
+        self.init_ms = None
+        self._client = None
+        self._done = threading.Event()
+        self._thread = None
+
+    @property
+    def available(self):
+        return self.state != FIREBASE_UNAVAILABLE
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.initialize, name='firebase-init', daemon=True)
+            self._thread.start()
+        return self
+
+    def initialize(self):
+        """Import and initialize the SDK (blocking; `start` runs it on its own thread)."""
+        started = time.perf_counter()
+        try:
+            import firebase_admin
+            from firebase_admin import credentials, messaging
+            firebase_admin.initialize_app(credentials.Certificate(self.credentials_path))
+            self._client = FirebaseClient(messaging)
+        except FileNotFoundError:
+            self.error = f"'{self.credentials_path}' not found"
+        except Exception as e:  # No SDK, an unreadable key, ...
+            self.error = f'{type(e).__name__}: {e}'
+        self.init_ms = round((time.perf_counter() - started) * 1000, 1)
+        if self._client is not None:
+            self.state = FIREBASE_READY
+            log.info("✓ Firebase Admin SDK initialized in %s ms", self.init_ms)
+        else:
+            self.state = FIREBASE_UNAVAILABLE
+            log.warning("🔥 Firebase unavailable (%s): alarms go out over WebSockets only", self.error)
+        self._done.set()
+
+    def send(self, tokens, data):
+        # Runs on a dispatcher pool thread, so waiting here never blocks the event loop
+        self._done.wait(self.wait)
+        if self._client is None:
+            raise FirebaseUnavailable(self.error or 'Firebase is still initializing')
+        return self._client.send(tokens, data)
+
+    def status(self):
+        return {'state': self.state, 'error': self.error, 'init_ms': self.init_ms}
+
+
+class DispatchResult:
+    """Outcome of one `FcmDispatcher.dispatch` call."""
+
+    __slots__ = ('tokens', 'sent', 'failed', 'skipped', 'pruned', 'batches', 'retries', 'elapsed')
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.pruned = []
+        self.batches = 0
+        self.retries = 0
+        self.elapsed = 0.0
+
+    def to_dict(self):
+        return {
+            'tokens': self.tokens,
+            'sent': self.sent,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'pruned': len(self.pruned),
+            'batches': self.batches,
+            'retries': self.retries,
+            'elapsed_ms': round(self.elapsed * 1000, 1)
+        }
+
+
+class FcmDispatcher:
+    """Chunks tokens into MAX_BATCH multicasts and sends them concurrently.
+
+    Blocking SDK calls run on a dedicated, bounded thread pool so push
+    delivery never competes with `asyncio.to_thread` work such as map
+    uploads. Tokens that fail transiently are retried with jittered
+    exponential backoff; tokens Firebase reports as unregistered are passed
+    to `on_unregistered(token)` and never retried. While the client reports
+    itself unavailable (see LazyFirebaseClient) pushes are skipped outright.
+    """
+
+    def __init__(self, client, on_unregistered=None, max_workers=DEFAULT_WORKERS,
+                 batch_size=MAX_BATCH, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_cap=BACKOFF_CAP):
+        self.client = client
+        self.on_unregistered = on_unregistered
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fcm')
+        self.max_workers = max_workers
+        self._batch_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.batch_histogram = Histogram()      # One FCM call, observed on pool threads
+        self.dispatch_histogram = Histogram()   # Whole dispatch, retries included
+        self._histogram_lock = threading.Lock()
+
+        # Counters
+        self.dispatches = 0
+        self.batches = 0
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.retries = 0
+        self.pruned = 0
+        self.last_result = None
+
+    @property
+    def available(self):
+        return getattr(self.client, 'available', True)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    async def dispatch(self, tokens, data):
+        """Send `data` to every token; returns a DispatchResult once all batches settle."""
+        result = DispatchResult(len(tokens))
+        if not self.available:
+            result.skipped = len(tokens)
+            self.skipped += result.skipped
+            self.last_result = result
+            return result
+        start = time.perf_counter()
+        chunks = [tokens[i:i + self.batch_size] for i in range(0, len(tokens), self.batch_size)]
+        await asyncio.gather(*(self._send_batch(chunk, data, result) for chunk in chunks))
+        result.elapsed = time.perf_counter() - start
+        self.dispatch_histogram.observe(result.elapsed)
+
+        for token in result.pruned:
+            if self.on_unregistered is not None:
+                self.on_unregistered(token)
+        self.dispatches += 1
+        self.sent += result.sent
+        self.failed += result.failed
+        self.retries += result.retries
+        self.pruned += len(result.pruned)
+        self.last_result = result
+        return result
+
+    async def _send_batch(self, tokens, data, result):
+        loop = asyncio.get_running_loop()
+        pending = tokens
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                result.retries += 1
+                await asyncio.sleep(self._backoff(attempt - 1))
+
+            try:
+                outcomes = await loop.run_in_executor(self._executor, self._timed_send, pending, data)
+            except Exception as e:
+                # The whole request failed (network, auth, ...); every token shares its fate
+                outcomes = [e] * len(pending)
+            result.batches += 1
+            self.batches += 1
+
+            retry = []
+            for token, error in zip(pending, outcomes):
+                if error is None:
+                    result.sent += 1
+                elif is_unregistered(error):
+                    result.failed += 1
+                    result.pruned.append(token)
+                elif is_transient(error) and attempt < self.max_retries:
+                    retry.append(token)
+                else:
+                    result.failed += 1
+            if not retry:
+                return
+            pending = retry
+
+    def _timed_send(self, tokens, data):
+        """Runs on a pool thread; latency excludes time spent queued for a worker."""
+        started = time.perf_counter()
+        try:
+            return self.client.send(tokens, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._batch_latencies.append(elapsed)
+            with self._histogram_lock:
+                self.batch_histogram.observe(elapsed)
+
+    def queued(self):
+        """Batches waiting for a free pool thread."""
+        return self._executor._work_queue.qsize()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        latencies = list(self._batch_latencies)
+        last = self.last_result.to_dict() if self.last_result is not None else None
+        return {
+            'workers': self.max_workers,
+            'batch_size': self.batch_size,
+            'dispatches': self.dispatches,
+            'batches': self.batches,
+            'sent': self.sent,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'retries': self.retries,
+            'pruned_tokens': self.pruned,
+            'batch_latency_p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'batch_latency_p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+            'last_dispatch': last,
+            'firebase': self.client.status() if hasattr(self.client, 'status') else None
+        }
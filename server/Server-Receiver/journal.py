@@ -0,0 +1,307 @@
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+from fanout import percentile
+from metrics import Histogram
+from occupants import EVENT_REMOVE
+from payloads import dumps, loads
+
+log = logging.getLogger(__name__)
+
+# Record kinds
+KIND_OCCUPANT = 'occupant'     # {'e': event, 'o': Occupant.to_record()}
+KIND_TOKEN = 'token'           # {'token': ...} reported unregistered by FCM
+KIND_ALARM = 'alarm'           # {'active': bool, 'zones': [area, ...] or None for site-wide}
+KIND_BROADCAST = 'broadcast'   # {'m': message sent to every client}
+
+SNAPSHOT_EVERY = 50000         # Journal records between compacted snapshots
+MAX_BATCH = 4096               # Records written per group commit, at most
+RECENT_BROADCASTS = 50         # Broadcasts kept in the compacted state
+FSYNC_SAMPLES = 1024
+
+_SEGMENT = re.compile(r'^journal-(\d{8})\.log$')
+_SNAPSHOT = re.compile(r'^snapshot-(\d{8})\.json$')
+_STOP = object()
+
+
+class JournalState:
+    """What the journal records add up to; also the body of a snapshot."""
+
+    def __init__(self):
+        self.occupants = {}          # stable_id -> Occupant.to_record()
+        self.alert_active = False
+        self.alarm_zones = None      # Zones the active alarm covers; None is the whole site
+        self.broadcasts = deque(maxlen=RECENT_BROADCASTS)
+        self.records = 0
+
+    def apply(self, record):
+        kind = record.get('k')
+        if kind == KIND_OCCUPANT:
+            occupant = record['o']
+            if record.get('e') == EVENT_REMOVE:
+                self.occupants.pop(occupant['stable_id'], None)
+            else:
+                self.occupants[occupant['stable_id']] = occupant
+        elif kind == KIND_TOKEN:
+            for occupant in self.occupants.values():
+                if occupant.get('fcm_token') == record['token']:
+                    occupant['fcm_token'] = None
+        elif kind == KIND_ALARM:
+            self.alert_active = record['active']
+            self.alarm_zones = record.get('zones')
+        elif kind == KIND_BROADCAST:
+            self.broadcasts.append(record)
+        self.records += 1
+
+    def to_snapshot(self):
+        return {
+            'alert_active': self.alert_active,
+            'alarm_zones': self.alarm_zones,
+            'occupants': list(self.occupants.values()),
+            'broadcasts': list(self.broadcasts)
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        state = cls()
+        state.alert_active = snapshot.get('alert_active', False)
+        state.alarm_zones = snapshot.get('alarm_zones')
+        state.occupants = {occupant['stable_id']: occupant for occupant in snapshot.get('occupants', ())}
+        state.broadcasts.extend(snapshot.get('broadcasts', ()))
+        return state
+
+
+def _fsync_directory(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on every platform (e.g. Windows)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class EventJournal:
+    """Append-only, group-committed log of occupant, alarm and broadcast events.
+
+    `append` only queues the record; a background thread serializes whatever
+    has queued up, writes it with one write() and makes it durable with one
+    fsync (group commit), so the event loop never waits on the disk. Every
+    SNAPSHOT_EVERY records the thread writes a compacted snapshot and starts
+    a new journal segment, which keeps replay short.
+
+    On disk: snapshot-NNNNNNNN.json holds the state at the start of
+    journal-NNNNNNNN.log; recovery loads the newest snapshot and replays
+    segments from its generation on. A torn final line (crash mid-write) is
+    ignored.
+    """
+
+    def __init__(self, directory, snapshot_every=SNAPSHOT_EVERY, fsync=True):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.state = JournalState()
+        self.generation = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._file = None
+        self._since_snapshot = 0
+        self._fsync_times = deque(maxlen=FSYNC_SAMPLES)
+        self.commit_histogram = Histogram()   # Seconds per group commit (write + fsync), writer thread only
+
+        # Counters
+        self.appended = 0
+        self.written = 0
+        self.batches = 0
+        self.snapshots = 0
+        self.write_errors = 0
+        self.lost = 0
+        self.replayed = 0
+        self.replay_ms = None
+        self.torn_records = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # --- Recovery ---
+
+    def _generations(self, pattern):
+        found = []
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                found.append(int(match.group(1)))
+        return sorted(found)
+
+    def _segment_path(self, generation):
+        return os.path.join(self.directory, f'journal-{generation:08d}.log')
+
+    def _snapshot_path(self, generation):
+        return os.path.join(self.directory, f'snapshot-{generation:08d}.json')
+
+    def replay(self):
+        """Rebuild state from disk; call once, before `start`. Returns the JournalState."""
+        started = time.perf_counter()
+        snapshots = self._generations(_SNAPSHOT)
+        state = JournalState()
+        generation = 0
+        for candidate in reversed(snapshots):
+            try:
+                with open(self._snapshot_path(candidate), 'rb') as f:
+                    state = JournalState.from_snapshot(loads(f.read()))
+                generation = candidate
+                break
+            except (OSError, ValueError) as e:
+                log.warning("⚠️ Skipping unreadable journal snapshot %s: %s", candidate, e)
+
+        for segment in self._generations(_SEGMENT):
+            if segment < generation:
+                continue
+            with open(self._segment_path(segment), 'rb') as f:
+                data = f.read()
+            apply = state.apply
+            for line in data.split(b'\n'):
+                if not line:
+                    continue
+                try:
+                    apply(loads(line))
+                except ValueError:
+                    self.torn_records += 1
+                    continue
+                self.replayed += 1
+            generation = max(generation, segment)
+
+        self.state = state
+        self.generation = generation
+        self._since_snapshot = self.replayed
+        self.replay_ms = round((time.perf_counter() - started) * 1000, 2)
+        return state
+
+    # --- Writing ---
+
+    def start(self):
+        self._file = open(self._segment_path(self.generation), 'ab')
+        if self._file.tell():
+            # Terminate a torn tail so the next record doesn't get glued onto it
+            with open(self._segment_path(self.generation), 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write(b'\n')
+        self._thread = threading.Thread(target=self._writer, name='journal-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def append(self, kind, **data):
+        """Queue one record; never blocks on disk."""
+        data['k'] = kind
+        data['t'] = round(time.time(), 3)
+        self._queue.put(data)
+        self.appended += 1
+
+    def _writer(self):
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            batch = [record]
+            stop = False
+            while len(batch) < MAX_BATCH:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stop = True
+                    break
+                batch.append(record)
+            self._commit(batch)
+            if stop:
+                break
+        self._file.close()
+
+    def _commit(self, batch):
+        committed = time.perf_counter()
+        try:
+            self._file.write(b''.join(dumps(record) + b'\n' for record in batch))
+            self._file.flush()
+            if self.fsync:
+                started = time.perf_counter()
+                os.fsync(self._file.fileno())
+                self._fsync_times.append(time.perf_counter() - started)
+        except OSError as e:
+            self.write_errors += 1
+            self.lost += len(batch)
+            log.error("🔥 Journal write failed: %s", e)
+            return
+        self.commit_histogram.observe(time.perf_counter() - committed)
+        for record in batch:
+            self.state.apply(record)
+        self.written += len(batch)
+        self.batches += 1
+        self._since_snapshot += len(batch)
+        if self._since_snapshot >= self.snapshot_every:
+            self._snapshot()
+
+    def _snapshot(self):
+        """Compact everything so far into snapshot N+1 and start segment N+1."""
+        generation = self.generation + 1
+        path = self._snapshot_path(generation)
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(dumps(self.state.to_snapshot()))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            _fsync_directory(self.directory)
+        except OSError as e:
+            self.write_errors += 1
+            log.error("🔥 Journal snapshot failed: %s", e)
+            return
+
+        self._file.close()
+        self.generation = generation
+        self._file = open(self._segment_path(generation), 'ab')
+        self._since_snapshot = 0
+        self.snapshots += 1
+
+        # Older segments and snapshots are fully covered by the new snapshot
+        for old in self._generations(_SEGMENT):
+            if old < generation:
+                os.remove(self._segment_path(old))
+        for old in self._generations(_SNAPSHOT):
+            if old < generation:
+                os.remove(self._snapshot_path(old))
+
+    def close(self):
+        """Flush what is queued and stop the writer (blocking; run off the event loop)."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        fsync_times = list(self._fsync_times)
+        return {
+            'directory': self.directory,
+            'generation': self.generation,
+            'appended': self.appended,
+            'written': self.written,
+            'pending': self.appended - self.written - self.lost,
+            'lost': self.lost,
+            'batches': self.batches,
+            'avg_batch': round(self.written / self.batches, 1) if self.batches else 0,
+            'fsync_p50_ms': round(percentile(fsync_times, 50) * 1000, 3) if fsync_times else None,
+            'fsync_p99_ms': round(percentile(fsync_times, 99) * 1000, 3) if fsync_times else None,
+            'snapshots': self.snapshots,
+            'since_snapshot': self._since_snapshot,
+            'write_errors': self.write_errors,
+            'replayed': self.replayed,
+            'replay_ms': self.replay_ms,
+            'torn_records': self.torn_records,
+            'occupants': len(self.state.occupants)
+        }
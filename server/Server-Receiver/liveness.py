@@ -0,0 +1,254 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+
+log = logging.getLogger(__name__)
+
+PING_INTERVAL = 20.0     # Seconds of silence before a socket is pinged
+PING_TIMEOUT = 10.0      # Seconds a pinged socket has to answer (any frame counts)
+WHEEL_TICK = 1.0         # Heartbeat wheel resolution, seconds
+OFFLINE_GRACE = 900.0    # Seconds an offline occupant is kept for a reconnect
+GRACE_TICK = 5.0         # How often expired grace periods are collected
+
+
+class TimerWheel:
+    """Hashed timing wheel: O(1) schedule, expiry in bulk once per tick.
+
+    Entries are never moved or cancelled; the owner re-checks each expired
+    key against its own state (lazy expiry), so activity on a socket costs
+    one timestamp write instead of a timer reschedule.
+    """
+
+    def __init__(self, tick=WHEEL_TICK, slots=64):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.position = 0
+        self.started = time.monotonic()
+        self.size = 0
+
+    def _now_ticks(self, now):
+        return int((now - self.started) / self.tick)
+
+    def schedule(self, key, delay, now=None):
+        now = time.monotonic() if now is None else now
+        due = self._now_ticks(now) + max(1, math.ceil(delay / self.tick))
+        self.slots[due % len(self.slots)].append((due, key))
+        self.size += 1
+
+    def expire(self, now=None):
+        """Keys whose delay has elapsed since the previous call."""
+        current = self._now_ticks(time.monotonic() if now is None else now)
+        expired = []
+        # Visit every slot passed since last time, at most one full turn
+        for position in range(self.position, min(current, self.position + len(self.slots) - 1) + 1):
+            slot = self.slots[position % len(self.slots)]
+            if not slot:
+                continue
+            keep = []
+            for due, key in slot:
+                if due <= current:
+                    expired.append(key)
+                else:
+                    keep.append((due, key))  # A later turn of the wheel
+            slot[:] = keep
+        self.position = current
+        self.size -= len(expired)
+        return expired
+
+
+class _Watched:
+    __slots__ = ('ws', 'transport', 'kind', 'last_seen', 'pinged_at')
+
+    def __init__(self, ws, transport, kind, now):
+        self.ws = ws
+        self.transport = transport
+        self.kind = kind
+        self.last_seen = now
+        self.pinged_at = None
+
+
+class HeartbeatMonitor:
+    """Server-driven WebSocket heartbeats with bulk reaping of dead sockets.
+
+    Any frame from a socket (a message, a PING or our PONG) counts as a sign
+    of life via `touch`. A socket silent for `interval` is pinged; one still
+    silent `timeout` later is dead. Once per tick, every socket that died is
+    handed to `on_dead([(socket_id, kind, ws, transport), ...])` in one call,
+    so cleanup and the admin presence update happen once per sweep rather
+    than once per socket, and never in the middle of an alarm broadcast.
+    """
+
+    def __init__(self, on_dead, interval=PING_INTERVAL, timeout=PING_TIMEOUT, tick=WHEEL_TICK):
+        self.on_dead = on_dead
+        self.interval = interval
+        self.timeout = timeout
+        self.wheel = TimerWheel(tick)
+        self._watched = {}
+        self._task = None
+
+        # Counters
+        self.pings = 0
+        self.ping_errors = 0
+        self.reaped = 0
+        self.sweeps = 0
+
+    def __len__(self):
+        return len(self._watched)
+
+    def register(self, socket_id, ws, transport=None, kind='client'):
+        now = time.monotonic()
+        self._watched[socket_id] = _Watched(ws, transport, kind, now)
+        if self.interval:
+            self.wheel.schedule(socket_id, self.interval, now)
+
+    def touch(self, socket_id):
+        watched = self._watched.get(socket_id)
+        if watched is not None:
+            watched.last_seen = time.monotonic()
+
+    def unregister(self, socket_id):
+        """Stop watching a socket; returns when it was last heard from, if it was watched."""
+        watched = self._watched.pop(socket_id, None)
+        return watched.last_seen if watched is not None else None
+
+    def start(self):
+        if self._task is None and self.interval:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            try:
+                self.sweep()
+            except Exception:
+                log.exception("Heartbeat sweep failed")
+
+    def sweep(self, now=None):
+        """Ping what went quiet, reap what stayed quiet; returns the number reaped."""
+        now = time.monotonic() if now is None else now
+        self.sweeps += 1
+        dead = []
+        loop = asyncio.get_running_loop()
+        for socket_id in self.wheel.expire(now):
+            watched = self._watched.get(socket_id)
+            if watched is None:
+                continue  # Closed normally since it was scheduled
+            idle = now - watched.last_seen
+            if watched.pinged_at is not None and watched.pinged_at >= watched.last_seen:
+                # Pinged and nothing heard since
+                if now - watched.pinged_at >= self.timeout:
+                    dead.append(socket_id)
+                else:
+                    self.wheel.schedule(socket_id, self.timeout - (now - watched.pinged_at), now)
+            elif idle >= self.interval:
+                watched.pinged_at = now
+                self.pings += 1
+                loop.create_task(self._ping(watched.ws))
+                self.wheel.schedule(socket_id, self.timeout, now)
+            else:
+                self.wheel.schedule(socket_id, self.interval - idle, now)
+
+        if dead:
+            reaped = []
+            for socket_id in dead:
+                watched = self._watched.pop(socket_id)
+                reaped.append((socket_id, watched.kind, watched.ws, watched.transport))
+            self.reaped += len(reaped)
+            self.on_dead(reaped)
+        return len(dead)
+
+    async def _ping(self, ws):
+        try:
+            await asyncio.wait_for(ws.ping(), self.timeout)
+        except Exception:
+            # Can't even write to it; the next sweep after `timeout` reaps it
+            self.ping_errors += 1
+
+    def stats(self):
+        return {
+            'watched': len(self._watched),
+            'interval_s': self.interval,
+            'timeout_s': self.timeout,
+            'pings': self.pings,
+            'ping_errors': self.ping_errors,
+            'reaped': self.reaped,
+            'sweeps': self.sweeps,
+            'wheel_entries': self.wheel.size
+        }
+
+
+class GraceReaper:
+    """Forgets occupants who stayed offline longer than `grace`, earliest deadline first.
+
+    `add(stable_id)` when someone goes offline pushes a deadline onto a
+    heap; nothing is removed when they come back. When a deadline passes,
+    `on_expire(stable_ids)` is called with everyone due, and the owner
+    decides (by re-checking who is still offline) what to actually purge.
+    """
+
+    def __init__(self, on_expire, grace=OFFLINE_GRACE, tick=GRACE_TICK):
+        self.on_expire = on_expire
+        self.grace = grace
+        self.tick = tick
+        self._heap = []
+        self._task = None
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, stable_id, since=None):
+        if not self.grace:
+            return  # Keep everyone forever
+        since = time.monotonic() if since is None else since
+        heapq.heappush(self._heap, (since + self.grace, stable_id))
+
+    def defer(self, stable_ids, delay):
+        """Look at these again in `delay` seconds (e.g. not while an alarm is active)."""
+        due = time.monotonic() + delay
+        for stable_id in stable_ids:
+            heapq.heappush(self._heap, (due, stable_id))
+
+    def start(self):
+        if self._task is None and self.grace:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.collect()
+            except Exception:
+                log.exception("Offline grace sweep failed")
+
+    def collect(self, now=None):
+        now = time.monotonic() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        if due:
+            self.expired += len(due)
+            self.on_expire(due)
+        return due
+
+    def stats(self):
+        return {
+            'grace_s': self.grace,
+            'pending': len(self._heap),
+            'next_due_s': round(self._heap[0][0] - time.monotonic(), 1) if self._heap else None,
+            'expired': self.expired
+        }
@@ -0,0 +1,121 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+FORMAT_TEXT = 'text'
+FORMAT_JSON = 'json'
+
+# LogRecord attributes that are not `extra=` fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_settings = {'level': 'INFO', 'format': FORMAT_TEXT}
+_listener = None
+_listener_pid = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Hands the record to the listener thread as-is.
+
+    The stock QueueHandler formats on the calling thread; here the event
+    loop only pays for building the LogRecord and a queue put, and the
+    %-formatting, JSON encoding and write all happen on the listener thread.
+    Log arguments must therefore not be mutated after the call.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, pid, msg plus any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'msg': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The console output people are used to, with a timestamp and `extra=` fields appended."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname).1s %(message)s', '%H:%M:%S')
+
+    def format(self, record):
+        line = super().format(record)
+        extra = ' '.join(f'{key}={value}' for key, value in record.__dict__.items() if key not in _RESERVED)
+        return f'{line}  [{extra}]' if extra else line
+
+
+def setup_logging(level=None, fmt=None):
+    """Route every logger through a queue to one writer thread (once per process).
+
+    Safe to call again after fork(): the child gets its own listener thread,
+    reusing the parent's level and format unless new ones are given.
+    """
+    global _listener, _listener_pid
+    if level is not None:
+        _settings['level'] = level
+    if fmt is not None:
+        _settings['format'] = fmt
+    if _listener is not None and _listener_pid == os.getpid():
+        logging.getLogger().setLevel(_settings['level'])
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if _settings['format'] == FORMAT_JSON else TextFormatter())
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [DeferredQueueHandler(log_queue)]
+    root.setLevel(_settings['level'])
+    logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+    atexit.register(flush_logging)
+
+
+def flush_logging():
+    """Write out everything still queued and stop the writer thread."""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        _listener = None
+
+
+class RateLimitedLog:
+    """Logs at most once per `interval` seconds and counts what it swallowed in between."""
+
+    def __init__(self, logger, interval=10.0):
+        self.logger = logger
+        self.interval = interval
+        self._last = 0.0
+        self.suppressed = 0
+
+    def warning(self, msg, *args):
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            self.suppressed += 1
+            return
+        self._last = now
+        if self.suppressed:
+            msg += ' (%d similar suppressed)'
+            args += (self.suppressed,)
+            self.suppressed = 0
+        self.logger.warning(msg, *args)
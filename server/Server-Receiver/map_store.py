@@ -0,0 +1,174 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from collections import OrderedDict
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+MAX_MAP_SIZE = 20 * 1024 * 1024
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+_DATA_URL_RE = re.compile(r'^data:(?P<ctype>[\w.+-]+/[\w.+-]+)?(?:;[^,]*)?;base64,', re.IGNORECASE)
+
+
+class MapStoreError(ValueError):
+    """Raised for malformed or oversized map uploads."""
+
+
+def is_digest(value):
+    return bool(value) and bool(_DIGEST_RE.match(value))
+
+
+def decode_data_url(data_url):
+    """Split a `data:<type>;base64,<payload>` URL into (bytes, content_type)."""
+    match = _DATA_URL_RE.match(data_url or '')
+    if not match:
+        raise MapStoreError('map_data must be a base64 data: URL')
+    try:
+        data = base64.b64decode(data_url[match.end():], validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise MapStoreError(f'invalid base64 map_data: {e}')
+    return data, (match.group('ctype') or 'application/octet-stream')
+
+
+class MapStore:
+    """Content-addressed blob store for evacuation maps.
+
+    Each map is written once to `root/<aa>/<sha256>` (with its content type in a
+    `.type` sidecar) and the most recently served blobs are kept in an in-memory
+    LRU bounded by total size.
+    """
+
+    def __init__(self, root, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.root = root
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()  # digest -> (data, content_type)
+        self._cached_size = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _remember(self, digest, data, content_type):
+        if digest in self._cache:
+            self._cache.move_to_end(digest)
+            return
+        if len(data) > self.cache_bytes:
+            return
+        self._cache[digest] = (data, content_type)
+        self._cached_size += len(data)
+        while self._cached_size > self.cache_bytes:
+            _, (evicted, _) = self._cache.popitem(last=False)
+            self._cached_size -= len(evicted)
+
+    def put(self, data, content_type='application/octet-stream'):
+        """Store a blob (no-op if already present) and return its SHA-256 hex digest.
+
+        Hashes and writes synchronously; call through asyncio.to_thread for large maps.
+        """
+        if not data:
+            raise MapStoreError('empty map upload')
+        if len(data) > MAX_MAP_SIZE:
+            raise MapStoreError(f'map exceeds {MAX_MAP_SIZE} bytes')
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write-then-rename so a crash never leaves a truncated blob under its hash
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            with open(path + '.type', 'w') as f:
+                f.write(content_type)
+            os.replace(tmp_path, path)
+
+        self._remember(digest, data, content_type)
+        return digest
+
+    def put_data_url(self, data_url):
+        data, content_type = decode_data_url(data_url)
+        return self.put(data, content_type), content_type
+
+    def cached(self, digest):
+        """(data, content_type) if the blob is in memory, else None; never touches the disk."""
+        entry = self._cache.get(digest)
+        if entry is not None:
+            self._cache.move_to_end(digest)
+            self.hits += 1
+        return entry
+
+    def get(self, digest):
+        """Return (data, content_type) for a digest, or None if unknown.
+
+        May read the blob from disk; on the event loop try `cached` first and
+        call this through asyncio.to_thread.
+        """
+        if not is_digest(digest):
+            return None
+
+        entry = self.cached(digest)
+        if entry is not None:
+            return entry
+
+        path = self._path(digest)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            with open(path + '.type') as f:
+                content_type = f.read().strip() or 'application/octet-stream'
+        except FileNotFoundError:
+            content_type = 'application/octet-stream'
+
+        self.misses += 1
+        self._remember(digest, data, content_type)
+        return data, content_type
+
+    def __contains__(self, digest):
+        return is_digest(digest) and (digest in self._cache or os.path.exists(self._path(digest)))
+
+    def stats(self):
+        return {
+            'cached_blobs': len(self._cache),
+            'cached_bytes': self._cached_size,
+            'cache_limit_bytes': self.cache_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def parse_range(header, size):
+    """Parse a single `bytes=` Range header into (start, end) inclusive.
+
+    Returns None when the header should be ignored and raises MapStoreError
+    when the range is unsatisfiable.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec:
+        return None  # Multipart ranges are not worth supporting for images
+    first, _, last = spec.partition('-')
+    # MapStoreError is a ValueError too, so only the int() conversions sit in the try
+    try:
+        if first == '':
+            length = int(last)
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if first == '':
+        if length <= 0:
+            raise MapStoreError('unsatisfiable range')
+        start, end = max(0, size - length), size - 1
+    if start >= size or start > end:
+        raise MapStoreError('unsatisfiable range')
+    return start, min(end, size - 1)
@@ -0,0 +1,156 @@
+import asyncio
+import math
+from bisect import bisect_left
+
+# Seconds; covers a 1 ms broadcast up to a 30 s FCM deadline
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_INTERVAL = 0.1   # Seconds between event-loop lag probes
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics); `observe` is a bisect and three adds.
+
+    Not locked: observe from one thread only (the event loop), or hold a lock.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(upper_bound, count <= bound)], ending with +Inf."""
+        running = 0
+        result = []
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                     for key, value in labels.items())
+    return '{' + pairs + '}'
+
+
+class MetricsRegistry:
+    """Prometheus text exposition for values the components already keep.
+
+    Counters and gauges are callables read at scrape time, so nothing on the
+    hot path pays for them: `fn()` returns a number, or a list of
+    (labels_dict, number) for a labelled family. Histograms are Histogram
+    objects the components observe into; a labelled family is a list of
+    (labels_dict, Histogram). `const_labels` (e.g. the worker id) go on
+    every series, since a scrape of a shared port lands on any one worker.
+    """
+
+    def __init__(self, prefix='fire_', const_labels=None):
+        self.prefix = prefix
+        self.const_labels = dict(const_labels or {})
+        self._families = []   # (name, type, help, source)
+
+    def counter(self, name, help, fn):
+        if not name.endswith('_total'):
+            name += '_total'
+        self._families.append((self.prefix + name, COUNTER, help, fn))
+
+    def gauge(self, name, help, fn):
+        self._families.append((self.prefix + name, GAUGE, help, fn))
+
+    def histogram(self, name, help, histograms):
+        """`histograms` may also be a callable returning either form (or None while absent)."""
+        self._families.append((self.prefix + name, HISTOGRAM, help, histograms))
+
+    def render(self):
+        lines = []
+        for name, kind, help, source in self._families:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == HISTOGRAM:
+                if callable(source):
+                    source = source()
+                if source is None:
+                    continue
+                series = source if isinstance(source, list) else [({}, source)]
+                for labels, histogram in series:
+                    labels = dict(self.const_labels, **labels)
+                    for bound, count in histogram.cumulative():
+                        bucket_labels = dict(labels, le=_format_value(float(bound)))
+                        lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {count}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+                continue
+            try:
+                value = source()
+            except Exception as e:
+                lines.append(f'# {name} unavailable: {e!r}')
+                continue
+            series = value if isinstance(value, list) else [({}, value)]
+            for labels, sample in series:
+                labels = dict(self.const_labels, **labels)
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(sample)}')
+        return '\n'.join(lines) + '\n'
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task that asked to sleep LAG_INTERVAL.
+
+    Lag is time the loop spent running something else: a long callback, a
+    blocking call, a GC pause. One wakeup per interval, so the probe itself
+    costs nothing measurable.
+    """
+
+    def __init__(self, interval=LAG_INTERVAL, histogram=None):
+        self.interval = interval
+        self.histogram = histogram or Histogram()
+        self.last = 0.0
+        self.max = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.last = lag
+            self.max = max(self.max, lag)
+            self.histogram.observe(lag)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
@@ -0,0 +1,349 @@
+import logging
+import time
+
+from zones import AudienceIndex
+
+log = logging.getLogger(__name__)
+
+STATUS_UNKNOWN = 'unknown'
+
+# Change events emitted to subscribers as callback(event, occupant)
+EVENT_REGISTER = 'register'
+EVENT_STATUS = 'status'
+EVENT_REMOVE = 'remove'
+EVENT_DISCONNECT = 'disconnect'
+
+
+class Occupant:
+    """One registered person, keyed by the stable ID from generate_stable_id.
+
+    `zone` is a 'building/floor/zone' path (any prefix of it is allowed).
+    """
+
+    __slots__ = ('stable_id', 'name', 'fcm_token', 'zone', 'status', 'timestamp', 'client_id', 'online',
+                 'offline_since')
+
+    def __init__(self, stable_id, name, fcm_token=None, zone=None):
+        self.stable_id = stable_id
+        self.name = name
+        self.fcm_token = fcm_token
+        self.zone = zone
+        self.status = STATUS_UNKNOWN
+        self.timestamp = None
+        self.client_id = None
+        self.online = False
+        self.offline_since = None   # time.monotonic() when last seen going offline; None while online
+
+    def to_status(self):
+        """The per-user entry admins see in `user_status`."""
+        return {
+            'status': self.status,
+            'timestamp': self.timestamp,
+            'name': self.name,
+            'online': self.online
+        }
+
+    def to_record(self):
+        """Everything another worker needs to mirror this occupant."""
+        return {
+            'stable_id': self.stable_id,
+            'name': self.name,
+            'fcm_token': self.fcm_token,
+            'zone': self.zone,
+            'status': self.status,
+            'timestamp': self.timestamp,
+            'online': self.online
+        }
+
+
+class _Index:
+    """key -> stable IDs, dropping empty buckets so len() stays meaningful.
+
+    A bucket holding one ID stores the bare string; it only becomes a set on
+    the second member. Most FCM tokens belong to exactly one occupant, so this
+    keeps the token index from costing a whole set per person.
+    """
+
+    __slots__ = ('_buckets',)
+
+    def __init__(self):
+        self._buckets = {}
+
+    def add(self, key, stable_id):
+        if key is None:
+            return
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = stable_id
+        elif isinstance(bucket, set):
+            bucket.add(stable_id)
+        elif bucket != stable_id:
+            self._buckets[key] = {bucket, stable_id}
+
+    def discard(self, key, stable_id):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        if isinstance(bucket, set):
+            bucket.discard(stable_id)
+            if len(bucket) == 1:
+                self._buckets[key] = next(iter(bucket))
+            elif not bucket:
+                del self._buckets[key]
+        elif bucket == stable_id:
+            del self._buckets[key]
+
+    def get(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return ()
+        return bucket if isinstance(bucket, set) else (bucket,)
+
+    def count(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return 0
+        return len(bucket) if isinstance(bucket, set) else 1
+
+    def counts(self):
+        return {key: (len(bucket) if isinstance(bucket, set) else 1)
+                for key, bucket in self._buckets.items()}
+
+    def keys(self):
+        return self._buckets.keys()
+
+
+class OccupantRegistry:
+    """Connected sockets and registered occupants, with secondary indexes.
+
+    Replaces the old `clients`, `client_names`, `fcm_tokens`, `user_status`
+    and `client_to_stable_id` dicts. Lookups by status, FCM token and zone
+    are O(1) to find the bucket and O(k) to list it. Occupants outlive their
+    sockets: a disconnect only marks them offline.
+    """
+
+    def __init__(self):
+        self.sockets = {}           # transient client_id -> ws
+        self._occupants = {}        # stable_id -> Occupant
+        self._by_client = {}        # transient client_id -> stable_id
+        self._by_status = _Index()
+        self._by_token = _Index()
+        self._by_zone = _Index()
+        self._by_area = AudienceIndex()   # Zone prefixes, for targeted pushes
+        self._listeners = []
+        self.applying_remote = False  # True while mirroring another worker's change
+
+    # --- Subscriptions ---
+
+    def subscribe(self, callback):
+        """Call `callback(event, occupant)` after every register/status/remove."""
+        self._listeners.append(callback)
+        return lambda: self._listeners.remove(callback)
+
+    def _emit(self, event, occupant):
+        for callback in self._listeners:
+            try:
+                callback(event, occupant)
+            except Exception:
+                log.exception("⚠️ Occupant listener failed on %s", event)
+
+    # --- Sockets ---
+
+    def connect(self, client_id, ws):
+        self.sockets[client_id] = ws
+
+    def disconnect(self, client_id):
+        """Drop a socket; its occupant stays, marked offline, with their last status.
+
+        A lost connection says nothing about whether the person is safe, so
+        their status and FCM token are kept. Returns the occupant, if any.
+        """
+        self.sockets.pop(client_id, None)
+        stable_id = self._by_client.pop(client_id, None)
+        if stable_id is None:
+            return None
+        occupant = self._occupants.get(stable_id)
+        if occupant is None or occupant.client_id != client_id:
+            return None  # The same person already reconnected on a newer socket
+        occupant.client_id = None
+        occupant.online = False
+        occupant.offline_since = time.monotonic()
+        self._emit(EVENT_DISCONNECT, occupant)
+        return occupant
+
+    @property
+    def connection_count(self):
+        return len(self.sockets)
+
+    # --- Occupants ---
+
+    def register(self, client_id, stable_id, name, fcm_token=None, zone=None):
+        """Link a socket to a stable ID, creating or updating the occupant."""
+        occupant = self._upsert(stable_id, name, fcm_token, zone)
+        occupant.client_id = client_id
+        occupant.online = True
+        occupant.offline_since = None
+        self._by_client[client_id] = stable_id
+        self._emit(EVENT_REGISTER, occupant)
+        return occupant
+
+    def _upsert(self, stable_id, name, fcm_token, zone):
+        occupant = self._occupants.get(stable_id)
+        if occupant is None:
+            occupant = Occupant(stable_id, name, fcm_token, zone)
+            self._occupants[stable_id] = occupant
+            self._by_status.add(occupant.status, stable_id)
+        else:
+            occupant.name = name
+            if fcm_token and fcm_token != occupant.fcm_token:
+                self._by_token.discard(occupant.fcm_token, stable_id)
+                occupant.fcm_token = fcm_token
+            if zone is not None and zone != occupant.zone:
+                self._by_zone.discard(occupant.zone, stable_id)
+                occupant.zone = zone
+
+        self._by_token.add(occupant.fcm_token, stable_id)
+        self._by_zone.add(occupant.zone, stable_id)
+        self._by_area.place(stable_id, occupant.zone)
+        return occupant
+
+    def apply_remote(self, event, record):
+        """Mirror a change made on another worker; the occupant has no socket here.
+
+        Remote occupants have `client_id` None, which is how listeners tell
+        them apart from people connected to this worker.
+        """
+        stable_id = record['stable_id']
+        occupant = self._occupants.get(stable_id)
+        if occupant is not None and occupant.client_id is not None:
+            if event in (EVENT_REMOVE, EVENT_DISCONNECT):
+                return None  # Still connected here; that was an older socket elsewhere
+            # They reconnected on another worker; the old socket here no longer owns them
+            self._by_client.pop(occupant.client_id, None)
+            occupant.client_id = None
+
+        self.applying_remote = True
+        try:
+            if event == EVENT_REMOVE:
+                return self.remove(stable_id)
+            occupant = self._upsert(stable_id, record.get('name'), record.get('fcm_token'), record.get('zone'))
+            occupant.online = record.get('online', False)
+            if occupant.online:
+                occupant.offline_since = None
+            elif occupant.offline_since is None:
+                occupant.offline_since = time.monotonic()
+            status = record.get('status') or STATUS_UNKNOWN
+            if status != occupant.status or record.get('timestamp') != occupant.timestamp:
+                return self.set_status(stable_id, status, record.get('timestamp'))
+            self._emit(event, occupant)
+            return occupant
+        finally:
+            self.applying_remote = False
+
+    def restore(self, record):
+        """Recreate an occupant from the journal, offline and without notifying listeners."""
+        stable_id = record['stable_id']
+        occupant = self._upsert(stable_id, record.get('name'), record.get('fcm_token'), record.get('zone'))
+        status = record.get('status') or STATUS_UNKNOWN
+        if status != occupant.status:
+            self._by_status.discard(occupant.status, stable_id)
+            self._by_status.add(status, stable_id)
+            occupant.status = status
+        occupant.timestamp = record.get('timestamp')
+        if occupant.offline_since is None:
+            occupant.offline_since = time.monotonic()  # The grace period restarts with the server
+        return occupant
+
+    def set_status(self, stable_id, status, timestamp):
+        occupant = self._occupants.get(stable_id)
+        if occupant is None:
+            return None
+        status = status or STATUS_UNKNOWN
+        if status != occupant.status:
+            self._by_status.discard(occupant.status, stable_id)
+            self._by_status.add(status, stable_id)
+            occupant.status = status
+        occupant.timestamp = timestamp
+        self._emit(EVENT_STATUS, occupant)
+        return occupant
+
+    def remove(self, stable_id):
+        occupant = self._occupants.pop(stable_id, None)
+        if occupant is None:
+            return None
+        self._by_status.discard(occupant.status, stable_id)
+        self._by_token.discard(occupant.fcm_token, stable_id)
+        self._by_zone.discard(occupant.zone, stable_id)
+        self._by_area.remove(stable_id)
+        if occupant.client_id is not None and self._by_client.get(occupant.client_id) == stable_id:
+            del self._by_client[occupant.client_id]
+        self._emit(EVENT_REMOVE, occupant)
+        return occupant
+
+    # --- Queries ---
+
+    def __len__(self):
+        return len(self._occupants)
+
+    def __iter__(self):
+        return iter(list(self._occupants.values()))
+
+    def __contains__(self, stable_id):
+        return stable_id in self._occupants
+
+    def get(self, stable_id):
+        return self._occupants.get(stable_id)
+
+    def local(self):
+        """Occupants whose socket is on this worker."""
+        return [occupant for occupant in self._occupants.values() if occupant.client_id is not None]
+
+    def stable_id_for(self, client_id):
+        return self._by_client.get(client_id)
+
+    def for_client(self, client_id):
+        stable_id = self._by_client.get(client_id)
+        return self._occupants.get(stable_id) if stable_id is not None else None
+
+    def with_status(self, status):
+        return [self._occupants[stable_id] for stable_id in self._by_status.get(status)]
+
+    def count_by_status(self):
+        return self._by_status.counts()
+
+    def with_token(self, fcm_token):
+        return [self._occupants[stable_id] for stable_id in self._by_token.get(fcm_token)]
+
+    def in_zone(self, zone):
+        return [self._occupants[stable_id] for stable_id in self._by_zone.get(zone)]
+
+    def count_by_zone(self):
+        return self._by_zone.counts()
+
+    def in_areas(self, areas, include_unplaced=False):
+        """Occupants a send to `areas` reaches (see AudienceIndex.resolve)."""
+        return [self._occupants[stable_id] for stable_id in self._by_area.resolve(areas, include_unplaced)]
+
+    def count_by_area(self):
+        return self._by_area.counts()
+
+    def tokens(self, areas=None, include_unplaced=False):
+        """Every distinct registered FCM token, or only those of occupants in `areas`."""
+        if areas is None:
+            return list(self._by_token.keys())
+        return list({occupant.fcm_token for occupant in self.in_areas(areas, include_unplaced)
+                     if occupant.fcm_token})
+
+    def remove_token(self, fcm_token):
+        """Forget an FCM token (e.g. reported unregistered by Firebase)."""
+        for stable_id in list(self._by_token.get(fcm_token)):
+            self._occupants[stable_id].fcm_token = None
+            self._by_token.discard(fcm_token, stable_id)
+
+    def user_status(self):
+        """`{stable_id: {...}}` for every occupant who has reported a status."""
+        return {
+            stable_id: occupant.to_status()
+            for stable_id, occupant in self._occupants.items()
+            if occupant.status != STATUS_UNKNOWN
+        }
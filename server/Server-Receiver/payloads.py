@@ -0,0 +1,119 @@
+import json
+import zlib
+
+from aiohttp import web, hdrs
+from aiohttp.http import ws_ext_gen
+
+from wire import encode_binary
+
+# Optional faster JSON backend; falls back to the standard library
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+# Frames smaller than this are not worth deflating once for everyone
+COMPRESS_MIN_SIZE = 1024
+DEFLATE_TRAILER = b'\x00\x00\xff\xff'
+RSV1_COMPRESSED = 0x40
+
+
+def dumps(message):
+    """Serialize a message to UTF-8 JSON bytes with the fastest available backend."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(message)
+        except TypeError:
+            pass  # e.g. non-str keys; the stdlib encoder is more forgiving
+    return json.dumps(message, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from bytes or str with the fastest available backend."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class PreparedMessage:
+    """A broadcast frame serialized once and written unchanged to every socket.
+
+    JSON is encoded up front; the compact MessagePack form is encoded the
+    first time a socket that negotiated it needs it, then shared the same way.
+    """
+
+    __slots__ = ('type', 'seq', 'data', '_message', '_binary', '_deflated')
+
+    def __init__(self, message):
+        self.type = message.get('type')
+        self.seq = message.get('seq')
+        self.data = dumps(message)
+        self._message = message
+        self._binary = None
+        self._deflated = {}
+
+    def __len__(self):
+        return len(self.data)
+
+    def binary(self):
+        if self._binary is None:
+            self._binary = encode_binary(self._message)
+        return self._binary
+
+    def deflated(self, wbits, binary=False):
+        """permessage-deflate body for a socket without context takeover (cached per wbits and encoding)."""
+        body = self._deflated.get((wbits, binary))
+        if body is None:
+            compressor = zlib.compressobj(zlib.Z_BEST_SPEED, zlib.DEFLATED, -wbits)
+            body = compressor.compress(self.binary() if binary else self.data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            body = body.removesuffix(DEFLATE_TRAILER)
+            self._deflated[(wbits, binary)] = body
+        return body
+
+
+def prepare(message):
+    """Return `message` as a PreparedMessage, serializing it if needed."""
+    if isinstance(message, PreparedMessage):
+        return message
+    return PreparedMessage(message)
+
+
+async def send_prepared(ws, prepared, binary=False):
+    """Write a PreparedMessage to one socket without re-serializing it.
+
+    Sockets that negotiated permessage-deflate without server context takeover
+    all share the same compressed body, so it is deflated once per broadcast.
+    Every other socket gets the raw bytes (aiohttp compresses them itself if needed).
+    `binary` sockets get the compact MessagePack frame instead of JSON.
+    """
+    data = prepared.binary() if binary else prepared.data
+    opcode = web.WSMsgType.BINARY if binary else web.WSMsgType.TEXT
+    writer = getattr(ws, '_writer', None)
+    if (writer is not None and writer.compress and writer.notakeover
+            and len(data) >= COMPRESS_MIN_SIZE
+            and hasattr(writer, '_write_websocket_frame')):
+        writer._write_websocket_frame(prepared.deflated(writer.compress, binary), opcode, RSV1_COMPRESSED)
+        if writer.protocol.writing_paused:
+            await writer.protocol._drain_helper()
+        return
+
+    await ws.send_frame(data, opcode)
+
+
+class SharedDeflateWebSocketResponse(web.WebSocketResponse):
+    """WebSocketResponse that always answers permessage-deflate with server_no_context_takeover.
+
+    RFC 7692 lets the server add this parameter unprompted. Without a shared
+    compression context every socket decodes the same deflated body, which is
+    what lets send_prepared compress a broadcast once instead of once per socket.
+    """
+
+    def _handshake(self, request):
+        headers, protocol, compress, notakeover = super()._handshake(request)
+        if compress and not notakeover:
+            headers[hdrs.SEC_WEBSOCKET_EXTENSIONS] = ws_ext_gen(
+                compress=compress, isserver=True, server_notakeover=True)
+            notakeover = True
+        return headers, protocol, compress, notakeover
@@ -0,0 +1,112 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.005   # Seconds between stack samples (~200 Hz)
+MAX_DURATION = 300.0       # A forgotten profiler switches itself off after this long
+MAX_DEPTH = 64
+
+
+class SamplingProfiler:
+    """Statistical profiler for one thread (normally the event loop), switchable at runtime.
+
+    A daemon thread wakes every `interval`, reads the target thread's current
+    frame from sys._current_frames() and counts the stack. The profiled code
+    is never instrumented, so overhead is just the periodic stack walk and
+    nothing at all while stopped. `collapsed()` returns the folded-stack text
+    flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, thread_id=None):
+        self.thread_id = thread_id
+        self.interval = DEFAULT_INTERVAL
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._lock = threading.Lock()   # stacks and samples are written by the sampler thread
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def start(self, interval=DEFAULT_INTERVAL, duration=None, thread_id=None):
+        """Begin a fresh profile of `thread_id` (default: the calling thread)."""
+        if self.running:
+            return False
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = max(0.001, interval)
+        with self._lock:
+            self.stacks = Counter()
+            self.samples = 0
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop.clear()
+        duration = min(duration or MAX_DURATION, MAX_DURATION)
+        self._thread = threading.Thread(target=self._sample, args=(duration,), name='profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self._stop.set()
+        self.stopped_at = time.time()
+        return True
+
+    def _sample(self, duration):
+        deadline = time.monotonic() + duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break  # Target thread is gone
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            with self._lock:
+                self.stacks[key] += 1
+                self.samples += 1
+        if self.stopped_at is None:
+            self.stopped_at = time.time()
+
+    def snapshot(self):
+        """A copy of the stack counts and the sample total, safe to read while sampling continues."""
+        with self._lock:
+            return self.stacks.copy(), self.samples
+
+    def collapsed(self):
+        """'frame;frame;frame count' lines, heaviest first."""
+        stacks, _ = self.snapshot()
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+    def top_functions(self, limit=20):
+        """Functions by share of samples spent in them (self time) and under them (total time)."""
+        stacks, samples = self.snapshot()
+        own = Counter()
+        total = Counter()
+        for stack, count in stacks.items():
+            frames = [frame.rsplit(':', 1)[0] for frame in stack.split(';')]
+            own[frames[-1]] += count
+            for function in set(frames):
+                total[function] += count
+        samples = samples or 1
+        return [{'function': function, 'self_pct': round(100.0 * count / samples, 1),
+                 'total_pct': round(100.0 * total[function] / samples, 1)}
+                for function, count in own.most_common(limit)]
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'interval_ms': round(self.interval * 1000, 2),
+            'samples': self.samples,
+            'stacks': len(self.stacks),
+            'started_at': self.started_at,
+            'stopped_at': self.stopped_at
+        }
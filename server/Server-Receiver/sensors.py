@@ -0,0 +1,196 @@
+import time
+from collections import OrderedDict
+
+# Firmware re-sends FIRE_ALERT every ALERT_INTERVAL (5 s) while smoke stays high
+ALERT_INTERVAL = 5.0
+STALE_AFTER = 3 * ALERT_INTERVAL   # Silence after which an alerting sensor counts as cleared
+DEDUP_WINDOW = 1.0                 # Identical packets inside this window are duplicates
+DEDUP_MAX_ENTRIES = 4096
+SEVERITY_BAND = 100                # Smoke units above threshold per severity step
+TREND_EPSILON = 10                 # Smoke change below this is "steady"
+RATE_SMOOTHING = 0.3               # EWMA weight for packet rate
+
+STATE_ALERTING = 'alerting'
+STATE_CLEARED = 'cleared'
+
+TREND_RISING = 'rising'
+TREND_FALLING = 'falling'
+TREND_STEADY = 'steady'
+
+
+class DedupCache:
+    """Remembers packet keys for `window` seconds, evicting oldest-first."""
+
+    def __init__(self, window=DEDUP_WINDOW, max_entries=DEDUP_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self._seen = OrderedDict()  # key -> time first seen
+        self.hits = 0
+
+    def seen(self, key, now):
+        """True if `key` was already seen within the window; records it otherwise."""
+        self._evict(now)
+        if key in self._seen:
+            self.hits += 1
+            return True
+        self._seen[key] = now
+        if len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        return False
+
+    def _evict(self, now):
+        cutoff = now - self.window
+        while self._seen:
+            key, first_seen = next(iter(self._seen.items()))
+            if first_seen >= cutoff:
+                break
+            del self._seen[key]
+
+    def __len__(self):
+        return len(self._seen)
+
+
+class SensorState:
+    """What we know about one FireDetectionNode."""
+
+    __slots__ = ('sensor_id', 'ip', 'zone', 'state', 'first_seen', 'last_seen', 'level',
+                 'peak', 'threshold', 'trend', 'rate', 'packets', 'severity')
+
+    def __init__(self, sensor_id, now):
+        self.sensor_id = sensor_id
+        self.ip = None
+        self.zone = None
+        self.state = None
+        self.first_seen = now
+        self.last_seen = now
+        self.level = 0
+        self.peak = 0
+        self.threshold = None
+        self.trend = TREND_STEADY
+        self.rate = 0.0
+        self.packets = 0
+        self.severity = 0
+
+    def to_dict(self, wall_offset=0.0):
+        """Compact admin-facing view; times are converted to epoch seconds."""
+        return {
+            'sensor_id': self.sensor_id,
+            'zone': self.zone,
+            'state': self.state,
+            'level': self.level,
+            'peak': self.peak,
+            'threshold': self.threshold,
+            'severity': self.severity,
+            'trend': self.trend,
+            'rate': round(self.rate, 3),
+            'packets': self.packets,
+            'first_seen': round(self.first_seen + wall_offset, 3),
+            'last_seen': round(self.last_seen + wall_offset, 3),
+            'ip': self.ip
+        }
+
+
+class SensorTracker:
+    """Per-sensor state machine fed by every FIRE_ALERT packet.
+
+    `observe` returns the SensorState when the packet caused a real
+    transition (first alert, severity band change, or recovery after going
+    stale) and None for duplicates and plain heartbeats. `sweep` moves
+    sensors that have gone quiet to the cleared state.
+    """
+
+    def __init__(self, stale_after=STALE_AFTER, dedup_window=DEDUP_WINDOW, locate=None):
+        self.stale_after = stale_after
+        self.locate = locate      # callable(packet) -> 'building/floor/zone' or None
+        self.sensors = {}
+        self.dedup = DedupCache(dedup_window)
+        self.transitions = 0
+        # perf_counter() -> epoch seconds, for admin-facing timestamps
+        self._wall_offset = time.time() - time.perf_counter()
+
+    def observe(self, packet, now=None):
+        now = time.perf_counter() if now is None else now
+        sensor_id = packet.get('sensor_id') or packet.get('ip') or 'unknown'
+        try:
+            level = int(packet.get('smoke_level') or 0)
+        except (TypeError, ValueError, OverflowError):
+            level = 0
+
+        if self.dedup.seen((sensor_id, level, packet.get('ip')), now):
+            return None
+
+        sensor = self.sensors.get(sensor_id)
+        is_new = sensor is None
+        if is_new:
+            sensor = self.sensors[sensor_id] = SensorState(sensor_id, now)
+            if self.locate is not None:
+                sensor.zone = self.locate(packet)
+        else:
+            interval = now - sensor.last_seen
+            if interval > 0:
+                sensor.rate += RATE_SMOOTHING * (1.0 / interval - sensor.rate)
+
+        if is_new:
+            pass  # No previous reading to compare against
+        elif level - sensor.level > TREND_EPSILON:
+            sensor.trend = TREND_RISING
+        elif sensor.level - level > TREND_EPSILON:
+            sensor.trend = TREND_FALLING
+        else:
+            sensor.trend = TREND_STEADY
+
+        sensor.last_seen = now
+        sensor.level = level
+        sensor.peak = max(sensor.peak, level)
+        sensor.packets += 1
+        sensor.ip = packet.get('ip', sensor.ip)
+        try:
+            sensor.threshold = int(packet['threshold']) if packet.get('threshold') is not None else sensor.threshold
+        except (TypeError, ValueError, OverflowError):
+            pass  # A garbled threshold must not stop the alarm this packet raises
+
+        threshold = sensor.threshold or 0
+        severity = max(0, (level - threshold) // SEVERITY_BAND) if level > threshold else 0
+        changed = sensor.state != STATE_ALERTING or severity != sensor.severity
+        sensor.state = STATE_ALERTING
+        sensor.severity = severity
+
+        if changed:
+            self.transitions += 1
+            return sensor
+        return None
+
+    def sweep(self, now=None):
+        """Mark sensors silent for longer than `stale_after` as cleared; returns them."""
+        now = time.perf_counter() if now is None else now
+        cleared = []
+        for sensor in self.sensors.values():
+            if sensor.state == STATE_ALERTING and now - sensor.last_seen > self.stale_after:
+                sensor.state = STATE_CLEARED
+                sensor.trend = TREND_STEADY
+                sensor.severity = 0
+                cleared.append(sensor)
+        self.transitions += len(cleared)
+        return cleared
+
+    def alerting(self):
+        return [sensor for sensor in self.sensors.values() if sensor.state == STATE_ALERTING]
+
+    def frame(self, sensor):
+        """The compact `sensor_update` frame sent to admins on a transition (only those covering its zone)."""
+        frame = {'type': 'sensor_update', **sensor.to_dict(self._wall_offset)}
+        if sensor.zone is not None:
+            frame['zones'] = [sensor.zone]
+        return frame
+
+    def snapshot(self):
+        return [sensor.to_dict(self._wall_offset) for sensor in self.sensors.values()]
+
+    def stats(self):
+        return {
+            'sensors': len(self.sensors),
+            'alerting': len(self.alerting()),
+            'transitions': self.transitions,
+            'duplicates': self.dedup.hits,
+            'dedup_entries': len(self.dedup)
+        }
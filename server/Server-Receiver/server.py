@@ -1,47 +1,112 @@
 import asyncio
-import json
-import socket
+import logging
+import math
 import threading
+import time
 from datetime import datetime
 from aiohttp import web 
 import aiohttp_cors
 import os
 import hashlib # NEW: For generating stable, persistent IDs
 
-# --- NEW FIREBASE IMPORTS ---
-import firebase_admin
-from firebase_admin import credentials, messaging
+from fanout import FanoutEngine, POLICY_COALESCE, POLICY_DISCONNECT
+from payloads import SharedDeflateWebSocketResponse, loads
+from occupants import OccupantRegistry, EVENT_REGISTER, EVENT_DISCONNECT, EVENT_REMOVE
+from journal import EventJournal, KIND_OCCUPANT, KIND_TOKEN, KIND_ALARM, KIND_BROADCAST
+from admin_stream import AdminStatusStream
+from sessions import ClientSessions
+from zones import (ZoneMap, AudienceIndex, UNPLACED_TYPES, ESCALATE_AFTER, ESCALATE_SEVERITY,
+                   area_path, covers, parse_targets)
+from udp_ingest import SensorIngest
+from sensors import SensorTracker
+from telemetry import TelemetryStore, RESOLUTIONS, MAX_SPAN
+from fcm_dispatch import FcmDispatcher, LazyFirebaseClient, CREDENTIALS_FILE
+from alarm_dispatch import AlarmDispatcher
+from liveness import HeartbeatMonitor, GraceReaper, PING_INTERVAL, PING_TIMEOUT, OFFLINE_GRACE
+from backplane import (LocalBackplane, TOPIC_CLIENTS, TOPIC_ADMINS, TOPIC_ALARM, TOPIC_OCCUPANT,
+                       TOPIC_TOKEN, TOPIC_PRESENCE, TOPIC_HELLO)
+from map_store import MapStore, MapStoreError, MAX_MAP_SIZE, parse_range
+from static_assets import StaticAssets
+from logs import setup_logging, flush_logging
+from metrics import MetricsRegistry, LoopLagMonitor
+from profiler import SamplingProfiler, DEFAULT_INTERVAL
+from wire import SUBPROTOCOLS, PROTOCOL_MSGPACK, decode_binary
+from auth import CredentialStore, TokenSigner, TOKEN_TTL, token_from_protocols
+from admission import (IngressLimits, TokenBucket, KeyedLimiter, ConnectionAdmission, StatusCoalescer,
+                       LoadShedder)
+
+# Optional uvloop for --performance; the stock asyncio loop otherwise
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+log = logging.getLogger('server')
 
 # Global state
-clients = {}
 admin_clients = {}
 alert_active = False
-user_status = {}
-client_names = {} 
-fcm_tokens = {} 
-client_to_stable_id = {} # Maps transient client_id to the stable_id
+alarm_zones = None  # Zones the active alarm covers; None is the whole site
 # --- END NEW GLOBAL STATE ---
 
-# --- FIREBASE INITIALIZATION ---
-try:
-    cred = credentials.Certificate('serviceAccountKey.json') 
-    firebase_admin.initialize_app(cred)
-    print("✓ Firebase Admin SDK initialized successfully.")
-except FileNotFoundError:
-    print("🔥 FATAL ERROR: 'serviceAccountKey.json' not found.")
-    print("   Please download it from your Firebase project settings and place it here.")
-    exit()
-except Exception as e:
-    print(f"🔥 FATAL ERROR: Failed to initialize Firebase Admin SDK: {e}")
-    exit()
-# --- END FIREBASE INITIALIZATION ---
-
-
-# User credentials
+
+# Per-channel deadlines for alarm delivery; channels run concurrently
+WS_DELIVERY_DEADLINE = 5.0     # Every connected socket written (or given up on)
+FCM_DELIVERY_DEADLINE = 30.0   # All push batches settled, retries included
+# Close codes a client sends when it leaves on purpose (normal closure, going away)
+CLEAN_CLOSE_CODES = (1000, 1001)
+# Trigger/clear have their own per-IP bucket and are never shed
+ALARM_ROUTES = ('/api/admin/trigger_alarm', '/api/admin/clear_alarm')
+SHED_RETRY_AFTER = 5    # Seconds an overloaded server asks callers to wait
+POLICY_VIOLATION = 1008  # Close code for sockets that keep flooding us
+
+# Built-in demo accounts (admin1/admin123, admin2/admin456) as PBKDF2 hashes; admins.json replaces them
 ADMIN_CREDENTIALS = {
-    "admin1": "admin123",
-    "admin2": "admin456"
+    "admin1": "pbkdf2_sha256$600000$t8uBmEYyXIipBwAd7SWU-Q$N4NGbAHTKxOIKdlhuCEgo5BabxPEXlGyn1WAFuOOTqc",
+    "admin2": "pbkdf2_sha256$600000$pqgjJROMLyLjOi0tFXsJZQ$QYXSA6exrZVp_LrshfJiOnaNpPam0i7ODHrl8kbYEKA"
 }
+# Admin routes reachable without a token
+OPEN_ADMIN_ROUTES = ('/api/admin/login',)
+
+class MessageAllowance(TokenBucket):
+    """A socket's message bucket, plus how many frames in a row have exceeded it."""
+
+    __slots__ = ('strikes',)
+
+    def __init__(self, rate, burst):
+        super().__init__(rate, burst)
+        self.strikes = 0
+
+
+def parse_frame(msg):
+    """A JSON text or compact MessagePack frame as a dict, or None if it is not an object."""
+    try:
+        data = loads(msg.data) if msg.type == web.WSMsgType.TEXT else decode_binary(msg.data)
+    except (ValueError, RecursionError):  # The stdlib json fallback recurses on deeply nested arrays
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def refusal(status, reason, retry_after):
+    """JSON error with Retry-After (whole seconds, at least 1)."""
+    return web.json_response({'error': reason}, status=status,
+                             headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+
+
+async def read_body(request, limit):
+    """The whole request body; HTTPRequestEntityTooLarge once it passes `limit` bytes."""
+    if request.content_length is not None and request.content_length > limit:
+        raise web.HTTPRequestEntityTooLarge(max_size=limit, actual_size=request.content_length)
+    chunks = []
+    size = 0
+    # StreamReader.read(n) returns whatever has arrived so far, so keep reading until EOF
+    while chunk := await request.content.readany():
+        size += len(chunk)
+        if size > limit:
+            raise web.HTTPRequestEntityTooLarge(max_size=limit, actual_size=size)
+        chunks.append(chunk)
+    return b''.join(chunks)
+
 
 # 🎯 NEW: Function to generate a stable, persistent ID
 def generate_stable_id(user_name, fcm_token):
@@ -51,90 +116,362 @@ def generate_stable_id(user_name, fcm_token):
 
 
 class FireEmergencyServer:
-    def __init__(self, udp_port=5006, http_port=8080):
+    def __init__(self, udp_port=5006, http_port=8080, shared_deflate=True, map_dir=None,
+                 fcm_client=None, worker_id=0, backplane=None, ingest_udp=True, journal=True, journal_dir=None,
+                 ping_interval=PING_INTERVAL, ping_timeout=PING_TIMEOUT, offline_grace=OFFLINE_GRACE,
+                 zone_file=None, escalate_after=ESCALATE_AFTER, limits=None,
+                 admin_file=None, auth_secret=None, token_ttl=TOKEN_TTL, telemetry=True, telemetry_dir=None,
+                 static_cache=True, sw_precache=True, firebase_credentials=CREDENTIALS_FILE, performance=False):
+        self.worker_id = worker_id
+        self.ingest_udp = ingest_udp
         self.udp_port = udp_port
+        self.udp_ingest = None
+        self._background_tasks = set()
+        # Client sockets, names, FCM tokens and statuses, indexed by stable ID
+        self.occupants = OccupantRegistry()
+        self._sweep_task = None
+        # Site layout: sensor locations and which zones a local alarm escalates to
+        self.zones = ZoneMap.load(zone_file or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zones.json'))
+        self.escalate_after = escalate_after
+        self._escalations = {}  # zone -> pending escalation timer
+        # Per-sensor state, so every affected room is tracked even while an alarm is active
+        self.sensors = SensorTracker(locate=self.zones.locate_sensor)
+        # Smoke-level history for trends and threshold calibration; workers without the UDP port only read it
+        self.telemetry = None
+        if telemetry:
+            self.telemetry = TelemetryStore(
+                telemetry_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'telemetry'),
+                writable=ingest_udp)
         self.http_port = http_port
-        self.app = web.Application()
+        # Deflate each broadcast once for all sockets instead of once per socket
+        self.ws_response_class = SharedDeflateWebSocketResponse if shared_deflate else web.WebSocketResponse
+        self.app = web.Application(middlewares=[self.ingress_middleware, self.auth_middleware])
         self.main_loop = None 
         
+        # Admin logins check salted hashes off the loop; sessions are signed tokens checked without a lookup
+        self.credentials = CredentialStore.load(
+            admin_file or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'admins.json'), ADMIN_CREDENTIALS)
+        self.tokens = TokenSigner(auth_secret or os.urandom(32), token_ttl)
+        
+        # Pages, scripts and images are read and compressed once at startup and served from memory
+        self.static_assets = None
+        if static_cache:
+            self.static_assets = StaticAssets(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                                              precache=sw_precache)
+        
+        # Evacuation maps are stored once by SHA-256 and broadcast by reference
+        self.map_store = MapStore(map_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'maps'))
+        
+        # Occupants, alarm state and broadcasts survive a restart (one journal per deployment)
+        self.journal = None
+        if journal:
+            self.journal = EventJournal(journal_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'journal'))
+            self.occupants.subscribe(self._journal_occupant)
+        
+        # Per-socket outbound queues: a broadcast never waits on a slow client
+        self.client_fanout = FanoutEngine('clients', policy=POLICY_COALESCE, on_evict=self._close_evicted)
+        self.admin_fanout = FanoutEngine('admins', policy=POLICY_DISCONNECT, on_evict=self._close_evicted)
+        self.admin_count = 0
+        # Sockets by building/floor/zone, so a targeted send only touches its audience
+        self.client_audience = AudienceIndex()
+        self.admin_audience = AudienceIndex()
+        
+        # Push notifications: 500-token batches sent in parallel; dead tokens are forgotten.
+        # The SDK loads in the background after startup; without it alarms are WebSocket-only
+        self.firebase = LazyFirebaseClient(firebase_credentials) if fcm_client is None else None
+        self.fcm = FcmDispatcher(fcm_client or self.firebase, on_unregistered=self.prune_token)
+        self.performance = performance
+        
+        # Starts WebSocket fan-out and FCM push together and keeps a timeline per alarm
+        self.alarms = AlarmDispatcher()
+        
+        # Silent sockets are pinged, dead ones reaped in bulk; offline people are kept for a grace period
+        self.heartbeats = HeartbeatMonitor(self.reap_sockets, interval=ping_interval, timeout=ping_timeout)
+        self.offline_reaper = GraceReaper(self.purge_offline, grace=offline_grace)
+        self.occupants.subscribe(self._track_offline)
+        
+        # Client broadcasts are sequenced and kept briefly, so a reconnect replays only what it missed
+        self.sessions = ClientSessions()
+        self.occupants.subscribe(self._forget_session)
+        
+        # Admins get one snapshot, then coalesced per-tick deltas of occupant status
+        self.admin_stream = AdminStatusStream(self.occupants, self.admin_fanout.broadcast, self.dashboard_state)
+        
+        # Workers share broadcasts, alarm state and occupants; a lone server has no peers
+        self.backplane = backplane or LocalBackplane(worker_id)
+        self.backplane.subscribe(self.on_backplane_message)
+        self.peer_connections = {}  # worker_id -> connected client sockets there
+        self.occupants.subscribe(self._replicate_occupant)
+        
+        # Prometheus /metrics reads the counters above at scrape time; the profiler is off until asked
+        self.lag_monitor = LoopLagMonitor()
+        self.profiler = SamplingProfiler()
+        
+        # Ingress is bounded: per-IP buckets, socket caps, frame sizes, coalesced status
+        # updates, and non-alarm work shed while the loop lags or socket queues back up
+        self.limits = limits or IngressLimits()
+        self.admission = ConnectionAdmission(self.limits.max_connections, self.limits.max_per_ip)
+        self.connect_limiter = KeyedLimiter('connect', self.limits.connect_rate, self.limits.connect_burst)
+        self.api_limiter = KeyedLimiter('api', self.limits.api_rate, self.limits.api_burst)
+        self.admin_limiter = KeyedLimiter('admin', self.limits.admin_rate, self.limits.admin_burst)
+        self.alarm_limiter = KeyedLimiter('alarm', self.limits.alarm_rate, self.limits.alarm_burst)
+        self.status_updates = StatusCoalescer(self.apply_status, self.limits.status_rate, self.limits.status_burst)
+        self.shedder = LoadShedder(lambda: self.lag_monitor.last, self.client_fanout.queued)
+        self.flood_closes = 0
+        
+        self.metrics = MetricsRegistry(const_labels={'worker': worker_id})
+        self.register_metrics()
+        
         self.setup_routes()
+        self.app.on_startup.append(self.start_firebase)
+        self.app.on_startup.append(self.load_static_assets)
+        self.app.on_startup.append(self.restore_from_journal)
+        self.app.on_startup.append(self.start_backplane)
+        self.app.on_startup.append(self.start_telemetry)
+        self.app.on_startup.append(self.start_udp_listener)
+        self.app.on_startup.append(self.start_instrumentation)
+        self.app.on_startup.append(self.start_liveness)
+        self.app.on_shutdown.append(self.on_shutdown)
+
+    async def on_shutdown(self, app):
+        """Stop the UDP listener and per-socket writer tasks"""
+        if self.udp_ingest is not None:
+            self.udp_ingest.close()
+        self.lag_monitor.stop()
+        self.shedder.stop()
+        self.profiler.stop()
+        self.heartbeats.stop()
+        self.offline_reaper.stop()
+        self.cancel_escalations()
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+        await self.client_fanout.close()
+        await self.admin_fanout.close()
+        await self.backplane.close()
+        self.fcm.close()
+        self.credentials.close()
+        if self.telemetry is not None:
+            await self.telemetry.close()
+        if self.journal is not None:
+            await asyncio.to_thread(self.journal.close)
 
     # ==========================================================
     # 1. ROUTE HANDLERS
     # ==========================================================
 
+    @web.middleware
+    async def ingress_middleware(self, request, handler):
+        """Per-IP rate limits on /api; admin writes are shed under overload, alarms never are"""
+        path = request.path
+        if not path.startswith('/api/'):
+            return await handler(request)
+        ip = request.remote
+        if path in ALARM_ROUTES:
+            limiter = self.alarm_limiter
+        elif request.method == 'POST' and path.startswith('/api/admin/'):
+            if self.shedder.refuse():
+                return refusal(503, 'server overloaded, try again shortly', SHED_RETRY_AFTER)
+            limiter = self.admin_limiter
+        else:
+            limiter = self.api_limiter
+        if not limiter.allow(ip):
+            return refusal(429, 'too many requests', limiter.retry_after(ip))
+        return await handler(request)
+
+    @web.middleware
+    async def auth_middleware(self, request, handler):
+        """Admin routes and the admin socket need a token: 'Authorization: Bearer', or for the
+        socket a 'fire.token.<token>' subprotocol (never the query string, which access logs record)"""
+        path = request.path
+        guarded = path == '/ws/admin' or (path.startswith('/api/admin/') and path not in OPEN_ADMIN_ROUTES)
+        if not guarded or request.method == 'OPTIONS':
+            return await handler(request)
+        header = request.headers.get('Authorization', '')
+        if header.startswith('Bearer '):
+            token = header[7:]
+        elif path == '/ws/admin':
+            token = token_from_protocols(request.headers.get('Sec-WebSocket-Protocol'))
+        else:
+            token = None
+        username = self.tokens.verify(token)
+        if username is None:
+            return web.json_response({'error': 'login required'}, status=401,
+                                     headers={'WWW-Authenticate': 'Bearer'})
+        request['admin'] = username
+        return await handler(request)
+
+    def admit_socket(self, request, kind):
+        """None if a WebSocket upgrade may go ahead, else the HTTP response refusing it"""
+        ip = request.remote
+        if not self.connect_limiter.allow(ip):
+            return refusal(429, 'reconnecting too fast', self.connect_limiter.retry_after(ip))
+        # Dashboards still get in while overloaded; new phones retry (they already have FCM)
+        if kind == 'client' and self.shedder.refuse():
+            return refusal(503, 'server overloaded, try again shortly', SHED_RETRY_AFTER)
+        reason = self.admission.admit(ip)
+        if reason is not None:
+            log.warning("⚠️ Refused %s socket from %s: %s", kind, ip, reason)
+            return refusal(503, reason, SHED_RETRY_AFTER)
+        return None
+
+    def over_limit(self, allowance, socket_id):
+        """Count a frame past the socket's message bucket; True once the socket should be closed"""
+        allowance.strikes += 1
+        if allowance.strikes < self.limits.abuse_limit:
+            return False
+        self.flood_closes += 1
+        log.warning("⚠️ Closing %s: %d frames over its message rate", socket_id, allowance.strikes)
+        return True
+
     async def client_websocket(self, request):
         """Handle client WebSocket connections (/ws/client)"""
-        ws = web.WebSocketResponse()
+        refused = self.admit_socket(request, 'client')
+        if refused is not None:
+            return refused
+        try:
+            return await self.client_session(request)
+        finally:
+            self.admission.release(request.remote)
+
+    async def client_session(self, request):
+        """One admitted client socket, from upgrade to cleanup"""
+        # Pongs must reach us: they are how the heartbeat monitor knows the socket is alive
+        # Apps offering 'fire.msgpack.v1' get compact binary frames; browsers offer nothing and get JSON
+        ws = self.ws_response_class(autoping=False, max_msg_size=self.limits.max_client_frame,
+                                    protocols=SUBPROTOCOLS)
         await ws.prepare(request)
         
         # NOTE: This ID is transient (changes on every connection)
         transient_client_id = f"transient_{datetime.now().timestamp()}"
-        clients[transient_client_id] = ws
-        print(f"✓ Client connected: {transient_client_id} (Total connections: {len(clients)})")
+        self.occupants.connect(transient_client_id, ws)
+        self.client_fanout.register(transient_client_id, ws, binary=ws.ws_protocol == PROTOCOL_MSGPACK)
+        self.client_audience.place(transient_client_id)  # Unplaced until they register
+        self.heartbeats.register(transient_client_id, ws, request.transport, kind='client')
+        self.announce_presence()
+        log.debug("✓ Client connected: %s (Total connections: %d)", transient_client_id, self.occupants.connection_count)
         
-        await ws.send_json({
+        self.client_fanout.send(transient_client_id, {
             'type': 'connected',
             'client_id': transient_client_id, 
-            'message': 'Connected to Fire Emergency System'
+            'message': 'Connected to Fire Emergency System',
+            'stream': self.sessions.stream_id,
+            'seq': self.sessions.seq
         })
         
+        # Reconnecting clients pass ?stream=&since= to get only the broadcasts they missed
+        try:
+            since = int(request.query['since']) if 'since' in request.query else None
+        except ValueError:
+            since = None
+        for frame in self.sessions.open(transient_client_id, request.query.get('stream'), since):
+            self.client_fanout.send(transient_client_id, frame)
+        
+        allowance = MessageAllowance(self.limits.message_rate, self.limits.message_burst)
         try:
             async for msg in ws:
-                if msg.type == web.WSMsgType.TEXT:
-                    data = json.loads(msg.data)
-                    await self.handle_client_message(transient_client_id, data)
+                self.heartbeats.touch(transient_client_id)
+                if msg.type in (web.WSMsgType.TEXT, web.WSMsgType.BINARY):
+                    data = parse_frame(msg)
+                    if data is None:
+                        continue
+                    throttled = not allowance.take()
+                    if throttled:
+                        if self.over_limit(allowance, transient_client_id):
+                            await ws.close(code=POLICY_VIOLATION, message=b'message rate exceeded')
+                            break
+                        if data.get('type') != 'status_update':
+                            continue  # A status is kept (latest wins); anything else is dropped
+                    else:
+                        allowance.strikes = 0
+                    await self.handle_client_message(transient_client_id, data, throttled)
+                elif msg.type == web.WSMsgType.PING:
+                    await ws.pong(msg.data)
                 elif msg.type == web.WSMsgType.ERROR:
-                    print(f'WebSocket error: {ws.exception()}')
+                    log.warning('WebSocket error: %s', ws.exception())
         finally:
-            # 🎯 FIX: AGGRESSIVE CLEANUP using the STABLE ID
-            stable_id = client_to_stable_id.pop(transient_client_id, None)
-
+            # The person stays listed (offline) with their last status and FCM token:
+            # a dropped socket mid-incident must not erase "TRAPPED"
+            stable_id = self.occupants.stable_id_for(transient_client_id)
             if stable_id:
-                # Remove status, name, and token tied to the stable ID
-                user_status.pop(stable_id, None) 
-                client_names.pop(stable_id, None)
-                fcm_tokens.pop(stable_id, None)
-            
-            clients.pop(transient_client_id, None) 
+                self.status_updates.flush(stable_id)
+            occupant = self.occupants.disconnect(transient_client_id)
+            channel = self.client_fanout.unregister(transient_client_id)
+            self.client_audience.remove(transient_client_id)
+            last_seen = self.heartbeats.unregister(transient_client_id)
+            if ws.close_code in CLEAN_CLOSE_CODES:
+                last_seen = None  # The phone said goodbye: everything written before it did arrived
+            self.sessions.close(transient_client_id, occupant.stable_id if occupant else None,
+                                channel.written_seq if channel else None, last_seen)
 
-            print(f"✗ Client disconnected: {transient_client_id} (Total active sockets: {len(clients)})")
+            log.debug("✗ Client disconnected: %s (Total active sockets: %d)", transient_client_id, self.occupants.connection_count)
             
-            # Update Admin Dashboard after cleanup
-            await self.broadcast_to_admins({
-                'type': 'status_update',
-                'connected_clients': len(clients), 
-                'user_status': user_status # This now only contains stable IDs
-            })
+            # Update Admin Dashboard after cleanup (offline flag and new count go out in the next delta)
+            self.announce_presence()
         
         return ws
 
     async def admin_websocket(self, request):
         """Handle admin WebSocket connections (/ws/admin)"""
-        ws = web.WebSocketResponse()
+        refused = self.admit_socket(request, 'admin')
+        if refused is not None:
+            return refused
+        try:
+            return await self.admin_session(request)
+        finally:
+            self.admission.release(request.remote)
+
+    async def admin_session(self, request):
+        """One admitted dashboard socket, from upgrade to cleanup"""
+        ws = self.ws_response_class(autoping=False, max_msg_size=self.limits.max_admin_frame,
+                                    protocols=SUBPROTOCOLS)
         await ws.prepare(request)
         
-        admin_id = f"admin_{len(admin_clients) + 1}"
+        self.admin_count += 1
+        admin_id = f"admin_{self.admin_count}"
         admin_clients[admin_id] = ws
-        print(f"✓ Admin connected: {admin_id}")
+        self.admin_fanout.register(admin_id, ws, binary=ws.ws_protocol == PROTOCOL_MSGPACK)
+        # ?zones=A/3,B limits zone-specific frames to those areas; no zones sees the whole site
+        self.admin_audience.place(admin_id, parse_targets(request.query.get('zones')))
+        self.heartbeats.register(admin_id, ws, request.transport, kind='admin')
+        log.info("✓ Admin connected: %s (%s)", admin_id, request['admin'])
         
-        await ws.send_json({
-            'type': 'status_update',
-            'alert_active': alert_active,
-            'connected_clients': len(clients),
-            'user_status': user_status
-        })
+        # Reconnecting dashboards pass ?stream=&since= to replay only what they missed
+        try:
+            since = int(request.query['since']) if 'since' in request.query else None
+        except ValueError:
+            since = None
+        for frame in self.admin_stream.handshake(request.query.get('stream'), since):
+            self.admin_fanout.send(admin_id, frame)
+        if self.sensors.sensors:
+            self.admin_fanout.send(admin_id, {'type': 'sensor_snapshot', 'sensors': self.sensors.snapshot()})
         
+        allowance = MessageAllowance(self.limits.message_rate, self.limits.message_burst)
         try:
             async for msg in ws:
-                if msg.type == web.WSMsgType.TEXT:
-                    data = json.loads(msg.data)
+                self.heartbeats.touch(admin_id)
+                if msg.type in (web.WSMsgType.TEXT, web.WSMsgType.BINARY):
+                    data = parse_frame(msg)
+                    if data is None:
+                        continue
+                    # Alarm commands are never rate limited
+                    if data.get('type') not in ('trigger_alarm', 'clear_alarm'):
+                        if not allowance.take():
+                            if self.over_limit(allowance, admin_id):
+                                await ws.close(code=POLICY_VIOLATION, message=b'message rate exceeded')
+                                break
+                            continue
+                        allowance.strikes = 0
                     await self.handle_admin_message(admin_id, data)
+                elif msg.type == web.WSMsgType.PING:
+                    await ws.pong(msg.data)
                 elif msg.type == web.WSMsgType.ERROR:
-                    print(f'Admin WebSocket error: {ws.exception()}')
+                    log.warning('Admin WebSocket error: %s', ws.exception())
         finally:
             admin_clients.pop(admin_id, None)
-            print(f"✗ Admin disconnected: {admin_id}")
+            self.admin_fanout.unregister(admin_id)
+            self.admin_audience.remove(admin_id)
+            self.heartbeats.unregister(admin_id)
+            log.info("✗ Admin disconnected: %s", admin_id)
         
         return ws
 
@@ -142,34 +479,42 @@ class FireEmergencyServer:
         """Handle admin login (/api/admin/login)"""
         try:
             data = await request.json()
-            username = data.get('username')
-            password = data.get('password')
-            
-            if username in ADMIN_CREDENTIALS and ADMIN_CREDENTIALS[username] == password:
-                return web.json_response({
-                    'success': True,
-                    'token': f'admin_{username}',
-                    'message': 'Login successful'
-                })
-            else:
-                return web.json_response({
-                    'success': False,
-                    'message': 'Invalid credentials'
-                }, status=401)
-        except Exception as e:
+        except ValueError as e:
             return web.json_response({'error': str(e)}, status=400)
+        username = data.get('username')
+        
+        if await self.credentials.check(username, data.get('password')):
+            token, expires_at = self.tokens.issue(username)
+            log.info("🔑 Admin %s logged in", username)
+            return web.json_response({
+                'success': True,
+                'token': token,
+                'expires_at': expires_at,
+                'message': 'Login successful'
+            })
+        log.warning("⚠️ Failed admin login for %r from %s", username, request.remote)
+        return web.json_response({
+            'success': False,
+            'message': 'Invalid credentials'
+        }, status=401)
+    
+    async def get_admin_session(self, request):
+        """Who the token belongs to; 401 once it has expired (/api/admin/session)"""
+        return web.json_response({'username': request['admin']})
     
     async def admin_broadcast(self, request):
         """HTTP endpoint for admin broadcast (/api/admin/broadcast)"""
         try:
             data = await request.json()
             message = data.get('message')
+            zones = parse_targets(data.get('zones'))
             
             await self.broadcast_to_clients({
                 'type': 'admin_message',
                 'message': message,
-                'from': data.get('token', 'Admin'), 
-                'timestamp': datetime.now().isoformat()
+                'from': request['admin'],
+                'timestamp': datetime.now().isoformat(),
+                'zones': zones
             })
             
             return web.json_response({'success': True})
@@ -177,24 +522,204 @@ class FireEmergencyServer:
             return web.json_response({'error': str(e)}, status=400)
     
     async def trigger_alarm_endpoint(self, request):
-        """HTTP endpoint to trigger alarm (/api/admin/trigger_alarm)"""
-        await self.trigger_alarm_manual()
-        return web.json_response({'success': True, 'message': 'Alarm triggered'})
+        """HTTP endpoint to trigger alarm, optionally {"zones": [...]} (/api/admin/trigger_alarm)"""
+        try:
+            data = await request.json() if request.can_read_body else {}
+        except ValueError:
+            data = {}
+        try:
+            zones = parse_targets(data.get('zones') if isinstance(data, dict) else None)
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        timeline = await self.trigger_alarm_manual(zones)
+        return web.json_response({'success': True, 'message': 'Alarm triggered', 'alarm_id': timeline.alarm_id})
     
     async def clear_alarm_endpoint(self, request):
         """HTTP endpoint to clear alarm (/api/admin/clear_alarm)"""
-        await self.clear_alarm()
-        return web.json_response({'success': True, 'message': 'Alarm cleared'})
+        timeline = await self.clear_alarm()
+        return web.json_response({'success': True, 'message': 'Alarm cleared', 'alarm_id': timeline.alarm_id})
+    
+    async def get_alarms(self, request):
+        """Recent alarm delivery timelines, newest first (/api/alarms)"""
+        try:
+            limit = int(request.query.get('limit', 20))
+        except ValueError:
+            limit = 20
+        return web.json_response({
+            'alarms': [timeline.to_dict() for timeline in self.alarms.recent(limit)],
+            'stats': self.alarms.stats()
+        })
+    
+    async def get_alarm(self, request):
+        """One alarm's delivery timeline (/api/alarms/{alarm_id})"""
+        timeline = self.alarms.get(request.match_info['alarm_id'])
+        if timeline is None:
+            raise web.HTTPNotFound(text='Unknown alarm')
+        return web.json_response(timeline.to_dict())
     
     async def get_status(self, request):
         """Get system status (/api/status)"""
         return web.json_response({
             'alert_active': alert_active,
-            'connected_clients': len(clients),
+            'alarm_zones': alarm_zones,
+            'connected_clients': self.total_connections(),
             'connected_admins': len(admin_clients),
-            'user_status': user_status
+            'worker': self.worker_id,
+            'worker_clients': self.occupants.connection_count,
+            'user_status': self.occupants.user_status(),
+            'status_counts': self.occupants.count_by_status()
+        })
+    
+    async def get_sensors(self, request):
+        """Current state of every sensor that has reported (/api/sensors)"""
+        return web.json_response({
+            'sensors': self.sensors.snapshot(),
+            'stats': self.sensors.stats()
+        })
+
+    async def get_sensor_history(self, request):
+        """One sensor's smoke levels over a time range (/api/sensors/{sensor_id}/history)
+
+        ?from=&to= are epoch seconds (default: the last hour), or ?last=<seconds> before `to`;
+        the range is clamped to now and to what is retained, and may span at most MAX_SPAN.
+        ?resolution=raw|minute|hour|auto picks readings or rollups; auto chooses by range.
+        """
+        if self.telemetry is None:
+            raise web.HTTPNotFound(text='Telemetry is disabled')
+        sensor_id = request.match_info['sensor_id']
+        query = request.query
+        try:
+            end = min(float(query.get('to', 'inf')), time.time())   # ?last= counts back from now at the latest
+            start = float(query['from']) if 'from' in query else end - float(query.get('last', 3600))
+        except ValueError:
+            return web.json_response({'error': 'from, to and last must be numbers'}, status=400)
+        resolution = query.get('resolution', 'auto')
+        if resolution != 'auto' and resolution not in RESOLUTIONS:
+            return web.json_response({'error': 'resolution must be raw, minute, hour or auto'}, status=400)
+        if not start < end:
+            return web.json_response({'error': 'from must be before to'}, status=400)
+        if end - start > MAX_SPAN:
+            return web.json_response({'error': f'from and to may be at most {MAX_SPAN // 86400} days apart'},
+                                     status=400)
+        history = await self.telemetry.history(sensor_id, start, end, resolution)
+        # Only the recording worker knows every sensor; the others just see what is on disk
+        if not history['points'] and self.telemetry.writable and sensor_id not in self.telemetry.series:
+            raise web.HTTPNotFound(text='Unknown sensor')
+        return web.json_response(history)
+
+    async def get_fanout_stats(self, request):
+        """Fan-out queue health and alert-to-last-delivery latency (/api/stats/fanout)"""
+        return web.json_response({
+            'clients': self.client_fanout.stats(),
+            'admins': self.admin_fanout.stats(),
+            'admin_stream': self.admin_stream.stats(),
+            'backplane': self.backplane.stats()
         })
+
+    async def get_zones(self, request):
+        """Site layout, who is where and which zones the alarm covers (/api/zones)"""
+        return web.json_response({
+            'layout': self.zones.to_dict(),
+            'alarm_zones': alarm_zones,
+            'escalations_pending': sorted(self._escalations),
+            'occupants': self.occupants.count_by_area(),
+            'sockets': self.client_audience.counts(),
+            'unplaced_sockets': len(self.client_audience.unplaced),
+            'admins': self.admin_audience.counts()
+        })
+
+    def dashboard_state(self):
+        """Scalar fields every admin snapshot and delta carries"""
+        return {
+            'alert_active': alert_active,
+            'alarm_zones': alarm_zones,
+            'connected_clients': self.total_connections()
+        }
     
+    async def upload_map(self, request):
+        """Store an evacuation map and return its content hash (/api/admin/maps)
+
+        Accepts either a raw image body or JSON {'map_data': <data URL>}.
+        """
+        try:
+            if request.content_type == 'application/json':
+                data = await request.json()
+                digest, content_type = await asyncio.to_thread(self.map_store.put_data_url, data.get('map_data'))
+            else:
+                body = await read_body(request, MAX_MAP_SIZE)
+                digest = await asyncio.to_thread(self.map_store.put, body, request.content_type)
+        except web.HTTPRequestEntityTooLarge:
+            return web.json_response({'success': False, 'error': f'map exceeds {MAX_MAP_SIZE} bytes'}, status=413)
+        except MapStoreError as e:
+            return web.json_response({'success': False, 'error': str(e)}, status=400)
+        except Exception as e:
+            return web.json_response({'error': str(e)}, status=400)
+
+        return web.json_response({
+            'success': True,
+            'map_hash': digest,
+            'map_url': f'/maps/{digest}'
+        })
+
+    async def serve_map(self, request):
+        """Serve a stored map by hash with ETag, immutable caching and Range support (/maps/{digest})"""
+        digest = request.match_info['digest']
+        # A cache miss reads up to MAX_MAP_SIZE from disk, which must not stall alarm sockets
+        entry = self.map_store.cached(digest) or await asyncio.to_thread(self.map_store.get, digest)
+        if entry is None:
+            raise web.HTTPNotFound()
+        data, content_type = entry
+
+        # The URL is the content hash, so the response can never change
+        headers = {
+            'ETag': f'"{digest}"',
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'Accept-Ranges': 'bytes'
+        }
+        if_none_match = request.headers.get('If-None-Match', '')
+        if if_none_match == '*' or f'"{digest}"' in if_none_match:
+            return web.Response(status=304, headers=headers)
+
+        try:
+            byte_range = parse_range(request.headers.get('Range'), len(data))
+        except MapStoreError:
+            headers['Content-Range'] = f'bytes */{len(data)}'
+            return web.Response(status=416, headers=headers)
+
+        if byte_range is None:
+            return web.Response(body=data, content_type=content_type, headers=headers)
+
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+        return web.Response(status=206, body=data[start:end + 1], content_type=content_type, headers=headers)
+
+    async def serve_static(self, request):
+        """Dashboard and client assets from memory: precompressed, ETag/304, versioned names immutable (/static/...)"""
+        representations = self.static_assets.lookup(request.match_info['name'])
+        if representations is None:
+            raise web.HTTPNotFound()
+        return self.static_response(request, representations)
+
+    async def serve_service_worker(self, request):
+        """The service worker, from the site root so it may control every page (/sw.js)"""
+        if self.static_assets is None or self.static_assets.service_worker is None:
+            raise web.HTTPNotFound()
+        response = self.static_response(request, self.static_assets.service_worker)
+        response.headers['Service-Worker-Allowed'] = '/'
+        return response
+
+    def static_response(self, request, representations):
+        """The best encoding the client accepts, or 304 if it already has this content"""
+        assets = self.static_assets
+        encoding, representation = assets.choose(representations, request.headers.get('Accept-Encoding'))
+        if assets.not_modified(representation, request.headers.get('If-None-Match')):
+            assets.revalidated += 1
+            headers = representation.headers
+            return web.Response(status=304, headers={'ETag': headers['ETag'], 'Cache-Control': headers['Cache-Control'],
+                                                     'Vary': 'Accept-Encoding'})
+        assets.count(encoding)
+        return web.Response(body=representation.body, headers=representation.headers)
+
     async def subscribe_pwa(self, request):
         """Handles PWA Push subscription data from clients"""
         # (Placeholder function, ignored for native app)
@@ -220,14 +745,39 @@ class FireEmergencyServer:
         self.app.router.add_get('/ws/admin', self.admin_websocket)
         
         self.app.router.add_post('/api/admin/login', self.admin_login)
+        self.app.router.add_get('/api/admin/session', self.get_admin_session)
         self.app.router.add_post('/api/admin/broadcast', self.admin_broadcast)
         self.app.router.add_post('/api/admin/trigger_alarm', self.trigger_alarm_endpoint)
         self.app.router.add_post('/api/admin/clear_alarm', self.clear_alarm_endpoint)
+        self.app.router.add_post('/api/admin/maps', self.upload_map)
+        self.app.router.add_get('/maps/{digest}', self.serve_map)
         self.app.router.add_get('/api/status', self.get_status)
+        self.app.router.add_get('/api/stats/fanout', self.get_fanout_stats)
+        self.app.router.add_get('/api/stats/udp', self.get_udp_stats)
+        self.app.router.add_get('/api/stats/fcm', self.get_fcm_stats)
+        self.app.router.add_get('/api/stats/journal', self.get_journal_stats)
+        self.app.router.add_get('/api/stats/liveness', self.get_liveness_stats)
+        self.app.router.add_get('/api/stats/sessions', self.get_session_stats)
+        self.app.router.add_get('/api/stats/ingress', self.get_ingress_stats)
+        self.app.router.add_get('/api/stats/auth', self.get_auth_stats)
+        self.app.router.add_get('/api/stats/telemetry', self.get_telemetry_stats)
+        self.app.router.add_get('/api/stats/static', self.get_static_stats)
+        self.app.router.add_get('/api/sensors', self.get_sensors)
+        self.app.router.add_get('/api/sensors/{sensor_id}/history', self.get_sensor_history)
+        self.app.router.add_get('/api/zones', self.get_zones)
+        self.app.router.add_get('/api/alarms', self.get_alarms)
+        self.app.router.add_get('/api/alarms/{alarm_id}', self.get_alarm)
+        self.app.router.add_get('/metrics', self.get_metrics)
+        self.app.router.add_get('/api/admin/profiler', self.get_profile)
+        self.app.router.add_post('/api/admin/profiler', self.control_profiler)
         
         self.app.router.add_post('/api/subscribe', self.subscribe_pwa)
         
-        self.app.router.add_static('/static/', path=os.path.join(os.path.dirname(__file__), 'static'), name='static')
+        if self.static_assets is not None:
+            self.app.router.add_get('/static/{name:.+}', self.serve_static, name='static')
+        else:
+            self.app.router.add_static('/static/', path=os.path.join(os.path.dirname(__file__), 'static'), name='static')
+        self.app.router.add_get('/sw.js', self.serve_service_worker)
         
         self.app.router.add_get('/', self.serve_client)
         self.app.router.add_get('/admin', self.serve_admin)
@@ -243,9 +793,8 @@ class FireEmergencyServer:
     # 3. UTILITY & LISTENER METHODS 
     # ==========================================================
 
-    async def handle_client_message(self, transient_client_id, data):
-        """Process messages from clients"""
-        global fcm_tokens, client_names, user_status, client_to_stable_id
+    async def handle_client_message(self, transient_client_id, data, throttled=False):
+        """Process messages from clients; `throttled` frames are over the socket's message rate"""
         msg_type = data.get('type')
         
         if msg_type == 'register_name':
@@ -255,203 +804,262 @@ class FireEmergencyServer:
             # 🎯 CRITICAL FIX: Generate stable ID
             stable_id = generate_stable_id(name, token)
             
-            # Link the temporary socket ID to the stable user ID
-            client_to_stable_id[transient_client_id] = stable_id
-            
-            # Store data under the stable ID
-            client_names[stable_id] = name
-            if token:
-                fcm_tokens[stable_id] = token
+            # Link the temporary socket ID to the stable user ID and store data under it
+            zone = area_path(data.get('building'), data.get('floor'), data.get('zone'))
+            occupant = self.occupants.register(transient_client_id, stable_id, name, token or None, zone=zone)
+            self.client_audience.place(transient_client_id, occupant.zone)
             
-            print(f"👤 Client registered. Name: {name}, Stable ID: {stable_id[:8]}...")
-            
-            # Update Admin Dashboard with the current list of *active* users
-            await self.broadcast_to_admins({
-                'type': 'status_update',
-                'connected_clients': len(clients), 
-                'user_status': user_status
-            })
+            log.debug("👤 Client registered. Name: %s, Stable ID: %s..., Zone: %s", name, stable_id[:8], occupant.zone)
+            # A reconnecting phone that did not say where it got to is resumed from its last session
+            for frame in self.sessions.bind(transient_client_id, stable_id, occupant.zone):
+                self.client_fanout.send(transient_client_id, frame)
+            # Admins learn about the user through the status delta stream
 
             
         elif msg_type == 'status_update': 
             status = data.get('status')
             
             # Use stable ID for persistence
-            stable_id = client_to_stable_id.get(transient_client_id)
+            stable_id = self.occupants.stable_id_for(transient_client_id)
             if not stable_id:
-                print(f"⚠️ ERROR: Status update from unregistered client {transient_client_id[:8]}")
+                log.warning("⚠️ Status update from unregistered client %s", transient_client_id[:8])
                 return
             
-            display_name = client_names.get(stable_id, "Unknown User")
-            
-            user_status[stable_id] = {
-                'status': status,
-                'timestamp': datetime.now().isoformat(),
-                'name': display_name # Use name for display
-            }
-            print(f"📊 Status update from {display_name}: {status}")
-            
-            await self.broadcast_to_admins({
-                'type': 'user_status', 
-                'client_id': stable_id, # Send stable ID as the key
-                'status': status,
-                'name': display_name,
-                'timestamp': datetime.now().isoformat()
-            })
+            # At most status_rate per person per second; faster updates collapse into the latest one
+            self.status_updates.offer(stable_id, (status, datetime.now().isoformat()),
+                                      defer=throttled or self.shedder.shedding)
+    
+    def apply_status(self, stable_id, update):
+        """Record a (possibly coalesced) status update"""
+        status, timestamp = update
+        occupant = self.occupants.set_status(stable_id, status, timestamp)
+        if occupant is None:
+            return  # Purged while the update waited
+        log.debug("📊 Status update from %s: %s", occupant.name or "Unknown User", status)
+        # Reaches admins in the next status_delta, keyed by stable ID
     
     async def handle_admin_message(self, admin_id, data):
         """Process messages from admins"""
         msg_type = data.get('type')
+        if msg_type in ('broadcast', 'trigger_alarm'):
+            try:
+                zones = parse_targets(data.get('zones'))
+            except ValueError as e:
+                # Nothing is sent: a malformed target must not be widened to the whole site
+                self.admin_fanout.send(admin_id, {'type': 'error', 'request': msg_type, 'error': str(e)})
+                return
         
         if msg_type == 'broadcast':
             message = data.get('message')
+            map_hash = data.get('map_hash')
             map_data = data.get('map_data')
             map_filename = data.get('map_filename')
             
+            # Older dashboards still send the image inline: store it and send a reference instead
+            if map_data and not map_hash:
+                try:
+                    map_hash, _ = await asyncio.to_thread(self.map_store.put_data_url, map_data)
+                except MapStoreError as e:
+                    log.warning("⚠️ Rejected map from %s: %s", admin_id, e)
+            
+            if map_hash and not (self.map_store.cached(map_hash)
+                                 or await asyncio.to_thread(self.map_store.__contains__, map_hash)):
+                log.warning("⚠️ Unknown map hash from %s: %s", admin_id, map_hash[:12])
+                map_hash = None
+            
             await self.broadcast_to_clients({
                 'type': 'broadcast', 
                 'message': message,
                 'from': admin_id,
                 'timestamp': datetime.now().isoformat(),
-                'map_data': map_data,        
-                'map_filename': map_filename 
+                'map_hash': map_hash,
+                'map_url': f'/maps/{map_hash}' if map_hash else None,
+                'map_filename': map_filename,
+                'zones': zones
             })
-            print(f"📢 Admin broadcast: {message} {'(Map attached)' if map_data else ''}")
+            log.info("📢 Admin broadcast: %s%s", message, ' (Map attached)' if map_hash else '')
             
+        # Alarm commands run as their own tasks: the socket's next frame (a clear right
+        # after a trigger) must not wait out the previous alarm's push deadline
         elif msg_type == 'trigger_alarm':
-            await self.trigger_alarm_manual()
+            self.spawn(self.trigger_alarm_manual(zones))
         
         elif msg_type == 'clear_alarm': 
-            await self.clear_alarm()
-            
-    async def broadcast_to_clients(self, message):
-        """Send message to all connected clients"""
-        print(f"\n📤 Broadcasting to {len(clients)} client(s): {message.get('type')}")
-        
-        if len(clients) == 0:
-            print("⚠️  WARNING: No clients connected to receive broadcast!")
-            return
+            self.spawn(self.clear_alarm())
             
-        disconnected = []
-        success_count = 0
-        
-        for client_id, ws in clients.items():
-            try:
-                await ws.send_json(message)
-                success_count += 1
-            except Exception as e:
-                print(f"   ✗ Failed to send to {client_id}: {e}")
-                disconnected.append(client_id)
+    async def broadcast_to_clients(self, message, origin=None):
+        """Queue message on every connected client's socket (returns without waiting on sends)"""
+        log.debug("📤 Broadcasting to %d client(s): %s", len(self.client_fanout), message.get('type'))
         
-        for client_id in disconnected:
-            clients.pop(client_id, None)
+        if len(self.client_fanout) == 0:
+            log.warning("⚠️ No clients connected to receive broadcast!")
         
-        print(f"✅ WebSocket Broadcast complete: {success_count}/{len(clients) + len(disconnected)} successful")
+        # Each socket's writer task delivers independently; await record.wait() for completion
+        return self.fan_out(TOPIC_CLIENTS, message, origin)
     
-    async def broadcast_to_admins(self, message):
-        """Send message to all connected admins"""
-        disconnected = []
-        for admin_id, ws in admin_clients.items():
-            try:
-                await ws.send_json(message)
-            except Exception:
-                disconnected.append(admin_id)
-        
-        for admin_id in disconnected:
-            admin_clients.pop(admin_id, None)
+    async def broadcast_to_admins(self, message, origin=None):
+        """Queue message on every connected admin's socket"""
+        return self.fan_out(TOPIC_ADMINS, message, origin)
+
+    def fan_out(self, topic, message, origin=None):
+        """Broadcast on this worker's sockets and forward to every other worker.
+
+        The returned record only covers local sockets; peers deliver on their own.
+        """
+        record = self.deliver(topic, message, origin)
+        self.backplane.publish(topic, message)
+        if topic == TOPIC_CLIENTS:
+            self.record(KIND_BROADCAST, m=message)
+        return record
+
+    def deliver(self, topic, message, origin=None):
+        """Queue a frame on this worker's sockets: all of them, or only the audience of its `zones`"""
+        zones = message.get('zones')
+        if topic == TOPIC_CLIENTS:
+            # Sockets nobody placed still get alarms; each worker sequences client frames itself
+            audience = (self.client_audience.resolve(zones, message.get('type') in UNPLACED_TYPES)
+                        if zones is not None else None)
+            return self.client_fanout.broadcast(self.sessions.stamp(message), origin=origin, audience=audience)
+        # Admins without zones oversee the whole site
+        audience = self.admin_audience.resolve(zones, include_unplaced=True) if zones is not None else None
+        return self.admin_fanout.broadcast(message, origin=origin, audience=audience)
+
+    def _close_evicted(self, socket_id, ws):
+        """Close a socket the fan-out engine gave up on; its handler runs the usual cleanup"""
+        if not ws.closed:
+            asyncio.get_running_loop().create_task(ws.close())
 
-    async def send_fcm_push_notification(self, title, body, data_payload):
-        """Sends a data-only push notification to all registered FCM tokens"""
-        global fcm_tokens
+    async def send_fcm_push_notification(self, title, body, data_payload, zones=None):
+        """Sends a data-only push notification to all registered FCM tokens (or those in `zones`)"""
+        # People who never said where they are are pushed to for every alarm
+        tokens = self.occupants.tokens(zones, include_unplaced=True) if zones is not None else self.occupants.tokens()
         
-        if not fcm_tokens:
-             print("🔔 WARNING: No FCM tokens registered to receive push notifications.")
+        if not tokens:
+             log.warning("🔔 No FCM tokens registered to receive push notifications.")
              return
-             
-        tokens = list(set(fcm_tokens.values()))
-        
-        print(f"🔔 Sending FCM Push to {len(tokens)} token(s)...")
 
-        message = messaging.MulticastMessage(
-            data=data_payload,
-            tokens=tokens,
-            android=messaging.AndroidConfig(
-                priority="high"
-            ),
-            apns=messaging.APNSConfig(
-                headers={"apns-priority": "10"}
-            )
-        )
+        log.info("🔔 Sending FCM Push to %d token(s)...", len(tokens))
 
         try:
-            def send_fcm():
-                return messaging.send_multicast(message)
-            
-            batch_response = await asyncio.to_thread(send_fcm)
-            
-            print(f"✅ FCM Push Sent: {batch_response.success_count} successful, {batch_response.failure_count} failed")
-            
-            if batch_response.failure_count > 0:
-                failed_tokens = []
-                for idx, response in enumerate(batch_response.responses):
-                    if not response.success:
-                        failed_tokens.append(tokens[idx])
-                print(f"   Failed tokens: {failed_tokens}")
-                
+            result = await self.fcm.dispatch(tokens, data_payload)
         except Exception as e:
-            print(f"🔥 FCM Push ERROR: {e}")
+            log.exception("🔥 FCM Push ERROR: %s", e)
+            return
+
+        if result.skipped:
+            log.warning("📵 FCM Push skipped for %d token(s): Firebase unavailable, WebSocket delivery only",
+                        result.skipped)
+            return result
+        log.info("✅ FCM Push Sent: %d successful, %d failed (%d batch(es), %d retried, %.0f ms)",
+                 result.sent, result.failed, result.batches, result.retries, result.elapsed * 1000)
+        if result.pruned:
+            log.info("Removed %d unregistered token(s)", len(result.pruned))
+        return result
 
     
-    async def trigger_alarm_manual(self):
-        """Manually trigger alarm (admin action)"""
-        global alert_active
-        alert_active = True
-        
-        print("🚨 Manual alarm triggered by admin")
-
-        await self.broadcast_to_clients({
-            'type': 'fire_alert',
-            'source': 'manual_trigger',
-            'message': 'FIRE EMERGENCY - EVACUATE IMMEDIATELY',
-            'timestamp': datetime.now().isoformat()
-        })
+    def fanout_channel(self, broadcast, message, origin=None):
+        """Alarm channel: queue `message` on every socket and wait until each one is written"""
+        async def deliver():
+            record = await broadcast(message, origin=origin)
+            await record.wait()
+            return {'delivered': record.delivered, 'failed': record.failed}
+        return deliver
+
+    def push_channel(self, title, body, data_payload, zones=None):
+        """Alarm channel: FCM push to every registered token in `zones` (None: everyone)"""
+        async def deliver():
+            result = await self.send_fcm_push_notification(title, body, data_payload, zones)
+            return result.to_dict() if result is not None else {'tokens': 0}
+        return deliver
+
+    async def dispatch_alarm(self, kind, client_message=None, admin_message=None, push=None,
+                             origin=None, info=None, zones=None):
+        """Start every delivery channel at once and return the alarm's timeline
+
+        With `zones`, sockets and pushes only reach people there (and anyone unplaced).
+        """
+        if zones is not None:
+            for message in (client_message, admin_message):
+                if message is not None:
+                    message['zones'] = zones
+            info = dict(info or {}, zones=zones)
+        channels = {}
+        if client_message is not None:
+            channels['clients'] = (self.fanout_channel(self.broadcast_to_clients, client_message, origin),
+                                   WS_DELIVERY_DEADLINE)
+        if admin_message is not None:
+            channels['admins'] = (self.fanout_channel(self.broadcast_to_admins, admin_message, origin),
+                                  WS_DELIVERY_DEADLINE)
+        if push is not None:
+            channels['fcm'] = (self.push_channel(*push, zones=zones), FCM_DELIVERY_DEADLINE)
+
+        timeline = await self.alarms.dispatch(kind, channels, origin=origin, info=info)
+        summary = ', '.join(f"{run.name} {run.status} @ {timeline.offset_ms(run.finished_at):.0f} ms"
+                            for run in timeline.channels.values())
+        log.info("⏱️ Alarm %s: %s", timeline.alarm_id, summary,
+                 extra={'alarm_id': timeline.alarm_id, 'kind': kind})
+        return timeline
+    
+    async def trigger_alarm_manual(self, zones=None):
+        """Manually trigger alarm (admin action), site-wide or in `zones`"""
+        # Whatever the admin asked for is paged again, even if it already is
+        self.widen_alarm(zones)
         
-        await self.send_fcm_push_notification(
-            title='🚨 FIRE ALERT',
-            body='Evacuate immediately! Open the app for details.',
-            data_payload={
+        log.warning("🚨 Manual alarm triggered by admin%s", f" in {', '.join(zones)}" if zones else '')
+
+        return await self.dispatch_alarm(
+            'manual_alarm',
+            client_message={
                 'type': 'fire_alert',
-                'message': 'FIRE EMERGENCY - EVACUATE IMMEDIATELY'
-            }
+                'source': 'manual_trigger',
+                'message': 'FIRE EMERGENCY - EVACUATE IMMEDIATELY',
+                'timestamp': datetime.now().isoformat()
+            },
+            push=(
+                '🚨 FIRE ALERT',
+                'Evacuate immediately! Open the app for details.',
+                {
+                    'type': 'fire_alert',
+                    'message': 'FIRE EMERGENCY - EVACUATE IMMEDIATELY'
+                }
+            ),
+            zones=zones
         )
     
     async def clear_alarm(self):
-        """Clear the active alarm"""
-        global alert_active
-        alert_active = False
+        """Clear the active alarm (the all-clear goes where the alarm went)"""
+        zones = alarm_zones
+        self.set_alert_active(False)
         
-        print("✅ Alarm cleared - All clear message sent")
+        # Fire pushes still retrying must not land after the all-clear
+        cancelled = self.alarms.cancel()
+        if cancelled:
+            log.info("Cancelled %d in-flight alarm channel(s)", cancelled)
         
-        await self.broadcast_to_clients({
-            'type': 'clear_alert', 
-            'message': '✅ ALL CLEAR - Emergency has been resolved.',
-            'from': 'System',
-            'timestamp': datetime.now().isoformat()
-        })
+        log.info("✅ Alarm cleared - All clear message sent")
         
-        await self.send_fcm_push_notification(
-            title='✅ ALL CLEAR',
-            body='The emergency has been resolved. You may return to normal activities.',
-            data_payload={
-                'type': 'clear_alert'
-            }
+        return await self.dispatch_alarm(
+            'all_clear',
+            client_message={
+                'type': 'clear_alert', 
+                'message': '✅ ALL CLEAR - Emergency has been resolved.',
+                'from': 'System',
+                'timestamp': datetime.now().isoformat()
+            },
+            admin_message={
+                'type': 'alert_cleared',
+                'timestamp': datetime.now().isoformat()
+            },
+            push=(
+                '✅ ALL CLEAR',
+                'The emergency has been resolved. You may return to normal activities.',
+                {
+                    'type': 'clear_alert'
+                }
+            ),
+            zones=zones
         )
         
-        await self.broadcast_to_admins({
-            'type': 'alert_cleared',
-            'timestamp': datetime.now().isoformat()
-        })
-        
 
     async def notify_admin_of_user_message(self, alert_data):
         """Notify admins of a user message from a physical terminal"""
@@ -461,114 +1069,665 @@ class FireEmergencyServer:
              'timestamp': datetime.now().isoformat()
         })
 
-    async def handle_fire_alert(self, alert_data):
-        """Handle fire alert from ESP8266 (or simulator)"""
-        global alert_active
+    async def handle_fire_alert(self, alert_data, received_at=None, zones=None):
+        """Handle fire alert from ESP8266 (or simulator); the caller has already claimed `zones`"""
+        log.warning("🔥 PROCESSING FIRE ALERT from %s (smoke level %s) in %s",
+                    alert_data.get('sensor_id'), alert_data.get('smoke_level'), ', '.join(zones or ['all zones']),
+                    extra={'sensor_id': alert_data.get('sensor_id'), 'smoke_level': alert_data.get('smoke_level')})
         
-        if alert_active: 
-            return 
-            
-        alert_active = True
-        
-        print(f"\n{'='*60}")
-        print(f"🔥 PROCESSING FIRE ALERT")
-        print(f"   Smoke Level: {alert_data.get('smoke_level')}")
-        print(f"   Sensor ID: {alert_data.get('sensor_id')}")
-        print(f"{'='*60}\n")
-        
-        broadcast_message = {
-            'type': 'fire_alert',
-            'source': 'esp8266_sensor',
-            'message': '🚨 FIRE DETECTED - EVACUATE IMMEDIATELY 🚨',
-            'timestamp': datetime.now().isoformat()
-        }
-        await self.broadcast_to_clients(broadcast_message)
-        
-        await self.broadcast_to_admins({
-            'type': 'fire_alert',
-            'alert_data': alert_data,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        await self.send_fcm_push_notification(
-            title='🔥 FIRE DETECTED BY SENSOR',
-            body=f"Evacuate Now! Smoke detected at {alert_data.get('sensor_id')}.",
-            data_payload={
+        await self.dispatch_alarm(
+            'sensor_alarm',
+            client_message={
+                'type': 'fire_alert',
+                'source': 'esp8266_sensor',
+                'message': '🚨 FIRE DETECTED - EVACUATE IMMEDIATELY 🚨',
+                'timestamp': datetime.now().isoformat()
+            },
+            admin_message={
                 'type': 'fire_alert',
-                'message': 'FIRE DETECTED - EVACUATE IMMEDIATELY'
-            }
+                'alert_data': alert_data,
+                'timestamp': datetime.now().isoformat()
+            },
+            push=(
+                '🔥 FIRE DETECTED BY SENSOR',
+                f"Evacuate Now! Smoke detected at {alert_data.get('sensor_id')}.",
+                {
+                    'type': 'fire_alert',
+                    'message': 'FIRE DETECTED - EVACUATE IMMEDIATELY'
+                }
+            ),
+            origin=received_at,
+            info={'sensor_id': alert_data.get('sensor_id'), 'smoke_level': alert_data.get('smoke_level')},
+            zones=zones
         )
         
-        print("✅ Fire alert processing complete!\n")
+        log.info("✅ Fire alert processing complete!")
 
-    def start_udp_listener(self):
-        """Listens for UDP broadcasts from ESP8266"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        
-        try:
-             sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        except OSError as e:
-             print(f"Warning: Could not set SO_BROADCAST option: {e}") 
+    def schedule_escalation(self, zone):
+        """Page the zones around `zone` if its alarm is still active after `escalate_after` seconds"""
+        if zone in self._escalations:
+            return
+        self._escalations[zone] = asyncio.get_running_loop().call_later(self.escalate_after, self.escalate, zone)
 
-        sock.bind(('', self.udp_port))
-        
-        print(f"✓ UDP Listener started on port {self.udp_port}")
-        print("Waiting for fire alerts from ESP8266...\n")
+    def escalate(self, zone):
+        """Extend the alarm from `zone` to its neighbours (now, cancelling any timer)"""
+        handle = self._escalations.pop(zone, None)
+        if handle is not None:
+            handle.cancel()
+        if not alert_active:
+            return
+        new = self.widen_alarm(self.zones.neighbours(zone))
+        if not new:
+            return  # Neighbours are already evacuating
+        log.warning("📈 Alarm in %s escalated to %s", zone, ', '.join(new), extra={'zone': zone})
+        self.spawn(self.dispatch_alarm(
+            'escalation',
+            client_message={
+                'type': 'fire_alert',
+                'source': 'escalation',
+                'message': '🚨 FIRE NEARBY - EVACUATE IMMEDIATELY 🚨',
+                'escalated_from': zone,
+                'timestamp': datetime.now().isoformat()
+            },
+            admin_message={
+                'type': 'alarm_escalated',
+                'from': zone,
+                'timestamp': datetime.now().isoformat()
+            },
+            push=(
+                '🔥 FIRE NEARBY',
+                f"Evacuate Now! Fire reported in {zone}.",
+                {
+                    'type': 'fire_alert',
+                    'message': 'FIRE NEARBY - EVACUATE IMMEDIATELY'
+                }
+            ),
+            info={'escalated_from': zone},
+            zones=new
+        ))
+
+    def cancel_escalations(self):
+        for handle in self._escalations.values():
+            handle.cancel()
+        self._escalations.clear()
+
+    async def start_udp_listener(self, app):
+        """Listens for UDP broadcasts from ESP8266 on the event loop"""
+        if not self.ingest_udp:
+            return  # Another worker owns the sensor port; its alarms arrive over the backplane
+        self.udp_ingest = SensorIngest(self.on_sensor_packet, self.udp_port)
+        await self.udp_ingest.start()
+        self._sweep_task = asyncio.get_running_loop().create_task(self.sweep_sensors())
         
-        loop = self.main_loop
+        log.info("✓ UDP Listener started on port %d, waiting for fire alerts from ESP8266", self.udp_ingest.port)
+
+    def on_sensor_packet(self, alert_data, addr, received_at):
+        """Dispatch one parsed sensor packet (runs on the event loop, must not block)"""
+        packet_type = alert_data.get('type')
         
-        while True:
-            try:
-                data, addr = sock.recvfrom(1024)
-                message = data.decode('utf-8')
-                
+        if packet_type == 'FIRE_ALERT':
+            # Only real per-sensor transitions reach the dashboards; repeats are absorbed here
+            sensor = self.sensors.observe(alert_data, received_at)
+            if sensor is not None:
+                log.info("🔥 Sensor %s: %s (level %s, %s)", sensor.sensor_id, sensor.state, sensor.level, sensor.trend)
+                self.fan_out(TOPIC_ADMINS, self.sensors.frame(sensor), origin=received_at)
+            
+            # The sensor's own zone first; an unplaced sensor still pages the whole site
+            zone = self.zones.locate_sensor(alert_data)
+            new = self.widen_alarm([zone] if zone else None)
+            if new != []:
+                log.warning("🚨 FIRE ALERT RECEIVED from %s", addr[0])
+                self.spawn(self.handle_fire_alert(alert_data, received_at, new))
+                if zone:
+                    self.schedule_escalation(zone)
+            # Otherwise a heartbeat for an alarm that already covers this sensor
+            if zone and sensor is not None and sensor.severity >= ESCALATE_SEVERITY:
+                self.escalate(zone)  # Spreading fast: don't wait for the timer
+            # History last: whatever it makes of the packet, the alarm above has been decided
+            if self.telemetry is not None:
                 try:
-                    alert_data = json.loads(message)
-                    
-                    if alert_data.get('type') == 'FIRE_ALERT' or alert_data.get('type') == 'USER_MESSAGE':
-                        
-                        coro = None
-                        if alert_data.get('type') == 'FIRE_ALERT':
-                            print(f"\n🚨 FIRE ALERT RECEIVED from {addr[0]}")
-                            coro = self.handle_fire_alert(alert_data)
-                        elif alert_data.get('type') == 'USER_MESSAGE':
-                            print(f"\n🗣️ USER MESSAGE from {addr[0]}")
-                            coro = self.notify_admin_of_user_message(alert_data)
-
-                        if coro:
-                            asyncio.run_coroutine_threadsafe(coro, loop)
-                            print("   ✓ Alert processing scheduled successfully")
-
-                except json.JSONDecodeError:
-                    print(f"Invalid JSON from {addr[0]}: {message}")
-                    
-            except Exception as e:
-                print(f"UDP Error: {e}")
+                    self.telemetry.record_packet(alert_data)
+                except Exception:
+                    log.exception("⚠️ Telemetry could not record a packet from %s", addr[0])
+        elif packet_type == 'USER_MESSAGE':
+            log.info("🗣️ USER MESSAGE from %s", addr[0])
+            self.spawn(self.notify_admin_of_user_message(alert_data))
+
+    async def start_telemetry(self, app):
+        """Read recent sensor history back from disk before sensor packets arrive"""
+        if self.telemetry is None or not self.telemetry.writable:
+            return
+        await asyncio.to_thread(self.telemetry.load)
+        self.telemetry.start()
+        log.info("✓ Telemetry loaded: %d sensor(s), %d rollup(s) in %s ms",
+                 len(self.telemetry.series), self.telemetry.loaded_rows, self.telemetry.load_ms)
+
+    async def sweep_sensors(self):
+        """Once a second, mark sensors that stopped re-sending alerts as cleared"""
+        while True:
+            await asyncio.sleep(1.0)
+            for sensor in self.sensors.sweep():
+                log.info("✓ Sensor %s: %s (peak %s)", sensor.sensor_id, sensor.state, sensor.peak)
+                self.fan_out(TOPIC_ADMINS, self.sensors.frame(sensor))
+
+    async def start_liveness(self, app):
+        """Start socket heartbeats and the offline grace-period reaper"""
+        self.heartbeats.start()
+        self.offline_reaper.start()
+
+    def reap_sockets(self, dead):
+        """Drop every socket that missed its heartbeat, in one pass"""
+        clients = 0
+        # Silent for at least a ping interval and timeout: nothing sent since then can be trusted
+        last_seen = time.monotonic() - self.heartbeats.interval - self.heartbeats.timeout
+        for socket_id, kind, ws, transport in dead:
+            if kind == 'client':
+                # As in client_session's cleanup: a coalesced last status is applied, not lost
+                stable_id = self.occupants.stable_id_for(socket_id)
+                if stable_id:
+                    self.status_updates.flush(stable_id)
+                occupant = self.occupants.disconnect(socket_id)
+                channel = self.client_fanout.unregister(socket_id)
+                self.client_audience.remove(socket_id)
+                self.sessions.close(socket_id, occupant.stable_id if occupant else None,
+                                    channel.written_seq if channel else None, last_seen)
+                clients += 1
+            else:
+                admin_clients.pop(socket_id, None)
+                self.admin_fanout.unregister(socket_id)
+                self.admin_audience.remove(socket_id)
+            # No closing handshake with a peer that stopped answering; its handler
+            # wakes up and finds the cleanup above already done
+            if transport is not None:
+                transport.abort()
+        if clients:
+            self.announce_presence()
+        log.info("💀 Reaped %d unresponsive socket(s) (%d client(s))", len(dead), clients)
+
+    def _track_offline(self, event, occupant):
+        if event in (EVENT_DISCONNECT, EVENT_REGISTER) and not occupant.online and occupant.offline_since is not None:
+            self.offline_reaper.add(occupant.stable_id, occupant.offline_since)
+
+    def _forget_session(self, event, occupant):
+        if event == EVENT_REMOVE:
+            self.sessions.forget(occupant.stable_id)
+
+    def purge_offline(self, stable_ids):
+        """Forget people who stayed offline past the grace period (never during an alarm)"""
+        if alert_active:
+            # Someone whose phone died mid-incident must stay on the dashboard
+            self.offline_reaper.defer(stable_ids, self.offline_reaper.tick)
+            return
+        now = time.monotonic()
+        purged = 0
+        for stable_id in stable_ids:
+            occupant = self.occupants.get(stable_id)
+            if occupant is None or occupant.online or occupant.offline_since is None:
+                continue  # Already gone, or came back within the grace period
+            if now - occupant.offline_since < self.offline_reaper.grace:
+                continue  # Went offline again later; a newer deadline is queued
+            self.occupants.remove(stable_id)
+            purged += 1
+        if purged:
+            log.info("🧹 Forgot %d occupant(s) offline for more than %.0f s", purged, self.offline_reaper.grace)
+
+    # ==========================================================
+    # 4. MULTI-WORKER COORDINATION
+    # ==========================================================
+
+    async def start_firebase(self, app):
+        """Begin loading the Firebase SDK on a thread; sockets and UDP do not wait for it"""
+        if self.firebase is not None:
+            self.firebase.start()
+
+    async def load_static_assets(self, app):
+        """Read and compress the static files before the first page request"""
+        if self.static_assets is None:
+            return
+        await asyncio.to_thread(self.static_assets.load)
+        stats = self.static_assets.stats()
+        log.info("✓ Static assets: %d file(s), %d KB (%s) in %s ms", stats['assets'], stats['raw_bytes'] // 1024,
+                 ', '.join(f"{encoding} {size // 1024} KB" for encoding, size in stats['compressed_bytes'].items()),
+                 stats['load_ms'])
+
+    async def restore_from_journal(self, app):
+        """Replay the journal before accepting sockets, so nobody's last status is lost"""
+        global alert_active, alarm_zones
+        if self.journal is None:
+            return
+        state = await asyncio.to_thread(self.journal.replay)
+        for record in state.occupants.values():
+            occupant = self.occupants.restore(record)
+            self.offline_reaper.add(occupant.stable_id, occupant.offline_since)
+        if state.alert_active and not alert_active:
+            alert_active, alarm_zones = True, state.alarm_zones
+        # Recent broadcasts seed the replay rings, so phones reconnecting after a restart still get the alarm
+        for record in state.broadcasts:
+            self.sessions.stamp(record['m'])
+        self.journal.start()
+        log.info("✓ Journal replayed: %d occupant(s), alarm %s (%d records in %s ms)",
+                 len(state.occupants), 'ACTIVE' if state.alert_active else 'clear',
+                 self.journal.replayed, self.journal.replay_ms)
+
+    def record(self, kind, **data):
+        """Append an event to the journal, if this worker keeps one"""
+        if self.journal is not None:
+            self.journal.append(kind, **data)
+
+    def _journal_occupant(self, event, occupant):
+        self.record(KIND_OCCUPANT, e=event, o=occupant.to_record())
+
+    async def start_backplane(self, app):
+        """Connect to the other workers before accepting sockets"""
+        await self.backplane.start()
+        self.announce_state()
+
+    def announce_state(self):
+        """Publish everything a peer needs to know about this worker"""
+        self.backplane.publish(TOPIC_PRESENCE, {'connections': self.occupants.connection_count})
+        if alert_active:
+            self.backplane.publish(TOPIC_ALARM, {'alert_active': True, 'zones': alarm_zones})
+        # The journal owner also knows everyone restored from disk
+        for occupant in (self.occupants if self.journal is not None else self.occupants.local()):
+            self.backplane.publish(TOPIC_OCCUPANT, {'event': EVENT_REGISTER, 'occupant': occupant.to_record()})
+
+    def set_alert_active(self, active, zones=None):
+        """Change alarm state (and the zones it covers) here and on every other worker"""
+        global alert_active, alarm_zones
+        alert_active = active
+        alarm_zones = zones if active else None
+        if not active:
+            self.cancel_escalations()
+        self.admin_stream.mark_dirty()
+        self.backplane.publish(TOPIC_ALARM, {'alert_active': active, 'zones': alarm_zones})
+        self.record(KIND_ALARM, active=active, zones=alarm_zones)
+
+    def uncovered(self, zones):
+        """The part of `zones` (None: the whole site) the active alarm does not reach yet"""
+        if not alert_active:
+            return zones
+        if alarm_zones is None:
+            return []
+        if zones is None:
+            return None
+        return [zone for zone in zones if not any(covers(paged, zone) for paged in alarm_zones)]
+
+    def widen_alarm(self, zones):
+        """Extend the alarm to `zones`; returns the newly covered zones ([] if nothing is new, None for site-wide)"""
+        new = self.uncovered(zones)
+        if new == []:
+            return new
+        if new is None or not alert_active:
+            self.set_alert_active(True, new)
+        else:
+            self.set_alert_active(True, sorted(set(alarm_zones) | set(new)))
+        return new
+
+    def total_connections(self):
+        return self.occupants.connection_count + sum(self.peer_connections.values())
+
+    def announce_presence(self):
+        """Tell admins (here and on other workers) the connection count changed"""
+        self.admin_stream.mark_dirty()
+        self.backplane.publish(TOPIC_PRESENCE, {'connections': self.occupants.connection_count})
+
+    def prune_token(self, token):
+        """Forget an FCM token Firebase reported as unregistered, on every worker"""
+        self.occupants.remove_token(token)
+        self.backplane.publish(TOPIC_TOKEN, {'token': token})
+        self.record(KIND_TOKEN, token=token)
+
+    def _replicate_occupant(self, event, occupant):
+        # Changes mirrored from the backplane must not be echoed back
+        if self.occupants.applying_remote:
+            return
+        self.backplane.publish(TOPIC_OCCUPANT, {'event': event, 'occupant': occupant.to_record()})
+
+    def on_backplane_message(self, topic, message, worker_id):
+        """Apply a change published by another worker"""
+        global alert_active, alarm_zones
+        if topic == TOPIC_CLIENTS:
+            self.deliver(topic, message)
+            self.record(KIND_BROADCAST, m=message)
+        elif topic == TOPIC_ADMINS:
+            self.deliver(topic, message)
+        elif topic == TOPIC_ALARM:
+            alert_active = message['alert_active']
+            alarm_zones = message.get('zones') if alert_active else None
+            self.record(KIND_ALARM, active=alert_active, zones=alarm_zones)
+            if not alert_active:
+                self.alarms.cancel()  # Cleared elsewhere: stop our own in-flight fire pushes
+                self.cancel_escalations()
+            self.admin_stream.mark_dirty()
+        elif topic == TOPIC_OCCUPANT:
+            self.occupants.apply_remote(message['event'], message['occupant'])
+        elif topic == TOPIC_TOKEN:
+            self.occupants.remove_token(message['token'])
+            self.record(KIND_TOKEN, token=message['token'])
+        elif topic == TOPIC_PRESENCE:
+            self.peer_connections[worker_id] = message['connections']
+            self.admin_stream.mark_dirty()
+        elif topic == TOPIC_HELLO:
+            # A worker (re)joined: forget what its previous incarnation reported, re-announce ours
+            self.peer_connections[worker_id] = 0
+            self.admin_stream.mark_dirty()
+            self.announce_state()
+
+    def spawn(self, coro):
+        """Run a coroutine in the background, keeping a reference until it finishes"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def get_fcm_stats(self, request):
+        """Push dispatch counters and batch latency (/api/stats/fcm)"""
+        return web.json_response(self.fcm.stats())
+
+    async def get_journal_stats(self, request):
+        """Event journal health: group-commit batches, fsync latency, replay time (/api/stats/journal)"""
+        if self.journal is None:
+            return web.json_response({'enabled': False})
+        return web.json_response(self.journal.stats())
+
+    async def get_telemetry_stats(self, request):
+        """Sensor history store: rows held, memory, segment writes, queries (/api/stats/telemetry)"""
+        if self.telemetry is None:
+            return web.json_response({'enabled': False})
+        return web.json_response(self.telemetry.stats())
+
+    async def get_static_stats(self, request):
+        """In-memory static assets: sizes per encoding, responses, 304s (/api/stats/static)"""
+        if self.static_assets is None:
+            return web.json_response({'enabled': False})
+        return web.json_response(self.static_assets.stats())
+
+    async def get_liveness_stats(self, request):
+        """Heartbeat and offline grace-period counters (/api/stats/liveness)"""
+        return web.json_response({
+            'heartbeats': self.heartbeats.stats(),
+            'offline': self.offline_reaper.stats()
+        })
+
+    async def get_session_stats(self, request):
+        """Client resume counters and replay ring occupancy (/api/stats/sessions)"""
+        return web.json_response(self.sessions.stats())
+
+    async def get_ingress_stats(self, request):
+        """Rate limiter, admission, coalescing and load-shedding counters (/api/stats/ingress)"""
+        return web.json_response({
+            'limits': self.limits.to_dict(),
+            'connections': self.admission.stats(),
+            'limiters': {limiter.name: limiter.stats() for limiter in
+                         (self.connect_limiter, self.api_limiter, self.admin_limiter, self.alarm_limiter)},
+            'status_updates': self.status_updates.stats(),
+            'load_shedding': self.shedder.stats(),
+            'flood_closes': self.flood_closes
+        })
+
+    async def get_auth_stats(self, request):
+        """Login and token verification counters (/api/stats/auth)"""
+        return web.json_response({**self.credentials.stats(), 'tokens': self.tokens.stats()})
+
+    async def get_udp_stats(self, request):
+        """UDP ingestion counters (/api/stats/udp)"""
+        if self.udp_ingest is None:
+            return web.json_response({'running': False})
+        return web.json_response(self.udp_ingest.stats())
     
-    def run(self):
+    # ==========================================================
+    # 5. INSTRUMENTATION
+    # ==========================================================
+
+    def register_metrics(self):
+        """Describe what /metrics exposes; values are read only when scraped"""
+        m = self.metrics
+        engines = (self.client_fanout, self.admin_fanout)
+        udp = lambda attr: getattr(self.udp_ingest, attr) if self.udp_ingest is not None else 0
+        journal = lambda attr: getattr(self.journal, attr) if self.journal is not None else 0
+
+        m.gauge('alert_active', 'Whether an alarm is active', lambda: alert_active)
+        m.gauge('sockets', 'WebSocket connections on this worker',
+                lambda: [({'kind': engine.name}, len(engine)) for engine in engines])
+        m.gauge('binary_sockets', 'WebSocket connections that negotiated compact MessagePack frames',
+                lambda: [({'kind': engine.name}, sum(1 for c in engine.channels.values() if c.binary))
+                         for engine in engines])
+        m.gauge('cluster_client_sockets', 'Client sockets across all workers', self.total_connections)
+        m.gauge('occupants', 'Registered self.occupants, online or not', lambda: len(self.occupants))
+
+        m.counter('broadcasts', 'Broadcasts queued', lambda: [({'kind': e.name}, e.broadcasts) for e in engines])
+        m.counter('broadcasts_targeted', 'Broadcasts sent only to the sockets in their zones',
+                  lambda: [({'kind': e.name}, e.targeted) for e in engines])
+        m.gauge('alarm_zones', 'Zones the active alarm covers (0 when site-wide or inactive)',
+                lambda: len(alarm_zones or ()))
+        m.counter('fanout_evicted', 'Sockets dropped as slow consumers',
+                  lambda: [({'kind': e.name}, e.evicted) for e in engines])
+        m.gauge('fanout_queued_frames', 'Frames waiting in per-socket queues',
+                lambda: [({'kind': e.name}, e.queued()) for e in engines])
+        m.histogram('broadcast_fanout_seconds', 'Broadcast enqueue to last socket written',
+                    [({'kind': e.name}, e.fanout_histogram) for e in engines])
+
+        m.counter('udp_packets', 'Sensor datagrams handled', lambda: udp('packets'))
+        m.counter('udp_dropped', 'Sensor datagrams dropped at the backlog limit', lambda: udp('dropped'))
+        m.counter('udp_binary_packets', 'Sensor datagrams in the compact binary layout', lambda: udp('binary_packets'))
+        m.counter('udp_parse_errors', 'Sensor datagrams that were neither JSON objects nor binary packets',
+                  lambda: udp('parse_errors'))
+        m.gauge('udp_packets_per_second', 'Sensor datagram rate over the last second', lambda: udp('packets_per_sec'))
+        m.gauge('udp_backlog', 'Parsed datagrams waiting for the loop', 
+                lambda: self.udp_ingest.stats()['backlog'] if self.udp_ingest is not None else 0)
+        m.histogram('udp_batch_seconds', 'Time to dispatch one batch of sensor datagrams',
+                    lambda: self.udp_ingest.batch_histogram if self.udp_ingest is not None else None)
+
+        m.counter('fcm_sent', 'Push messages accepted by FCM', lambda: self.fcm.sent)
+        m.counter('fcm_failed', 'Push messages that failed for good', lambda: self.fcm.failed)
+        m.counter('fcm_retries', 'FCM batches retried after a transient error', lambda: self.fcm.retries)
+        m.counter('fcm_skipped', 'Push messages not attempted because Firebase is unavailable',
+                  lambda: self.fcm.skipped)
+        m.gauge('fcm_available', 'Whether push delivery is possible (0: WebSocket-only alarms)',
+                lambda: int(self.fcm.available))
+        m.counter('fcm_pruned_tokens', 'Tokens forgotten as unregistered', lambda: self.fcm.pruned)
+        m.gauge('fcm_queued_batches', 'FCM batches waiting for a pool thread', self.fcm.queued)
+        m.histogram('fcm_batch_seconds', 'One FCM multicast call', self.fcm.batch_histogram)
+        m.histogram('fcm_dispatch_seconds', 'Push to every token, retries included', self.fcm.dispatch_histogram)
+
+        m.counter('alarms', 'Alarms dispatched', lambda: self.alarms.dispatched)
+        m.counter('alarm_channel_timeouts', 'Alarm channels that missed their deadline', lambda: self.alarms.timeouts)
+        m.histogram('alarm_delivery_seconds', 'Alarm origin (sensor packet or admin request) to channel delivered',
+                    lambda: [({'channel': name}, h) for name, h in self.alarms.delivery_histograms.items()])
+
+        m.counter('journal_records', 'Journal records made durable', lambda: journal('written'))
+        m.counter('journal_lost', 'Journal records lost to write errors', lambda: journal('lost'))
+        m.gauge('journal_pending', 'Journal records queued for the writer',
+                lambda: self.journal.stats()['pending'] if self.journal is not None else 0)
+        m.histogram('journal_commit_seconds', 'One group commit (write + fsync)',
+                    lambda: self.journal.commit_histogram if self.journal is not None else None)
+        m.counter('static_responses', 'Static assets served from memory, by content encoding',
+                  lambda: [({'encoding': encoding}, count) for encoding, count in self.static_assets.served.items()]
+                  if self.static_assets is not None else [])
+        m.counter('static_not_modified', 'Static asset requests answered 304 Not Modified',
+                  lambda: self.static_assets.revalidated if self.static_assets is not None else 0)
+        m.counter('telemetry_readings', 'Sensor readings recorded in the history store',
+                  lambda: self.telemetry.readings if self.telemetry is not None else 0)
+        m.gauge('telemetry_memory_bytes', 'Bytes of sensor history held in memory',
+                lambda: self.telemetry.stats()['memory_bytes'] if self.telemetry is not None else 0)
+        m.counter('telemetry_segment_writes', 'Sensor history segments written to disk',
+                  lambda: self.telemetry.segments_written if self.telemetry is not None else 0)
+        m.histogram('telemetry_query_seconds', 'One sensor history query',
+                    lambda: self.telemetry.query_histogram if self.telemetry is not None else None)
+
+        m.counter('heartbeat_pings', 'Pings sent to silent sockets', lambda: self.heartbeats.pings)
+        m.counter('heartbeat_reaped', 'Sockets dropped for missing a heartbeat', lambda: self.heartbeats.reaped)
+        m.gauge('offline_grace_pending', 'Offline self.occupants waiting out their grace period',
+                lambda: len(self.offline_reaper))
+
+        m.counter('session_resumes', 'Reconnected clients replayed only what they missed',
+                  lambda: self.sessions.resumed)
+        m.counter('session_snapshots', 'Reconnected clients whose position was unknown here',
+                  lambda: self.sessions.snapshots)
+        m.counter('session_replayed_frames', 'Frames replayed to resuming clients', lambda: self.sessions.replayed)
+
+        m.counter('ingress_limited', 'Requests and upgrades refused by a per-IP rate limit',
+                  lambda: sum(limiter.limited for limiter in
+                              (self.connect_limiter, self.api_limiter, self.admin_limiter, self.alarm_limiter)))
+        m.counter('sockets_refused', 'WebSocket upgrades refused by the connection caps',
+                  lambda: self.admission.rejected)
+        m.counter('sockets_flood_closed', 'Sockets closed for exceeding their message rate',
+                  lambda: self.flood_closes)
+        m.counter('status_updates_coalesced', 'Status updates superseded before they were applied',
+                  lambda: self.status_updates.coalesced)
+        m.counter('load_shed', 'Requests refused while overloaded', lambda: self.shedder.shed)
+        m.gauge('load_shedding', 'Whether non-alarm work is being shed', lambda: int(self.shedder.shedding))
+
+        m.counter('admin_logins', 'Admin logins by outcome',
+                  lambda: [({'outcome': 'ok'}, self.credentials.logins),
+                           ({'outcome': 'failed'}, self.credentials.failures)])
+        m.counter('admin_tokens_rejected', 'Admin requests with a missing, forged or expired token',
+                  lambda: self.tokens.rejected)
+
+        m.counter('backplane_published', 'Frames sent to other workers', lambda: self.backplane.published)
+        m.counter('backplane_dropped', 'Frames dropped while the hub was unreachable', lambda: self.backplane.dropped)
+
+        m.histogram('event_loop_lag_seconds', 'How late the event loop woke a periodic probe',
+                    self.lag_monitor.histogram)
+        m.gauge('event_loop_lag_max_seconds', 'Worst event-loop lag since start', lambda: self.lag_monitor.max)
+
+    async def start_instrumentation(self, app):
+        """Start the event-loop lag probe and the overload check that reads it"""
+        self.lag_monitor.start()
+        self.shedder.start()
+
+    async def get_metrics(self, request):
+        """Prometheus text exposition (/metrics)"""
+        return web.Response(text=self.metrics.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Fire-Worker': str(self.worker_id)})
+
+    async def control_profiler(self, request):
+        """Start or stop sampling the event loop: {"action": "start"|"stop", "interval_ms", "seconds"} (/api/admin/profiler)"""
+        try:
+            data = await request.json()
+        except ValueError:
+            data = {}
+        action = data.get('action') if isinstance(data, dict) else None
+        if action == 'start':
+            try:
+                interval = float(data.get('interval_ms', DEFAULT_INTERVAL * 1000)) / 1000
+                seconds = float(data['seconds']) if data.get('seconds') is not None else None
+            except (TypeError, ValueError):
+                return web.json_response({'error': 'interval_ms and seconds must be numbers'}, status=400)
+            if not math.isfinite(interval) or (seconds is not None and not math.isfinite(seconds)):
+                return web.json_response({'error': 'interval_ms and seconds must be finite'}, status=400)
+            started = self.profiler.start(interval, seconds, thread_id=threading.get_ident())
+            if started:
+                log.info("🔬 Profiler started (every %.1f ms)", interval * 1000)
+        elif action == 'stop':
+            if self.profiler.stop():
+                log.info("🔬 Profiler stopped")
+        else:
+            return web.json_response({'error': 'action must be "start" or "stop"'}, status=400)
+        return web.json_response(self.profiler.stats())
+
+    async def get_profile(self, request):
+        """Profile so far: top functions, or ?format=collapsed for flamegraph tools (/api/admin/profiler)"""
+        if request.query.get('format') == 'collapsed':
+            return web.Response(text=self.profiler.collapsed(), content_type='text/plain')
+        try:
+            limit = int(request.query.get('limit', 20))
+        except ValueError:
+            limit = 20
+        return web.json_response({**self.profiler.stats(), 'top': self.profiler.top_functions(limit)})
+
+    def run(self, reuse_port=False):
         """Start the server"""
-        print("=" * 60)
-        print("🔥 FIRE EMERGENCY COMMUNICATION SYSTEM 🔥")
-        print("=" * 60)
+        # Log lines are written by a background thread, never by the event loop
+        setup_logging()
+        log.info("🔥 FIRE EMERGENCY COMMUNICATION SYSTEM 🔥 (worker %s)", self.worker_id)
         
-        loop = asyncio.new_event_loop()
+        if self.performance and uvloop is not None:
+            loop = uvloop.new_event_loop()
+            log.info("⚡ Performance mode: uvloop %s", uvloop.__version__)
+        else:
+            if self.performance:
+                log.info("⚡ Performance mode: uvloop is not installed, using the asyncio event loop")
+            loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         self.main_loop = loop
         
-        print(f"✓ Event loop created: {self.main_loop}")
+        log.info("✓ HTTP Server starting on http://0.0.0.0:%s", self.http_port)
+        log.info("✓ Client Interface: http://localhost:%s/", self.http_port)
+        log.info("✓ Admin Interface: http://localhost:%s/admin", self.http_port)
+        log.info("✓ Mobile Interface: http://localhost:%s/mobile", self.http_port)
+        log.info("✓ Metrics: http://localhost:%s/metrics", self.http_port)
         
-        udp_thread = threading.Thread(target=self.start_udp_listener, daemon=True)
-        udp_thread.start()
-        
-        print(f"\n✓ HTTP Server starting on http://0.0.0.0:{self.http_port}")
-        print(f"✓ Client Interface: http://localhost:{self.http_port}/")
-        print(f"✓ Admin Interface: http://localhost:{self.http_port}/admin")
-        print(f"✓ Mobile Interface: http://localhost:{self.http_port}/mobile")
-        print("\nSystem ready! Waiting for connections...\n")
-        
-        web.run_app(self.app, host='0.0.0.0', port=self.http_port, loop=loop)
+        # reuse_port lets several worker processes accept on the same port
+        try:
+            web.run_app(self.app, host='0.0.0.0', port=self.http_port, loop=loop,
+                        reuse_port=reuse_port or None, print=log.info)
+        finally:
+            flush_logging()
 
 if __name__ == '__main__':
-    server = FireEmergencyServer(udp_port=5006, http_port=8080)
-    server.run()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description='Fire Emergency Communication System server')
+    parser.add_argument('--http-port', type=int, default=8080)
+    parser.add_argument('--udp-port', type=int, default=5006)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes sharing the HTTP port via SO_REUSEPORT (worker 0 owns the UDP port)')
+    parser.add_argument('--ping-interval', type=float, default=PING_INTERVAL,
+                        help='seconds of silence before a socket is pinged (0 disables heartbeats)')
+    parser.add_argument('--ping-timeout', type=float, default=PING_TIMEOUT,
+                        help='seconds a pinged socket has to answer before it is dropped')
+    parser.add_argument('--offline-grace', type=float, default=OFFLINE_GRACE,
+                        help='seconds a disconnected occupant is kept for a reconnect (0 keeps them forever)')
+    parser.add_argument('--zones', dest='zone_file',
+                        help='site layout JSON with zone neighbours and sensor locations (default: zones.json here)')
+    parser.add_argument('--escalate-after', type=float, default=ESCALATE_AFTER,
+                        help='seconds a sensor alarm stays in its zone before neighbouring zones are paged')
+    parser.add_argument('--max-connections', type=int, default=IngressLimits().max_connections,
+                        help='WebSocket connections per worker (0 for no cap)')
+    parser.add_argument('--max-per-ip', type=int, default=IngressLimits().max_per_ip,
+                        help='WebSocket connections per remote address (0 for no cap; raise behind NAT)')
+    parser.add_argument('--status-rate', type=float, default=IngressLimits().status_rate,
+                        help='status updates applied per client per second; faster ones are coalesced')
+    parser.add_argument('--admins', dest='admin_file',
+                        help='JSON {username: hash} of admin accounts (default: admins.json here; see auth.py)')
+    parser.add_argument('--auth-secret', default=os.environ.get('FIRE_AUTH_SECRET'),
+                        help='key signing admin tokens (default: $FIRE_AUTH_SECRET, else random per start)')
+    parser.add_argument('--token-ttl', type=float, default=TOKEN_TTL, help='seconds an admin login lasts')
+    parser.add_argument('--telemetry-dir',
+                        help='where sensor history segments are kept (default: telemetry/ here)')
+    parser.add_argument('--no-static-cache', dest='static_cache', action='store_false',
+                        help='serve static files from disk on every request (while editing them)')
+    parser.add_argument('--no-sw-precache', dest='sw_precache', action='store_false',
+                        help='do not have the service worker download the occupant pages when it installs')
+    parser.add_argument('--firebase-credentials', default=CREDENTIALS_FILE,
+                        help='Firebase service account key; without it alarms are WebSocket-only')
+    parser.add_argument('--performance', action='store_true',
+                        help='run on uvloop when it is installed (pip install uvloop)')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG logs every socket and status update')
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text')
+    args = parser.parse_args()
+    setup_logging(args.log_level.upper(), args.log_format)
+    if not args.auth_secret:
+        log.info("🔑 No --auth-secret given: admin logins last until the server restarts")
+    options = dict(ping_interval=args.ping_interval, ping_timeout=args.ping_timeout,
+                    offline_grace=args.offline_grace, zone_file=args.zone_file, escalate_after=args.escalate_after,
+                    limits=IngressLimits(max_connections=args.max_connections, max_per_ip=args.max_per_ip,
+                                         status_rate=args.status_rate),
+                    admin_file=args.admin_file, token_ttl=args.token_ttl, telemetry_dir=args.telemetry_dir,
+                    static_cache=args.static_cache, sw_precache=args.sw_precache,
+                    firebase_credentials=args.firebase_credentials, performance=args.performance,
+                    # Generated here, not per worker, so every worker accepts every token
+                    auth_secret=args.auth_secret or os.urandom(32).hex())
+
+    if args.workers > 1:
+        from workers import WorkerPool
+
+        def make_server(worker_id, backplane):
+            return FireEmergencyServer(udp_port=args.udp_port, http_port=args.http_port,
+                                       worker_id=worker_id, backplane=backplane, ingest_udp=worker_id == 0,
+                                       journal=worker_id == 0, **options)
+
+        WorkerPool(make_server, args.workers).run()
+    else:
+        server = FireEmergencyServer(udp_port=args.udp_port, http_port=args.http_port, **options)
+        server.run()
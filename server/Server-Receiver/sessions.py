@@ -0,0 +1,207 @@
+import os
+import time
+from collections import deque
+
+from payloads import PreparedMessage
+from zones import UNPLACED_TYPES, reaches
+
+# Client frames worth replaying, by topic
+TOPIC_ALERTS = 'alerts'      # fire_alert / clear_alert: only the latest one still matters
+TOPIC_NOTICES = 'notices'    # Admin broadcasts and messages: each one is news
+FRAME_TOPICS = {
+    'fire_alert': TOPIC_ALERTS,
+    'clear_alert': TOPIC_ALERTS,
+    'broadcast': TOPIC_NOTICES,
+    'admin_message': TOPIC_NOTICES
+}
+DEFAULT_SIZES = {TOPIC_ALERTS: 16, TOPIC_NOTICES: 64}
+COLLAPSED_TOPICS = (TOPIC_ALERTS,)
+
+
+class _Ring:
+    """Last `size` frames of one topic as (seq, stamped_at, PreparedMessage, target zones or None)."""
+
+    __slots__ = ('frames', 'evicted_through')
+
+    def __init__(self, size):
+        self.frames = deque(maxlen=size)
+        self.evicted_through = 0    # Highest seq that fell off the ring
+
+    def append(self, entry):
+        if len(self.frames) == self.frames.maxlen:
+            self.evicted_through = self.frames[0][0]
+        self.frames.append(entry)
+
+    def after(self, seq):
+        return [entry for entry in self.frames if entry[0] > seq]
+
+    def latest(self, area=None):
+        for entry in reversed(self.frames):
+            if _visible(entry, area):
+                return entry
+        return None
+
+
+def _visible(entry, area):
+    return reaches(entry[3], area, entry[2].type in UNPLACED_TYPES)
+
+
+class ClientSessions:
+    """Sequenced replay of client broadcasts, so a reconnecting phone gets only what it missed.
+
+    Every replayable frame is stamped with a sequence number and kept, already
+    serialized, in a small ring per topic. A client that reconnects with
+    `?stream=&since=` is replayed (since, now] on its own socket: every notice
+    it missed, but only the newest alert, since a clear supersedes the fire
+    before it. Nothing is re-broadcast, so a wave of reconnects costs one
+    queued frame per missed notice per socket and no re-serialization.
+
+    Clients that cannot report a position are resumed by stable ID instead:
+    when a registered socket closes, the last frame written to it before it
+    was last heard from is parked, and the next `register_name` for that
+    person replays from there. A stream ID that is not ours (restart, other
+    worker) or a position that fell off the rings gets a bounded snapshot.
+    Frames sent to particular zones are only replayed to people in them.
+    """
+
+    def __init__(self, sizes=None):
+        self.stream_id = os.urandom(4).hex()   # Changes on restart, so old positions are never trusted
+        self.seq = 0
+        self.rings = {topic: _Ring(size) for topic, size in (sizes or DEFAULT_SIZES).items()}
+        self._sockets = {}     # socket_id -> [seq at connect, seqs already sent, resumed exactly]
+        self._parked = {}      # stable_id -> seq the person had seen when their socket went quiet
+
+        # Counters
+        self.resumed = 0
+        self.snapshots = 0
+        self.gaps = 0
+        self.replayed = 0
+
+    def stamp(self, message):
+        """Sequence a frame about to go to every client; returns what to broadcast."""
+        topic = FRAME_TOPICS.get(message.get('type'))
+        if topic is None:
+            return message
+        self.seq += 1
+        prepared = PreparedMessage({**message, 'seq': self.seq})
+        self.rings[topic].append((self.seq, time.monotonic(), prepared, message.get('zones')))
+        return prepared
+
+    def seq_at(self, moment):
+        """Highest seq stamped at or before `moment` (a time.monotonic() value)."""
+        seq = 0
+        for ring in self.rings.values():
+            for entry_seq, stamped_at, _, _ in ring.frames:
+                if stamped_at > moment:
+                    break
+                seq = max(seq, entry_seq)
+        return seq
+
+    def _missed(self, since, area=None, exclude=()):
+        """Frames after `since` meant for `area`, oldest first, and whether any of them are gone."""
+        entries = []
+        gap = False
+        for topic, ring in self.rings.items():
+            missed = [entry for entry in ring.after(since) if _visible(entry, area)]
+            if topic in COLLAPSED_TOPICS:
+                missed = missed[-1:]
+            elif since < ring.evicted_through:
+                gap = True
+            entries.extend(entry for entry in missed if entry[0] not in exclude)
+        entries.sort(key=lambda entry: entry[0])
+        return entries, gap
+
+    def _snapshot(self, known, area=None):
+        """Current alert (a clear only for clients that were here before) and, if known, the last notice."""
+        entries = []
+        alert = self.rings[TOPIC_ALERTS].latest(area)
+        if alert is not None and (known or alert[2].type == 'fire_alert'):
+            entries.append(alert)
+        notice = self.rings[TOPIC_NOTICES].latest(area)
+        if known and notice is not None:
+            entries.append(notice)
+        entries.sort(key=lambda entry: entry[0])
+        return entries
+
+    def open(self, socket_id, stream_id=None, since=None):
+        """Frames to send a newly connected client after its `connected` frame.
+
+        Nobody has said where they are yet, so only site-wide frames and
+        alarms (which reach unplaced sockets) are replayed here.
+        """
+        state = [self.seq, set(), False]
+        self._sockets[socket_id] = state
+        if stream_id == self.stream_id and since is not None and 0 <= since <= self.seq:
+            entries, gap = self._missed(since)
+            frames = [entry[2] for entry in entries]
+            state[2] = True
+            self.resumed += 1
+            self.gaps += gap
+            self.replayed += len(frames)
+            return frames + [self._resumed_frame(len(frames), gap)]
+
+        entries = self._snapshot(known=stream_id is not None)
+        state[1].update(entry[0] for entry in entries)
+        frames = [entry[2] for entry in entries]
+        if stream_id is not None:
+            # A position from another stream means nothing here: say so, so the client resets
+            state[2] = True
+            self.snapshots += 1
+            return frames + [self._resumed_frame(len(frames), True)]
+        return frames
+
+    def bind(self, socket_id, stable_id, area=None):
+        """A socket registered as `stable_id` (at `area`): replay what they missed if they did not resume themselves."""
+        state = self._sockets.get(socket_id)
+        parked = self._parked.pop(stable_id, None)
+        if state is None or state[2] or parked is None:
+            return []
+        state[2] = True
+        connected_at, sent, _ = state
+        entries, gap = self._missed(parked, area, exclude=sent)
+        # Live broadcasts since the connect already went to this socket
+        frames = [entry[2] for entry in entries if entry[0] <= connected_at]
+        self.resumed += 1
+        self.gaps += gap
+        self.replayed += len(frames)
+        return frames
+
+    def close(self, socket_id, stable_id=None, written=None, last_seen=None):
+        """Forget the socket; remember where its owner got to for their next connect.
+
+        `written` is the last seq the socket's writer sent; anything stamped
+        after `last_seen` (the last sign of life) may be sitting in a dead
+        connection, so the position is whichever of the two is earlier.
+        """
+        if self._sockets.pop(socket_id, None) is None or stable_id is None:
+            return
+        seq = self.seq if written is None else written
+        if last_seen is not None:
+            seq = min(seq, self.seq_at(last_seen))
+        self._parked[stable_id] = seq
+
+    def forget(self, stable_id):
+        self._parked.pop(stable_id, None)
+
+    def _resumed_frame(self, replayed, gap):
+        return {
+            'type': 'resumed',
+            'stream': self.stream_id,
+            'seq': self.seq,
+            'replayed': replayed,
+            'gap': gap
+        }
+
+    def stats(self):
+        return {
+            'stream': self.stream_id,
+            'seq': self.seq,
+            'retained': {topic: len(ring.frames) for topic, ring in self.rings.items()},
+            'sockets': len(self._sockets),
+            'parked': len(self._parked),
+            'resumed': self.resumed,
+            'snapshots': self.snapshots,
+            'gaps': self.gaps,
+            'replayed': self.replayed
+        }
+
@@ -3,6 +3,9 @@
 let ws = null;
 let authToken = null;
 let selectedMapFile = null;
+// Position in the server's status stream, so a reconnect only replays what was missed
+let statusStream = null;
+let statusSeq = null;
 const SERVER_URL = `ws://${window.location.hostname}:8080`;
 const HTTP_API_URL = `http://${window.location.hostname}:8080/api/admin`;
 
@@ -43,21 +46,43 @@ function showDashboard() {
 
 function logout() {
     if (confirm('Are you sure you want to logout?')) {
-        if (ws) ws.close();
-        authToken = null;
-        logActivity('System', 'Admin logged out');
-        document.getElementById('loginContainer').style.display = 'flex';
-        document.getElementById('dashboard').classList.remove('active');
-        document.getElementById('loginForm').reset();
+        endSession('Admin logged out');
     }
 }
 
+function endSession(reason) {
+    authToken = null;
+    if (ws) ws.close();
+    logActivity('System', reason);
+    document.getElementById('loginContainer').style.display = 'flex';
+    document.getElementById('dashboard').classList.remove('active');
+    document.getElementById('loginForm').reset();
+}
+
+async function sessionValid() {
+    try {
+        const response = await fetch(`${HTTP_API_URL}/session`, { headers: authHeaders() });
+        return response.status !== 401;
+    } catch (error) {
+        return true; // Server unreachable: keep the session and retry
+    }
+}
+
+function authHeaders(headers = {}) {
+    return { ...headers, 'Authorization': `Bearer ${authToken}` };
+}
+
 // ===== WEBSOCKET CONNECTION =====
 function connectWebSocket() {
-    ws = new WebSocket(`${SERVER_URL}/ws/admin`);
+    const resume = statusStream ? `?stream=${statusStream}&since=${statusSeq}` : '';
+    // Browsers cannot set headers on a WebSocket: the token rides along as an extra subprotocol
+    // (the server picks fire.json.v1), which keeps it out of URLs and access logs
+    ws = new WebSocket(`${SERVER_URL}/ws/admin${resume}`, ['fire.json.v1', `fire.token.${authToken}`]);
     const statusDot = document.querySelector('.status-dot');
+    let opened = false;
 
     ws.onopen = () => {
+        opened = true;
         document.getElementById('connectionStatus').textContent = 'Connected to System';
         statusDot.style.background = '#10b981'; // Green
         logActivity('System', 'WebSocket connection established');
@@ -68,7 +93,13 @@ function connectWebSocket() {
         handleMessage(data);
     };
 
-    ws.onclose = () => {
+    ws.onclose = async () => {
+        if (!authToken) return; // Logged out
+        // A refused handshake looks like any other failure: ask whether the token is still good
+        if (!opened && !(await sessionValid())) {
+            endSession('Session expired. Please log in again.');
+            return;
+        }
         document.getElementById('connectionStatus').textContent = 'Disconnected - Reconnecting...';
         statusDot.style.background = '#f59e0b'; // Orange
         logActivity('System', 'Connection lost. Attempting to reconnect...', true);
@@ -86,10 +117,30 @@ function connectWebSocket() {
 function handleMessage(data) {
     switch(data.type) {
         case 'status_update':
-            // Initial status update upon connection (includes alert_active state)
+            // Full snapshot upon connection (includes alert_active state)
+            statusStream = data.stream;
+            statusSeq = data.seq;
             updateSystemStatus(data);
             break;
 
+        case 'status_delta':
+            // Only what changed since the previous frame
+            if (data.stream !== statusStream || data.seq <= statusSeq) break;
+            if (data.prev !== statusSeq) {
+                // Missed a frame: reconnect and let the server replay or resend a snapshot
+                ws.close();
+                break;
+            }
+            statusSeq = data.seq;
+            applyStatusDelta(data);
+            break;
+
+        case 'resumed':
+            // Replay finished; the scalar state is current again
+            statusSeq = data.seq;
+            updateCounters(data);
+            break;
+
         case 'user_status':
             // Real-time status update from a client (e.g., "TRAPPED")
             updateUserStatus(data.client_id, data.status);
@@ -102,15 +153,39 @@ function handleMessage(data) {
             // Log the alert data using sensor details if available
             const sensor_id = data.alert_data ? data.alert_data.sensor_id : 'Manual Trigger';
             const smoke_level = data.alert_data ? data.alert_data.smoke_level : 'N/A';
+            const where = data.zones ? ` in ${data.zones.join(', ')}` : '';
             
             logActivity('FIRE ALERT', 
-                         `Sensor ${sensor_id} detected fire (Level: ${smoke_level})`, 
+                         `Sensor ${sensor_id} detected fire${where} (Level: ${smoke_level})`, 
                          true);
             
             // Call the visual update function
             showFireAlert(); 
             break;
             
+        case 'sensor_update':
+            // One frame per real sensor transition (new room alerting, severity change, cleared)
+            logActivity('Sensor',
+                        `${data.sensor_id}${data.zone ? ' [' + data.zone + ']' : ''}: ${data.state.toUpperCase()} (Level: ${data.level}, Peak: ${data.peak}, ${data.trend})`,
+                        data.state === 'alerting');
+            break;
+
+        case 'alarm_escalated':
+            // A sensor alarm stayed active and spread to the neighbouring zones
+            logActivity('ESCALATION', `Alarm in ${data.from} extended to ${data.zones.join(', ')}`, true);
+            break;
+
+        case 'sensor_snapshot':
+            data.sensors.filter((sensor) => sensor.state === 'alerting').forEach((sensor) => {
+                logActivity('Sensor', `${sensor.sensor_id}: ALERTING (Level: ${sensor.level}, Peak: ${sensor.peak})`, true);
+            });
+            break;
+
+        case 'error':
+            // A command the server refused (e.g. malformed zones); nothing was sent
+            logActivity('System', `${data.request} rejected: ${data.error}`, true);
+            break;
+
         case 'new_user_message':
             // Message from physical Quick Response Terminal (via UDP -> Server -> WS)
             logActivity('Quick Panel', `${data.data.sensor_id}: ${data.data.message}`, true);
@@ -120,6 +195,48 @@ function handleMessage(data) {
 
 // ===== SYSTEM STATUS UPDATES =====
 function updateSystemStatus(data) {
+    updateCounters(data);
+    
+    // Update User Status List
+    document.getElementById('userStatusList').innerHTML = ''; // Clear list
+    if (data.user_status && Object.keys(data.user_status).length > 0) {
+        Object.entries(data.user_status).forEach(([clientId, statusData]) => {
+            updateUserStatus(clientId, statusData.status, statusData.online);
+        });
+    } else {
+        showEmptyUserList();
+    }
+}
+
+function applyStatusDelta(data) {
+    updateCounters(data);
+
+    data.removes.forEach((clientId) => {
+        const userItem = document.getElementById(`user-${clientId}`);
+        if (userItem) userItem.remove();
+    });
+
+    Object.entries(data.upserts).forEach(([clientId, statusData]) => {
+        const emptyMessage = document.querySelector('#userStatusList p');
+        if (emptyMessage) emptyMessage.remove();
+        updateUserStatus(clientId, statusData.status, statusData.online);
+        if (statusData.online === false) {
+            logActivity('User Status', `${statusData.name || clientId} went offline (last status: ${statusData.status})`);
+        } else {
+            logActivity('User Status', `${statusData.name || clientId} reported: ${statusData.status}`);
+        }
+    });
+
+    if (!document.getElementById('userStatusList').children.length) {
+        showEmptyUserList();
+    }
+}
+
+function showEmptyUserList() {
+    document.getElementById('userStatusList').innerHTML = '<p style="color: #9ca3af; text-align: center; padding: 20px;">No status reports yet. Waiting for user updates...</p>';
+}
+
+function updateCounters(data) {
     document.getElementById('clientCount').textContent = data.connected_clients || 0;
     
     // Check global alert state from the server
@@ -133,16 +250,6 @@ function updateSystemStatus(data) {
         alertStatusBox.classList.remove('alert');
         document.querySelector('.status-dot').classList.remove('active');
     }
-    
-    // Update User Status List
-    document.getElementById('userStatusList').innerHTML = ''; // Clear list
-    if (data.user_status && Object.keys(data.user_status).length > 0) {
-        Object.entries(data.user_status).forEach(([clientId, statusData]) => {
-            updateUserStatus(clientId, statusData.status);
-        });
-    } else {
-        document.getElementById('userStatusList').innerHTML = '<p style="color: #9ca3af; text-align: center; padding: 20px;">No status reports yet. Waiting for user updates...</p>';
-    }
 }
 
 function showFireAlert() {
@@ -160,7 +267,7 @@ function showFireAlert() {
     document.getElementById('activityLog').scrollTop = 0;
 }
 
-function updateUserStatus(clientId, status) {
+function updateUserStatus(clientId, status, online) {
     const listElement = document.getElementById('userStatusList');
     
     let userItem = document.getElementById(`user-${clientId}`);
@@ -182,17 +289,29 @@ function updateUserStatus(clientId, status) {
 
     userItem.className = `user-status-item ${status.toLowerCase().replace('_', '-')}`;
     
+    // Disconnected people keep their last status; dim them instead of dropping them
+    userItem.style.opacity = online === false ? '0.6' : '';
+    
     userItem.innerHTML = `
-        <span class="user-id">${clientId.replace('client_', 'Client-')}</span>
+        <span class="user-id">${clientId.replace('client_', 'Client-')}${online === false ? ' (offline)' : ''}</span>
         <span class="user-status" style="color: ${config.color}">${config.emoji} ${config.text}</span>
     `;
 }
 
 // ===== EMERGENCY CONTROLS =====
+// Building/floor/zone paths typed in the broadcast panel; undefined means everyone
+function targetZones() {
+    const zones = document.getElementById('broadcastZones').value
+        .split(',').map(zone => zone.trim()).filter(zone => zone);
+    return zones.length ? zones : undefined;
+}
+
 function triggerAlarm() {
-    if (confirm('⚠️ Are you sure you want to trigger the fire alarm manually?\n\nThis will alert all connected users immediately.')) {
+    const zones = targetZones();
+    const audience = zones ? `everyone in ${zones.join(', ')}` : 'all connected users';
+    if (confirm(`⚠️ Are you sure you want to trigger the fire alarm manually?\n\nThis will alert ${audience} immediately.`)) {
         if (ws && ws.readyState === WebSocket.OPEN) {
-            ws.send(JSON.stringify({ type: 'trigger_alarm' }));
+            ws.send(JSON.stringify({ type: 'trigger_alarm', zones: zones }));
             showFireAlert(); // Update UI immediately
             logActivity('Admin Action', 'Manual fire alarm triggered', true);
             alert('✅ Fire alarm has been triggered successfully!');
@@ -243,7 +362,8 @@ function broadcastMessage() {
         // Check if there is a map file selected to include in the broadcast
         let payload = {
             type: 'broadcast',
-            message: message
+            message: message,
+            zones: targetZones()
         };
         
         if (selectedMapFile) {
@@ -278,37 +398,50 @@ function previewMap(event) {
     logActivity('Map Upload', `Evacuation map loaded: ${file.name}`);
 }
 
-function sendEvacuationMap(textMessage) {
+async function sendEvacuationMap(textMessage) {
     if (!selectedMapFile) {
         alert('❌ Please select an evacuation map first.');
         return;
     }
 
-    const reader = new FileReader();
-    reader.onload = function(e) {
-        const mapData = e.target.result;
-        
-        if (ws && ws.readyState === WebSocket.OPEN) {
-            ws.send(JSON.stringify({
-                type: 'broadcast', 
-                message: textMessage || '🗺️ EVACUATION MAP SENT - Please check your screen for the latest floor plan.',
-                map_data: mapData, 
-                map_filename: selectedMapFile.name
-            }));
-            
-            logActivity('Admin Action', `Evacuation map sent (${selectedMapFile.name})`);
-            alert('✅ Evacuation map sent to all connected users!');
-            
-            // Clear map selection after sending
-            document.getElementById('mapInput').value = '';
-            document.getElementById('sendMapBtn').disabled = true;
-            document.getElementById('mapPreview').classList.remove('active');
-            selectedMapFile = null;
-        } else {
-            alert('❌ Not connected to server.');
-        }
-    };
-    reader.readAsDataURL(selectedMapFile);
+    if (!ws || ws.readyState !== WebSocket.OPEN) {
+        alert('❌ Not connected to server.');
+        return;
+    }
+
+    // Upload the raw image once; the broadcast only carries its content hash
+    let mapHash;
+    try {
+        const response = await fetch(`${HTTP_API_URL}/maps`, {
+            method: 'POST',
+            headers: authHeaders({ 'Content-Type': selectedMapFile.type || 'application/octet-stream' }),
+            body: selectedMapFile
+        });
+        const data = await response.json();
+        if (!data.success) throw new Error(data.error || 'upload rejected');
+        mapHash = data.map_hash;
+    } catch (error) {
+        console.error('Map upload error:', error);
+        alert('❌ Failed to upload the evacuation map.');
+        return;
+    }
+
+    ws.send(JSON.stringify({
+        type: 'broadcast', 
+        message: textMessage || '🗺️ EVACUATION MAP SENT - Please check your screen for the latest floor plan.',
+        map_hash: mapHash, 
+        map_filename: selectedMapFile.name,
+        zones: targetZones()
+    }));
+    
+    logActivity('Admin Action', `Evacuation map sent (${selectedMapFile.name})`);
+    alert('✅ Evacuation map sent to all connected users!');
+    
+    // Clear map selection after sending
+    document.getElementById('mapInput').value = '';
+    document.getElementById('sendMapBtn').disabled = true;
+    document.getElementById('mapPreview').classList.remove('active');
+    selectedMapFile = null;
 }
 
 
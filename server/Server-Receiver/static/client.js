@@ -2,11 +2,15 @@
 
 let ws = null;
 let clientId = null;
+// Position in the server's broadcast stream, so a reconnect only replays what was missed
+let sessionStream = null;
+let sessionSeq = null;
 const SERVER_URL = `ws://${window.location.host}`; 
 
 // Connect to WebSocket server
 function connect() {
-    ws = new WebSocket(`${SERVER_URL}/ws/client`);
+    const resume = sessionStream ? `?stream=${sessionStream}&since=${sessionSeq}` : '';
+    ws = new WebSocket(`${SERVER_URL}/ws/client${resume}`);
     
     ws.onopen = () => {
         console.log('Connected to server');
@@ -44,13 +48,26 @@ function updateStatus(connected) {
 
 function handleMessage(data) {
     console.log('Received:', data);
+    if (data.seq !== undefined && data.type !== 'connected' && data.type !== 'resumed') {
+        sessionSeq = Math.max(sessionSeq || 0, data.seq);
+    }
 
     switch(data.type) {
         case 'connected':
             clientId = data.client_id;
+            if (data.stream !== sessionStream) {
+                // New server stream: older positions mean nothing to it
+                sessionStream = data.stream;
+                sessionSeq = data.seq;
+            }
             addMessage('System', `Connected with ID: ${clientId}`, false);
             break;
 
+        case 'resumed':
+            // Replay finished; anything missed while offline has now been shown
+            sessionSeq = data.seq;
+            break;
+
         case 'fire_alert':
             showFireAlert(data.message);
             playAlarm();
@@ -73,8 +90,9 @@ function handleMessage(data) {
             
         case 'broadcast':
             // 🚨 NEW: Handle map data included in a general broadcast message
-            if (data.map_data) {
-                showEvacuationMap(data.map_data);
+            // Maps arrive as a content-hash URL; older servers inline the base64 data
+            if (data.map_url || data.map_data) {
+                showEvacuationMap(data.map_url || data.map_data, data.map_hash);
                 addMessage('Admin Map', `Evacuation Map Sent: ${data.map_filename || 'Floor Plan'}`, true);
             } else {
                  // Regular text broadcast
@@ -96,18 +114,24 @@ function hideFireAlert() {
 }
 
 // 🗺️ NEW: Function to display the map
-function showEvacuationMap(mapData) {
+let currentMapHash = null;
+
+function showEvacuationMap(mapSrc, mapHash) {
     const mapContainer = document.getElementById('evacuationMapContainer');
     const mapImage = document.getElementById('mapImage');
     
-    // Set the base64 string as the image source
-    mapImage.src = mapData; 
+    // Re-broadcasts of the same plan don't reload the image
+    if (!mapHash || mapHash !== currentMapHash) {
+        mapImage.src = mapSrc; 
+        currentMapHash = mapHash || null;
+    }
     mapContainer.classList.add('active');
 }
 
 function hideEvacuationMap() {
     document.getElementById('evacuationMapContainer').classList.remove('active');
     document.getElementById('mapImage').src = ''; // Clear image source
+    currentMapHash = null;
 }
 
 
@@ -0,0 +1,55 @@
+// sw.js - served at /sw.js by the server, which fills in the precache list
+
+// The version changes whenever anything precached does, which makes the browser install this worker again
+const PRECACHE = __PRECACHE_MANIFEST__;
+const CACHE_NAME = 'fire-static-__PRECACHE_VERSION__';
+const VERSIONED = /\/static\/.+\.[0-9a-f]{12}\.[^/.]+$/;
+
+// Fetch the occupant pages up front, so they still open when the network is struggling
+self.addEventListener('install', (event) => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then((cache) => cache.addAll(PRECACHE))
+            .then(() => self.skipWaiting())
+    );
+});
+
+// Drop caches from older deploys
+self.addEventListener('activate', (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then((names) => Promise.all(names.filter((name) => name !== CACHE_NAME).map((name) => caches.delete(name))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin || !url.pathname.startsWith('/static/')) return;  // API, sockets, maps
+
+    if (VERSIONED.test(url.pathname)) {
+        // Immutable: the cached copy is always right
+        event.respondWith(
+            caches.match(request).then((cached) => cached || fetch(request).then((response) => {
+                if (response.ok) {
+                    const copy = response.clone();
+                    caches.open(CACHE_NAME).then((cache) => cache.put(request, copy));
+                }
+                return response;
+            }))
+        );
+    } else {
+        // Pages: the network first (a cheap 304 when unchanged), the cached copy if it is down
+        event.respondWith(
+            fetch(request).then((response) => {
+                if (response.ok) {
+                    const copy = response.clone();
+                    caches.open(CACHE_NAME).then((cache) => cache.put(request, copy));
+                }
+                return response;
+            }).catch(() => caches.match(request))
+        );
+    }
+});
@@ -0,0 +1,244 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import time
+
+# Optional Brotli; without it compressible assets are served gzipped
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = 256      # Bytes; smaller assets are served as they are
+GZIP_LEVEL = 9               # Compressed once at startup, so the slowest, smallest settings are free
+BROTLI_QUALITY = 11
+VERSION_LENGTH = 12          # Hex digits of the content hash in versioned filenames
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'      # Plain names may change with a deploy: cache, but check the ETag first
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# Pages whose /static/ references are rewritten to versioned names
+REWRITE_TYPES = ('text/html', 'text/css')
+SERVICE_WORKER = 'sw.js'     # Template served at /sw.js with the precache list filled in
+PRECACHE_MARKER = '__PRECACHE_MANIFEST__'
+VERSION_MARKER = '__PRECACHE_VERSION__'
+# What the service worker fetches when it installs: the occupant pages, what they load, and the floor plans
+PRECACHE = ('client.html', 'mobile.html', 'images/')
+
+_REFERENCE = re.compile(r'''(["'(])/static/([^"'()?#\s]+)(["')])''')
+
+
+class Representation:
+    """One encoding of an asset, with the headers every response for it carries."""
+
+    __slots__ = ('body', 'headers')
+
+    def __init__(self, body, headers):
+        self.body = body
+        self.headers = headers
+
+
+class Asset:
+    """A static file held in memory: identity, gzip and (if available) Brotli bodies, and its ETag."""
+
+    __slots__ = ('name', 'content_type', 'digest', 'versioned', 'encodings', 'size')
+
+    def __init__(self, name, data, content_type, compress=True):
+        self.name = name
+        self.content_type = content_type
+        self.digest = hashlib.sha256(data).hexdigest()
+        stem, ext = os.path.splitext(name)
+        self.versioned = f'{stem}.{self.digest[:VERSION_LENGTH]}{ext}'
+        self.size = len(data)
+        self.encodings = {None: data}
+        if compress and len(data) >= COMPRESS_MIN_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            for encoding, packed in (('gzip', gzip.compress(data, GZIP_LEVEL, mtime=0)),
+                                     ('br', brotli.compress(data, quality=BROTLI_QUALITY) if brotli else None)):
+                if packed is not None and len(packed) < len(data):
+                    self.encodings[encoding] = packed
+
+    def etag(self, encoding):
+        # One ETag per encoding (a gzipped body is a different representation), all sharing the hash
+        return f'"{self.digest[:32]}-{encoding}"' if encoding else f'"{self.digest[:32]}"'
+
+    def representation(self, encoding, cache_control):
+        headers = {
+            'Content-Type': self.content_type,
+            'ETag': self.etag(encoding),
+            'Cache-Control': cache_control,
+            'Vary': 'Accept-Encoding'
+        }
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Representation(self.encodings[encoding], headers)
+
+
+def accepted_encodings(header):
+    """Codings the client accepts from an Accept-Encoding header (q=0 excluded)."""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class StaticAssets:
+    """The dashboard and client pages, loaded and compressed once, served from memory.
+
+    Every file under `root` is read at startup and hashed. Compressible
+    ones are also gzipped and, if Brotli is installed, brotli'd, at maximum
+    level since it happens only once. A request then costs a dictionary
+    lookup and a header check: no disk read, no compression.
+
+    Each asset answers at its plain name (Cache-Control: no-cache, so a
+    browser revalidates and gets a 304) and at a versioned name with the
+    content hash in it (cached for a year, immutable). References to
+    /static/... in HTML and CSS are rewritten to the versioned names, so
+    a reload after a deploy revalidates only the page. The service worker
+    template gets the versioned URLs to precache filled in, so phones keep
+    the pages they need even if the network goes down.
+    """
+
+    def __init__(self, root, compress=True, precache=True):
+        self.root = root
+        self.compress = compress
+        self.precache = precache
+        self.assets = {}        # plain name -> Asset
+        self._routes = {}       # plain or versioned name -> {encoding: Representation}
+        self.service_worker = None
+        self.precached = []
+        self.raw_bytes = 0
+        self.compressed_bytes = {}
+        self.load_ms = None
+        # Counters
+        self.served = {}        # encoding -> responses with a body
+        self.revalidated = 0    # 304s
+        self.misses = 0
+
+    def load(self):
+        """Read, hash and compress everything under `root` (blocking; run off the event loop)."""
+        started = time.perf_counter()
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for filename in names:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    files[name] = f.read()
+
+        # Pages point at versioned names, so what they reference is hashed first:
+        # other files, then stylesheets, then HTML, then the service worker that precaches them
+        def order(name):
+            content_type = self._content_type(name)
+            return (name == SERVICE_WORKER, content_type.startswith('text/html'), content_type.startswith('text/css'))
+
+        for name in sorted(files, key=order):
+            data = files[name]
+            if self._content_type(name).startswith(REWRITE_TYPES):
+                data = _REFERENCE.sub(self._versioned_reference, data.decode('utf-8')).encode('utf-8')
+            if name == SERVICE_WORKER:
+                self.precached = self.precache_urls()
+                version = hashlib.sha256(''.join(self.assets[name].digest for name in sorted(self.assets)
+                                                 if name.startswith(PRECACHE)).encode()).hexdigest()[:VERSION_LENGTH]
+                data = (data.replace(PRECACHE_MARKER.encode(), json.dumps(self.precached).encode())
+                        .replace(VERSION_MARKER.encode(), version.encode()))
+            self._add(name, data)
+        self.service_worker = self._routes.get(SERVICE_WORKER)
+        self.load_ms = round((time.perf_counter() - started) * 1000, 2)
+        return self
+
+    @staticmethod
+    def _content_type(name):
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type == 'text/javascript':
+            content_type = 'application/javascript'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        return content_type
+
+    def _versioned_reference(self, match):
+        asset = self.assets.get(match.group(2))
+        if asset is None:
+            return match.group(0)
+        return f'{match.group(1)}/static/{asset.versioned}{match.group(3)}'
+
+    def _add(self, name, data):
+        asset = Asset(name, data, self._content_type(name), self.compress)
+        self.assets[name] = asset
+        self._routes[name] = {encoding: asset.representation(encoding, REVALIDATE) for encoding in asset.encodings}
+        if name != SERVICE_WORKER:
+            self._routes[asset.versioned] = {encoding: asset.representation(encoding, IMMUTABLE)
+                                             for encoding in asset.encodings}
+        self.raw_bytes += asset.size
+        for encoding, body in asset.encodings.items():
+            if encoding:
+                self.compressed_bytes[encoding] = self.compressed_bytes.get(encoding, 0) + len(body)
+
+    def precache_urls(self):
+        """What the service worker caches on install: pages by plain URL, what they load by versioned URL."""
+        if not self.precache:
+            return []
+        urls = []
+        for name, asset in sorted(self.assets.items()):
+            if not name.startswith(PRECACHE):
+                continue
+            urls.append(f'/static/{name}' if asset.content_type.startswith('text/html') else f'/static/{asset.versioned}')
+            if asset.content_type.startswith('text/html'):
+                data = asset.encodings[None].decode('utf-8')
+                urls.extend(f'/static/{match.group(2)}' for match in _REFERENCE.finditer(data))
+        return sorted(set(urls))
+
+    def lookup(self, name):
+        """{encoding: Representation} for a plain or versioned name, or None."""
+        route = self._routes.get(name)
+        if route is None:
+            self.misses += 1
+        return route
+
+    def choose(self, representations, accept_encoding):
+        """The smallest representation the client accepts."""
+        if len(representations) > 1:
+            accepted = accepted_encodings(accept_encoding)
+            for encoding in ('br', 'gzip'):
+                if encoding in representations and encoding in accepted:
+                    return encoding, representations[encoding]
+        return None, representations[None]
+
+    @staticmethod
+    def not_modified(representation, if_none_match):
+        """True if an If-None-Match header already names this content (in any encoding)."""
+        if not if_none_match:
+            return False
+        return if_none_match.strip() == '*' or representation.headers['ETag'][1:33] in if_none_match
+
+    def count(self, encoding):
+        self.served[encoding or 'identity'] = self.served.get(encoding or 'identity', 0) + 1
+
+    def stats(self):
+        return {
+            'assets': len(self.assets),
+            'brotli': brotli is not None,
+            'raw_bytes': self.raw_bytes,
+            'compressed_bytes': self.compressed_bytes,
+            'precached': len(self.precached),
+            'load_ms': self.load_ms,
+            'served': self.served,
+            'revalidated': self.revalidated,
+            'misses': self.misses
+        }
@@ -0,0 +1,643 @@
+import array
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import struct
+import sys
+import time
+from bisect import bisect_left
+
+from metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+RAW_POINTS = 2048              # Raw readings kept per sensor (~3 h at one packet per 5 s); never written to disk
+MINUTE_POINTS = 24 * 60        # Minute rollups kept in memory per sensor: one day
+HOUR_POINTS = 35 * 24          # Hour rollups kept in memory per sensor: five weeks
+MAX_SENSORS = 1024             # Sensors tracked; readings from further IDs are refused
+MINUTE_RETENTION = 14 * 86400  # Seconds minute segments stay on disk
+HOUR_RETENTION = 400 * 86400   # Seconds hour segments stay on disk
+FLUSH_INTERVAL = 60.0          # Seconds between closing idle rollups and rewriting the segments they touched
+MAX_POINTS = 5000              # Points one history query returns at most (the newest ones)
+MAX_SPAN = HOUR_RETENTION      # Longest range one history query may ask for: all that is kept
+DEDUP_WINDOW = 1.0             # The same level from the same sensor inside this window is a duplicate
+AUTO_RAW_SPAN = 3600           # resolution=auto: raw readings up to an hour, minutes up to two days, then hours
+AUTO_MINUTE_SPAN = 2 * 86400
+LEVEL_MAX = 2 ** 31 - 1        # Levels and thresholds are clamped to [0, LEVEL_MAX] to fit their 'i' columns
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = {'raw': None, 'minute': MINUTE, 'hour': HOUR}
+
+# On disk: one segment per hour of minute rollups and one per UTC day of hour rollups, named after
+# the period's start. A segment is rewritten while its period is open and never after.
+SEGMENT_SPAN = {MINUTE: HOUR, HOUR: DAY}
+SEGMENT_PREFIX = {MINUTE: 'minute', HOUR: 'hour'}
+SEGMENT_RETENTION = {MINUTE: MINUTE_RETENTION, HOUR: HOUR_RETENTION}
+SEGMENT_MAGIC = b'FTS1'
+_SEGMENT = re.compile(r'^(minute|hour)-(\d+)\.seg$')
+
+# Rollup columns and their array typecodes (the same size on every platform we run on)
+ROLLUP_COLUMNS = (('t', 'q'), ('count', 'I'), ('sum', 'd'), ('min', 'i'), ('max', 'i'), ('last', 'i'),
+                  ('threshold', 'i'))
+RAW_COLUMNS = (('t', 'd'), ('level', 'i'), ('threshold', 'i'))
+
+
+class Ring:
+    """Parallel array.array columns that overwrite their oldest row once `capacity` rows are held.
+
+    Columns grow on demand, so a sensor that reported twice costs two rows,
+    not a full buffer. Rows are appended in time order (column 0), which
+    keeps range lookups a bisect.
+    """
+
+    __slots__ = ('capacity', 'columns', 'head')
+
+    def __init__(self, capacity, typecodes):
+        self.capacity = capacity
+        self.columns = [array.array(code) for code in typecodes]
+        self.head = 0   # Index of the oldest row once full
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def append(self, row):
+        """Add a row to every column, or to none if a value does not fit its column (the error is re-raised)."""
+        columns = self.columns
+        if len(columns[0]) < self.capacity:
+            done = 0
+            try:
+                for column, value in zip(columns, row):
+                    column.append(value)
+                    done += 1
+            except (OverflowError, TypeError):
+                for column in columns[:done]:
+                    column.pop()
+                raise
+        else:
+            head = self.head
+            previous = []
+            try:
+                for column, value in zip(columns, row):
+                    previous.append(column[head])
+                    column[head] = value
+            except (OverflowError, TypeError):
+                for column, value in zip(columns, previous):
+                    column[head] = value
+                raise
+            self.head = (head + 1) % self.capacity
+
+    def extend(self, columns):
+        """Append many rows given as columns; a straight copy while there is room."""
+        room = self.capacity - len(self.columns[0])
+        if room > 0:
+            for column, values in zip(self.columns, columns):
+                column.extend(values[:room])
+        for row in zip(*(values[max(room, 0):] for values in columns)):
+            self.append(row)
+
+    def oldest(self):
+        return self.columns[0][self.head] if len(self) else None
+
+    def last(self):
+        """The newest row, or None."""
+        if not len(self):
+            return None
+        index = self.head - 1 if self.head else len(self) - 1
+        return tuple(column[index] for column in self.columns)
+
+    def _ordered(self, column):
+        values = self.columns[column]
+        return values[self.head:] + values[:self.head] if self.head else values
+
+    def range(self, start, end):
+        """Columns (arrays) of the rows with start <= t < end."""
+        times = self._ordered(0)
+        lo, hi = bisect_left(times, start), bisect_left(times, end)
+        return [self._ordered(i)[lo:hi] for i in range(len(self.columns))]
+
+    def nbytes(self):
+        return sum(len(column) * column.itemsize for column in self.columns)
+
+
+class Bucket:
+    """A rollup still accumulating: count, sum, min, max and last level over [t, t + span)."""
+
+    __slots__ = ('t', 'count', 'sum', 'min', 'max', 'last', 'threshold')
+
+    def __init__(self, t):
+        self.t = t
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.last = 0
+        self.threshold = 0
+
+    def add(self, level, threshold):
+        self.count += 1
+        self.sum += level
+        self.min = level if self.min is None or level < self.min else self.min
+        self.max = level if self.max is None or level > self.max else self.max
+        self.last = level
+        self.threshold = threshold
+
+    def merge(self, row):
+        """Fold in a finer rollup row (t, count, sum, min, max, last, threshold)."""
+        _, count, total, low, high, last, threshold = row
+        self.count += count
+        self.sum += total
+        self.min = low if self.min is None or low < self.min else self.min
+        self.max = high if self.max is None or high > self.max else self.max
+        self.last = last
+        self.threshold = threshold
+
+    def row(self):
+        return (self.t, self.count, self.sum, self.min, self.max, self.last, self.threshold)
+
+
+class SensorSeries:
+    """One sensor's raw ring, minute and hour rollup rings, and the rollups still open."""
+
+    __slots__ = ('raw', 'minutes', 'hours', 'minute', 'hour')
+
+    def __init__(self, raw_points, minute_points, hour_points):
+        rollup = [code for _, code in ROLLUP_COLUMNS]
+        self.raw = Ring(raw_points, [code for _, code in RAW_COLUMNS])
+        self.minutes = Ring(minute_points, rollup)
+        self.hours = Ring(hour_points, rollup)
+        self.minute = None
+        self.hour = None
+
+    def rollups(self, step):
+        return self.minutes if step == MINUTE else self.hours
+
+    def partial(self, step):
+        """Rows for rollups of size `step` that are still open (at most two, oldest first)."""
+        if step == MINUTE:
+            return [self.minute.row()] if self.minute is not None else []
+        rows = []
+        hour = self.hour
+        if hour is not None:
+            rows.append(hour.row())
+        if self.minute is not None:
+            start = self.minute.t // HOUR * HOUR
+            if hour is not None and hour.t == start:
+                merged = Bucket(start)
+                merged.merge(hour.row())
+                merged.merge(self.minute.row())
+                rows[-1] = merged.row()
+            else:
+                rows.append((start,) + self.minute.row()[1:])
+        return rows
+
+
+def encode_segment(step, start, per_sensor):
+    """A segment file's bytes: magic, header length, JSON header, then each column contiguous.
+
+    `per_sensor` maps sensor ID -> rollup columns. Rows are grouped by sensor,
+    and the header records each sensor's (offset, count), so reading one
+    sensor is one seek per column whatever the segment holds.
+    """
+    columns = [array.array(code) for _, code in ROLLUP_COLUMNS]
+    sensors = {}
+    offset = 0
+    for sensor_id in sorted(per_sensor):
+        rows = per_sensor[sensor_id]
+        count = len(rows[0])
+        if not count:
+            continue
+        sensors[sensor_id] = [offset, count]
+        for column, values in zip(columns, rows):
+            column.extend(values)
+        offset += count
+    header = json.dumps({'version': 1, 'step': step, 'start': start, 'rows': offset, 'byteorder': sys.byteorder,
+                         'columns': [list(column) for column in ROLLUP_COLUMNS], 'sensors': sensors},
+                        separators=(',', ':')).encode('utf-8')
+    return b''.join([SEGMENT_MAGIC, struct.pack('!I', len(header)), header] + [c.tobytes() for c in columns])
+
+
+def read_segment(path, sensor_ids=None):
+    """{sensor_id: rollup columns} from a segment, for `sensor_ids` only if given; ValueError if unreadable."""
+    with open(path, 'rb') as f:
+        if f.read(4) != SEGMENT_MAGIC:
+            raise ValueError(f'{path} is not a telemetry segment')
+        (length,) = struct.unpack('!I', f.read(4))
+        header = json.loads(f.read(length))
+        if [tuple(column) for column in header['columns']] != list(ROLLUP_COLUMNS):
+            raise ValueError(f'{path} has an unknown column layout')
+        index = header['sensors']
+        swap = header['byteorder'] != sys.byteorder
+        base, rows = 8 + length, header['rows']
+        if sensor_ids is None:
+            # Everything: read each column whole and slice it per sensor
+            columns = []
+            for _, code in ROLLUP_COLUMNS:
+                column = array.array(code)
+                column.frombytes(f.read(rows * column.itemsize))
+                if swap:
+                    column.byteswap()
+                columns.append(column)
+            return {sensor_id: [column[offset:offset + count] for column in columns]
+                    for sensor_id, (offset, count) in index.items()}
+        found = {}
+        for sensor_id in sensor_ids:
+            if sensor_id not in index:
+                continue
+            offset, count = index[sensor_id]
+            position = base
+            columns = []
+            for _, code in ROLLUP_COLUMNS:
+                column = array.array(code)
+                f.seek(position + offset * column.itemsize)
+                column.frombytes(f.read(count * column.itemsize))
+                if swap:
+                    column.byteswap()
+                columns.append(column)
+                position += rows * column.itemsize
+            found[sensor_id] = columns
+        return found
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+class TelemetryStore:
+    """Smoke-level history per sensor: raw readings, minute and hour rollups, columnar segments on disk.
+
+    `record_packet` runs on the event loop for every FIRE_ALERT and costs
+    a few array appends. Each reading lands in the sensor's raw ring and
+    its open minute rollup; a minute closes into the minute ring (and its
+    hour rollup) when a later reading arrives or the once-a-minute tick
+    finds it finished. Memory is bounded by the ring capacities times
+    MAX_SENSORS, and rings only grow as far as a sensor has reported.
+
+    Every tick, the segments touched since the last one are encoded on the
+    loop and written (tmp + rename) on the default executor. On start the
+    last day of minutes and five weeks of hours are read back.
+
+    History queries are answered from memory and fall back to the segments
+    for older ranges. A store opened with writable=False (cluster workers
+    that do not own the UDP port) records nothing and answers from the
+    segments alone, at most one tick behind.
+    """
+
+    def __init__(self, directory, writable=True, raw_points=RAW_POINTS, minute_points=MINUTE_POINTS,
+                 hour_points=HOUR_POINTS, max_sensors=MAX_SENSORS, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.writable = writable
+        self.raw_points = raw_points
+        self.minute_points = minute_points
+        self.hour_points = hour_points
+        self.max_sensors = max_sensors
+        self.flush_interval = flush_interval
+        self.series = {}
+        self._dirty = set()    # (step, segment start) holding rows not yet on disk
+        self._task = None
+        self.query_histogram = Histogram()
+
+        # Counters
+        self.readings = 0
+        self.duplicates = 0
+        self.refused = 0
+        self.segments_written = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+        self.pruned = 0
+        self.loaded_rows = 0
+        self.load_ms = None
+        self.queries = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _segment_path(self, step, start):
+        return os.path.join(self.directory, f'{SEGMENT_PREFIX[step]}-{int(start):010d}.seg')
+
+    # --- Recording ---
+
+    def record_packet(self, packet, now=None):
+        """Record a FIRE_ALERT packet's smoke level; False if it was a duplicate or refused.
+
+        Levels and thresholds outside [0, LEVEL_MAX] are clamped, so a bogus
+        packet is stored as a pinned reading rather than failing halfway.
+        """
+        sensor_id = packet.get('sensor_id') or packet.get('ip') or 'unknown'
+        try:
+            level = min(max(int(packet.get('smoke_level') or 0), 0), LEVEL_MAX)
+            threshold = min(max(int(packet.get('threshold') or 0), 0), LEVEL_MAX)
+        except (TypeError, ValueError, OverflowError):
+            return False
+        return self.record(sensor_id, level, threshold, now)
+
+    def record(self, sensor_id, level, threshold, now=None):
+        now = time.time() if now is None else now
+        series = self.series.get(sensor_id)
+        if series is None:
+            if len(self.series) >= self.max_sensors:
+                self.refused += 1
+                return False
+            series = self.series[sensor_id] = SensorSeries(self.raw_points, self.minute_points, self.hour_points)
+        else:
+            last = series.raw.last()
+            if last is not None:
+                if now - last[0] < DEDUP_WINDOW and level == last[1]:
+                    self.duplicates += 1
+                    return False
+                now = max(now, last[0])   # The wall clock stepped back; keep the rings ordered
+        series.raw.append((now, level, threshold))
+        start = int(now // MINUTE * MINUTE)
+        if series.minute is not None and series.minute.t != start:
+            self._close_minute(series)
+        if series.minute is None:
+            series.minute = Bucket(start)
+        series.minute.add(level, threshold)
+        self.readings += 1
+        return True
+
+    def _close_minute(self, series):
+        minute, series.minute = series.minute, None
+        row = minute.row()
+        series.minutes.append(row)
+        self._dirty.add((MINUTE, minute.t // HOUR * HOUR))
+        start = minute.t // HOUR * HOUR
+        if series.hour is not None and series.hour.t != start:
+            self._close_hour(series)
+        if series.hour is None:
+            series.hour = Bucket(start)
+        series.hour.merge(row)
+
+    def _close_hour(self, series):
+        hour, series.hour = series.hour, None
+        series.hours.append(hour.row())
+        self._dirty.add((HOUR, hour.t // DAY * DAY))
+
+    def tick(self, now=None):
+        """Close the rollups whose period is over, for sensors that have gone quiet."""
+        now = time.time() if now is None else now
+        for series in self.series.values():
+            if series.minute is not None and series.minute.t + MINUTE <= now:
+                self._close_minute(series)
+            if series.hour is not None and series.hour.t + HOUR <= now:
+                self._close_hour(series)
+
+    # --- Persistence ---
+
+    def load(self, now=None):
+        """Read recent segments back into memory; call once, before `start` (blocking; run off the loop)."""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        for step, points in ((HOUR, self.hour_points), (MINUTE, self.minute_points)):
+            span = SEGMENT_SPAN[step]
+            first = int((now - points * step) // span * span)
+            for start in range(first, int(now) + 1, span):
+                path = self._segment_path(step, start)
+                try:
+                    found = read_segment(path)
+                except FileNotFoundError:
+                    continue
+                except (OSError, ValueError, KeyError) as e:
+                    log.warning("⚠️ Skipping unreadable telemetry segment %s: %s", path, e)
+                    continue
+                for sensor_id, columns in found.items():
+                    series = self.series.get(sensor_id)
+                    if series is None:
+                        if len(self.series) >= self.max_sensors:
+                            continue
+                        series = self.series[sensor_id] = SensorSeries(
+                            self.raw_points, self.minute_points, self.hour_points)
+                    ring = series.rollups(step)
+                    newest = ring.last()
+                    skip = bisect_left(columns[0], newest[0] + 1) if newest is not None else 0
+                    ring.extend([column[skip:] for column in columns])
+                    self.loaded_rows += len(columns[0]) - skip
+        # Minutes past the last hour on disk (the hour open at shutdown) are folded back into hours
+        for series in self.series.values():
+            newest = series.hours.last()
+            done = newest[0] + HOUR if newest is not None else 0
+            for row in zip(*series.minutes.range(done, math.inf)):
+                start = row[0] // HOUR * HOUR
+                if series.hour is not None and series.hour.t != start:
+                    self._close_hour(series)
+                if series.hour is None:
+                    series.hour = Bucket(start)
+                series.hour.merge(row)
+        self.tick(now)
+        self.load_ms = round((time.perf_counter() - started) * 1000, 2)
+        return self
+
+    def start(self):
+        if self.writable and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.tick()
+                await self.flush()
+            except Exception:
+                log.exception("Telemetry flush failed")
+
+    def _encode(self, step, start):
+        end = start + SEGMENT_SPAN[step]
+        per_sensor = {sensor_id: series.rollups(step).range(start, end) for sensor_id, series in self.series.items()}
+        return encode_segment(step, start, per_sensor)
+
+    async def flush(self):
+        """Write every segment touched since the last flush (encoded here, written on the default executor)."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        segments = [(self._segment_path(step, start), self._encode(step, start)) for step, start in sorted(dirty)]
+        await asyncio.get_running_loop().run_in_executor(None, self._write, segments)
+
+    def _write(self, segments):
+        for path, data in segments:
+            tmp_path = path + '.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                self.write_errors += 1
+                log.error("🔥 Telemetry segment write failed: %s", e)
+                continue
+            self.segments_written += 1
+            self.bytes_written += len(data)
+        self._prune(time.time())
+
+    def _prune(self, now):
+        """Delete segments past their retention."""
+        for name in os.listdir(self.directory):
+            match = _SEGMENT.match(name)
+            if not match:
+                continue
+            step = MINUTE if match.group(1) == 'minute' else HOUR
+            if int(match.group(2)) + SEGMENT_SPAN[step] < now - SEGMENT_RETENTION[step]:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    self.pruned += 1
+                except OSError:
+                    pass
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.writable:
+            await self.flush()
+
+    # --- Queries ---
+
+    def _segments(self, step, start, end):
+        """Starts of the segment files of `step` that overlap [start, end), oldest first (blocking)."""
+        prefix, span = SEGMENT_PREFIX[step], SEGMENT_SPAN[step]
+        starts = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT.match(name)
+            if match and match.group(1) == prefix and start - span < int(match.group(2)) < end:
+                starts.append(int(match.group(2)))
+        return sorted(starts)
+
+    def _from_disk(self, sensor_id, step, start, end, now=None):
+        """Rollup rows for [start, end) read from the segments on disk (blocking)."""
+        now = time.time() if now is None else now
+        start, end = max(start, now - SEGMENT_RETENTION[step]), min(end, now)
+        rows = []
+        for segment in self._segments(step, start, end) if start < end else ():
+            path = self._segment_path(step, segment)
+            try:
+                found = read_segment(path, (sensor_id,))
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, KeyError) as e:
+                log.warning("⚠️ Skipping unreadable telemetry segment %s: %s", path, e)
+                continue
+            if sensor_id in found:
+                columns = found[sensor_id]
+                times = columns[0]
+                lo, hi = bisect_left(times, start), bisect_left(times, end)
+                rows.extend(zip(*(column[lo:hi] for column in columns)))
+        if step == HOUR and not self.writable:
+            # The hour still open is only in minute segments so far
+            tail = rows[-1][0] + HOUR if rows else start
+            hours = {}
+            for row in (self._from_disk(sensor_id, MINUTE, tail, end, now) if tail < end else ()):
+                hour = row[0] // HOUR * HOUR
+                if hour >= start:
+                    hours.setdefault(hour, Bucket(hour)).merge(row)
+            rows.extend(bucket.row() for bucket in hours.values())
+        return rows
+
+    async def history(self, sensor_id, start, end, resolution='auto', now=None):
+        """Columns of one sensor's readings or rollups in [start, end), plus a summary of the range.
+
+        The range is clamped to what can hold readings: nothing after `now`
+        and nothing older than the hour segments' retention.
+        """
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        end = min(end, now)
+        start = min(max(start, now - HOUR_RETENTION), end)
+        if resolution == 'auto':
+            span = end - start
+            resolution = 'raw' if span <= AUTO_RAW_SPAN else 'minute' if span <= AUTO_MINUTE_SPAN else 'hour'
+        step = RESOLUTIONS[resolution]
+        series = self.series.get(sensor_id)
+
+        if step is None:
+            rows = list(zip(*series.raw.range(start, end))) if series is not None else []
+            result = self._raw_result(rows)
+        else:
+            rows = []
+            partial = series.partial(step) if series is not None else []
+            ring = series.rollups(step) if series is not None else None
+            in_memory = ring.oldest() if ring else (partial[0][0] if partial else math.inf)
+            if start < in_memory:
+                rows = await asyncio.get_running_loop().run_in_executor(
+                    None, self._from_disk, sensor_id, step, start, min(end, in_memory), now)
+            if ring:
+                rows.extend(zip(*ring.range(start, end)))
+            newest = rows[-1][0] if rows else -math.inf
+            rows.extend(row for row in partial if start <= row[0] < end and row[0] > newest)
+            result = self._rollup_result(rows)
+
+        truncated = len(result['t']) > MAX_POINTS
+        if truncated:
+            result = {key: values[-MAX_POINTS:] for key, values in result.items()}
+        self.queries += 1
+        elapsed = time.perf_counter() - started
+        self.query_histogram.observe(elapsed)
+        return {
+            'sensor_id': sensor_id,
+            'resolution': resolution,
+            'step': step,
+            'from': start,
+            'to': end,
+            'points': len(result['t']),
+            'truncated': truncated,
+            'summary': self._summary(rows, step),
+            'query_ms': round(elapsed * 1000, 3),
+            **result
+        }
+
+    @staticmethod
+    def _raw_result(rows):
+        return {
+            't': [round(row[0], 3) for row in rows],
+            'level': [row[1] for row in rows],
+            'threshold': [row[2] for row in rows]
+        }
+
+    @staticmethod
+    def _rollup_result(rows):
+        return {
+            't': [row[0] for row in rows],
+            'count': [row[1] for row in rows],
+            'mean': [round(row[2] / row[1], 1) if row[1] else None for row in rows],
+            'min': [row[3] for row in rows],
+            'max': [row[4] for row in rows],
+            'last': [row[5] for row in rows],
+            'threshold': [row[6] for row in rows]
+        }
+
+    @staticmethod
+    def _summary(rows, step):
+        """Readings, mean, min, max and the latest threshold over every row in range (not just those returned)."""
+        if not rows:
+            return {'readings': 0, 'mean': None, 'min': None, 'max': None, 'threshold': None}
+        if step is None:
+            levels = [row[1] for row in rows]
+            return {'readings': len(levels), 'mean': _round(sum(levels) / len(levels)), 'min': min(levels),
+                    'max': max(levels), 'threshold': rows[-1][2]}
+        readings = sum(row[1] for row in rows)
+        return {'readings': readings, 'mean': _round(sum(row[2] for row in rows) / readings) if readings else None,
+                'min': min(row[3] for row in rows), 'max': max(row[4] for row in rows), 'threshold': rows[-1][6]}
+
+    def stats(self):
+        rings = [(series.raw, series.minutes, series.hours) for series in self.series.values()]
+        return {
+            'directory': self.directory,
+            'writable': self.writable,
+            'sensors': len(self.series),
+            'raw_rows': sum(len(raw) for raw, _, _ in rings),
+            'minute_rows': sum(len(minutes) for _, minutes, _ in rings),
+            'hour_rows': sum(len(hours) for _, _, hours in rings),
+            'memory_bytes': sum(ring.nbytes() for group in rings for ring in group),
+            'readings': self.readings,
+            'duplicates': self.duplicates,
+            'refused': self.refused,
+            'dirty_segments': len(self._dirty),
+            'segments_written': self.segments_written,
+            'bytes_written': self.bytes_written,
+            'write_errors': self.write_errors,
+            'pruned': self.pruned,
+            'loaded_rows': self.loaded_rows,
+            'load_ms': self.load_ms,
+            'queries': self.queries
+        }
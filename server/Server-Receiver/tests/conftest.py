@@ -0,0 +1,41 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class NoPushClient:
+    """Stands in for FirebaseClient: every token succeeds and nothing leaves the machine."""
+
+    def send(self, tokens, data):
+        return [None] * len(tokens)
+
+
+@pytest.fixture
+def make_server(tmp_path):
+    """FireEmergencyServer factory with temporary storage, no UDP port and no Firebase."""
+    import server
+
+    def make(**kwargs):
+        server.alert_active, server.alarm_zones = False, None   # Module state a previous test may have left
+        options = dict(map_dir=str(tmp_path / 'maps'), journal=False, telemetry=False, ingest_udp=False,
+                       static_cache=False, fcm_client=NoPushClient(), auth_secret='test-secret')
+        options.update(kwargs)
+        return server.FireEmergencyServer(**options)
+    return make
+
+
+@pytest.fixture
+def serve():
+    """Run `scenario(client, server)` against a live test server on the loopback interface."""
+    from aiohttp.test_utils import TestClient, TestServer
+
+    def run(instance, scenario):
+        async def main():
+            async with TestClient(TestServer(instance.app)) as client:
+                return await scenario(client, instance)
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,57 @@
+import asyncio
+
+from admin_stream import AdminStatusStream
+from occupants import OccupantRegistry
+
+
+def make_stream(replay_size=8):
+    registry = OccupantRegistry()
+    frames = []
+    stream = AdminStatusStream(registry, frames.append, lambda: {'alert_active': False, 'connected_clients': 0},
+                               tick=0.01, replay_size=replay_size)
+    return registry, stream, frames
+
+
+def test_changes_within_a_tick_become_one_delta():
+    async def main():
+        registry, stream, frames = make_stream()
+        registry.register('c1', 'ann', 'Ann')       # No status yet: nothing to show
+        registry.register('c2', 'bo', 'Bo')
+        registry.set_status('ann', 'SAFE', 't1')
+        registry.set_status('ann', 'TRAPPED', 't2')
+        registry.set_status('bo', 'SAFE', 't3')
+        await asyncio.sleep(0.05)
+        registry.remove('bo')
+        await asyncio.sleep(0.05)
+        return frames
+
+    first, second = asyncio.run(main())
+    assert (first['seq'], first['prev']) == (1, 0)
+    assert first['upserts']['ann']['status'] == 'TRAPPED' and set(first['upserts']) == {'ann', 'bo'}
+    assert (second['seq'], second['prev'], second['upserts'], second['removes']) == (2, 1, {}, ['bo'])
+
+
+def test_handshake_resumes_or_falls_back_to_a_snapshot():
+    async def main():
+        registry, stream, frames = make_stream(replay_size=2)
+        registry.register('c1', 'ann', 'Ann')
+        for seq in range(4):
+            registry.set_status('ann', f'S{seq}', None)
+            stream.flush()
+        return stream
+
+    stream = asyncio.run(main())
+    assert stream.seq == 4
+
+    resumed = stream.handshake(stream.stream_id, 2)
+    assert [frame['type'] for frame in resumed] == ['status_delta', 'status_delta', 'resumed']
+    assert [frame['seq'] for frame in resumed] == [3, 4, 4]
+    assert [frame['type'] for frame in stream.handshake(stream.stream_id, 4)] == ['resumed']
+
+    for stream_id, since in ((stream.stream_id, 1),    # Fell off the two-frame replay log
+                             ('old-stream', 3),        # The server restarted
+                             (stream.stream_id, 9),    # Ahead of the server
+                             (stream.stream_id, None)):
+        snapshot, = stream.handshake(stream_id, since)
+        assert snapshot['type'] == 'status_update' and snapshot['seq'] == 4
+        assert snapshot['user_status']['ann']['status'] == 'S3'
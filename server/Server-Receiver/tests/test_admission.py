@@ -0,0 +1,99 @@
+import asyncio
+
+from admission import ConnectionAdmission, KeyedLimiter, StatusCoalescer, TokenBucket
+
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(rate=2.0, burst=3, now=0.0)
+    assert [bucket.take(now=0.0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == 0.5
+    assert not bucket.take(now=0.25)
+    assert bucket.take(now=0.5)
+    # Idle time refills to the burst, never beyond it
+    assert sum(bucket.take(now=100.0) for _ in range(10)) == 3
+
+
+def test_token_bucket_rate_zero_never_limits():
+    bucket = TokenBucket(rate=0, burst=0)
+    assert all(bucket.take() for _ in range(1000))
+    assert bucket.wait_time() == 0.0
+
+
+def test_keyed_limiter_is_per_key_and_forgets_least_recent():
+    limiter = KeyedLimiter('test', rate=0.001, burst=1, max_keys=2)
+    assert limiter.allow('a') and limiter.allow('b')
+    assert not limiter.allow('a')
+    assert limiter.retry_after('a') > 0
+    limiter.allow('c')                  # Evicts 'b', the least recently used
+    assert limiter.allow('b')           # A fresh bucket
+    assert (limiter.stats()['keys'], limiter.limited) == (2, 1)
+
+
+def test_connection_admission_caps():
+    admission = ConnectionAdmission(max_connections=3, max_per_ip=2)
+    assert admission.admit('1.1.1.1') is None
+    assert admission.admit('1.1.1.1') is None
+    assert admission.admit('1.1.1.1') == 'too many connections from this address'
+    assert admission.admit('2.2.2.2') is None
+    assert admission.admit('3.3.3.3') == 'server full'
+    admission.release('1.1.1.1')
+    assert admission.admit('3.3.3.3') is None
+    assert admission.stats()['rejected'] == 2
+
+
+def test_status_coalescer_keeps_only_the_latest():
+    applied = []
+
+    async def main():
+        coalescer = StatusCoalescer(lambda key, value: applied.append((key, value)), rate=20.0, burst=1)
+        assert coalescer.offer('ann', 'SAFE')
+        for status in ('HELP', 'TRAPPED', 'INJURED'):
+            assert not coalescer.offer('ann', status)
+        assert applied == [('ann', 'SAFE')]
+        await asyncio.sleep(0.15)      # The next token is due after 1/rate
+        return coalescer
+
+    coalescer = asyncio.run(main())
+    assert applied == [('ann', 'SAFE'), ('ann', 'INJURED')]
+    assert (coalescer.applied, coalescer.coalesced) == (2, 2)
+
+
+def test_status_coalescer_flush_applies_and_forgets():
+    applied = []
+
+    async def main():
+        coalescer = StatusCoalescer(lambda key, value: applied.append(value), rate=0.01, burst=1)
+        coalescer.offer('bo', 'SAFE')
+        coalescer.offer('bo', 'TRAPPED')
+        coalescer.flush('bo')
+        assert applied == ['SAFE', 'TRAPPED']
+        assert not coalescer._pending and not coalescer._timers and not coalescer._buckets
+        # A fresh bucket afterwards: a reconnect is not throttled by the old one
+        assert coalescer.offer('bo', 'SAFE')
+
+    asyncio.run(main())
+
+
+def test_status_coalescer_deferred_offer_waits_for_the_timer():
+    applied = []
+
+    async def main():
+        coalescer = StatusCoalescer(lambda key, value: applied.append(value), rate=20.0, burst=5)
+        assert not coalescer.offer('cy', 'HELP', defer=True)
+        assert applied == []
+        await asyncio.sleep(0.15)
+
+    asyncio.run(main())
+    assert applied == ['HELP']
+
+
+def test_status_coalescer_survives_a_failing_apply():
+    def apply(key, value):
+        raise RuntimeError('boom')
+
+    async def main():
+        coalescer = StatusCoalescer(apply, rate=1.0, burst=1)
+        assert coalescer.offer('dee', 'SAFE')
+        return coalescer
+
+    assert asyncio.run(main()).applied == 1
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from alarm_dispatch import AlarmDispatcher, CHANNEL_CANCELLED, CHANNEL_ERROR, CHANNEL_OK, CHANNEL_TIMEOUT
+from auth import TOKEN_PROTOCOL
+from wire import PROTOCOL_JSON
+
+
+def channel(delay, result=None, error=None):
+    async def deliver():
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+    return deliver
+
+
+def test_channels_run_concurrently_under_their_own_deadlines():
+    dispatcher = AlarmDispatcher()
+
+    async def main():
+        started = time.perf_counter()
+        timeline = await dispatcher.dispatch('test', {
+            'fast': (channel(0.05, {'sent': 1}), 1.0),
+            'slow': (channel(0.1), 1.0),
+            'stuck': (channel(10), 0.15),
+            'broken': (channel(0, error=RuntimeError('no route')), 1.0),
+        })
+        return timeline, time.perf_counter() - started
+
+    timeline, elapsed = asyncio.run(main())
+    assert elapsed < 1.0   # Bounded by the stuck channel's deadline, not the sum of all channels
+    statuses = {name: run.status for name, run in timeline.channels.items()}
+    assert statuses == {'fast': CHANNEL_OK, 'slow': CHANNEL_OK, 'stuck': CHANNEL_TIMEOUT, 'broken': CHANNEL_ERROR}
+    assert timeline.channels['fast'].detail == {'sent': 1}
+    assert timeline.channels['broken'].detail == {'error': 'no route'}
+    assert dispatcher.stats()['timeouts'] == 1 and dispatcher.stats()['in_flight'] == 0
+
+
+@pytest.mark.parametrize('head_start', [0, 0.01])   # Channel task not started yet / already sending
+def test_cancel_stops_an_earlier_alarm_in_flight(head_start):
+    dispatcher = AlarmDispatcher()
+
+    async def main():
+        alarm = asyncio.create_task(dispatcher.dispatch('manual_alarm', {'fcm': (channel(10), 30.0)}))
+        await asyncio.sleep(head_start)
+        assert dispatcher.cancel(kind='sensor_alarm') == 0
+        assert dispatcher.cancel() == 1
+        return await alarm
+
+    timeline = asyncio.run(main())
+    assert timeline.done and timeline.channels['fcm'].status == CHANNEL_CANCELLED
+    assert timeline.channels['fcm'].finished_at is not None
+    assert dispatcher.recent(1)[0] is timeline and dispatcher.cancelled == 1
+
+
+def test_clear_right_after_trigger_on_one_admin_socket(make_server, serve):
+    instance = make_server()
+
+    def slow_push(*args, zones=None):
+        return channel(30)   # A push batch still retrying against Firebase's deadline
+    instance.push_channel = slow_push
+
+    async def scenario(client, instance):
+        token, _ = instance.tokens.issue('admin1')
+        ws = await client.ws_connect('/ws/admin', protocols=(PROTOCOL_JSON, TOKEN_PROTOCOL + token))
+        started = time.perf_counter()
+        await ws.send_json({'type': 'trigger_alarm'})
+        await ws.send_json({'type': 'clear_alarm'})
+        while True:
+            frame = await asyncio.wait_for(ws.receive_json(), 5.0)
+            if frame.get('type') == 'alert_cleared':
+                break
+        assert time.perf_counter() - started < 5.0
+        await ws.close()
+
+        alarm = next(timeline for timeline in instance.alarms.recent() if timeline.kind == 'manual_alarm')
+        assert alarm.channels['fcm'].status == CHANNEL_CANCELLED
+
+    serve(instance, scenario)
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from aiohttp import WSServerHandshakeError
+
+from auth import (CredentialStore, TokenSigner, TOKEN_PROTOCOL, hash_password, token_from_protocols,
+                  verify_password)
+
+
+def test_password_hash_round_trip():
+    encoded = hash_password('s3cret', iterations=1000)
+    assert encoded.startswith('pbkdf2_sha256$1000$')
+    assert verify_password('s3cret', encoded)
+    assert not verify_password('S3cret', encoded)
+    assert not verify_password('s3cret', 'md5$1$x$y')
+    assert not verify_password('s3cret', 'garbage')
+
+
+def test_credential_store_checks_off_the_loop():
+    store = CredentialStore({'admin': hash_password('pw', iterations=1000)})
+    try:
+        assert asyncio.run(store.check('admin', 'pw'))
+        assert not asyncio.run(store.check('admin', 'nope'))
+        assert not asyncio.run(store.check('nobody', 'pw'))
+        assert not asyncio.run(store.check(None, 'pw'))
+    finally:
+        store.close()
+    assert (store.logins, store.failures) == (1, 3)
+
+
+def test_token_sign_verify_and_expiry():
+    signer = TokenSigner('secret', ttl=60)
+    token, expires = signer.issue('admin1', now=1000)
+    assert expires == 1060
+    assert signer.verify(token, now=1059) == 'admin1'
+    assert signer.verify(token, now=1061) is None
+    assert (signer.accepted, signer.rejected) == (1, 1)
+
+
+@pytest.mark.parametrize('mangle', [
+    lambda token: token[:-2] + ('AA' if token[-2:] != 'AA' else 'BB'),   # Signature changed
+    lambda token: 'YWRtaW4yOjk5OTk5OTk5OTk.' + token.split('.')[1],      # Payload swapped
+    lambda token: token.replace('.', ''),
+    lambda token: '',
+    lambda token: None,
+])
+def test_token_tampering_is_rejected(mangle):
+    signer = TokenSigner('secret')
+    token, _ = signer.issue('admin1')
+    assert signer.verify(mangle(token)) is None
+
+
+def test_token_from_another_secret_is_rejected():
+    token, _ = TokenSigner('one').issue('admin1')
+    assert TokenSigner('two').verify(token) is None
+
+
+def test_token_from_protocols():
+    assert token_from_protocols(f'fire.json.v1, {TOKEN_PROTOCOL}abc.def') == 'abc.def'
+    assert token_from_protocols('fire.json.v1') is None
+    assert token_from_protocols(None) is None
+
+
+def test_admin_socket_takes_the_token_as_a_subprotocol_only(make_server, serve):
+    async def scenario(client, instance):
+        token, _ = instance.tokens.issue('admin1')
+        with pytest.raises(WSServerHandshakeError) as refused:
+            await client.ws_connect(f'/ws/admin?token={token}')
+        assert refused.value.status == 401
+
+        ws = await client.ws_connect('/ws/admin', protocols=('fire.json.v1', TOKEN_PROTOCOL + token))
+        assert ws.protocol == 'fire.json.v1'
+        await ws.close()
+
+        assert (await client.get(f'/api/admin/session?token={token}')).status == 401
+        assert (await client.get('/api/admin/session', headers={'Authorization': f'Bearer {token}'})).status == 200
+
+    serve(make_server(), scenario)
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+
+import pytest
+
+from backplane import (Backplane, BackplaneHub, LocalBackplane, LocalHub, MAX_FRAME, SocketBackplane, TOPIC_ALARM,
+                       TOPIC_HELLO, _HEADER, encode_frame, read_frame)
+
+
+def test_backplane_is_abstract():
+    with pytest.raises(TypeError):
+        Backplane()
+
+
+def test_local_backplane_reaches_every_other_member(caplog):
+    hub = LocalHub()
+    first, second, third = (LocalBackplane(worker_id, hub) for worker_id in range(3))
+    got = {0: [], 1: [], 2: []}
+    for backplane in (first, second, third):
+        backplane.subscribe(lambda topic, message, worker_id, me=backplane.worker_id:
+                            got[me].append((topic, message, worker_id)))
+
+    def broken(topic, message, worker_id):
+        raise RuntimeError('subscriber bug')
+    second.subscribe(broken)
+
+    async def main():
+        first.publish(TOPIC_ALARM, {'alert_active': True})
+        await asyncio.sleep(0)
+
+    with caplog.at_level(logging.ERROR, logger='backplane'):
+        asyncio.run(main())
+    assert got[0] == []
+    assert got[1] == got[2] == [(TOPIC_ALARM, {'alert_active': True}, 0)]
+    assert 'Backplane subscriber failed on alarm' in caplog.text
+    assert (first.stats()['published'], second.stats()['received'], first.peers) == (1, 1, 2)
+
+
+def test_frame_round_trip_and_size_limit():
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_frame(TOPIC_ALARM, {'zones': ['A/3']}, 4))
+        reader.feed_data(_HEADER.pack(MAX_FRAME + 1))
+        body = await read_frame(reader)
+        with pytest.raises(ValueError):
+            await read_frame(reader)
+        return body
+
+    assert b'"zones":["A/3"]' in asyncio.run(main())
+
+
+def test_socket_backplanes_round_trip_through_the_hub(tmp_path):
+    path = str(tmp_path / 'hub.sock')
+
+    async def main():
+        hub = await BackplaneHub(path).start()
+        workers = [await SocketBackplane(path, worker_id).start() for worker_id in range(2)]
+        got = asyncio.Queue()
+        workers[1].subscribe(lambda topic, message, worker_id: got.put_nowait((topic, message, worker_id)))
+        try:
+            workers[0].publish(TOPIC_ALARM, {'alert_active': True, 'zones': None})
+            while True:
+                frame = await asyncio.wait_for(got.get(), 2.0)
+                if frame[0] != TOPIC_HELLO:
+                    return frame, hub.stats()
+        finally:
+            for worker in workers:
+                await worker.close()
+            await hub.close()
+
+    frame, stats = asyncio.run(main())
+    assert frame == (TOPIC_ALARM, {'alert_active': True, 'zones': None}, 0)
+    assert stats['workers'] == 2 and stats['relayed'] >= 1
+
+
+def test_socket_backplane_counts_frames_it_could_not_send(tmp_path):
+    backplane = SocketBackplane(str(tmp_path / 'nowhere.sock'))
+    backplane.publish(TOPIC_ALARM, {})
+    assert backplane.stats()['dropped'] == 1 and not backplane.stats()['connected']
@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+from fanout import FanoutEngine, POLICY_COALESCE, POLICY_DROP, percentile
+
+
+class StalledSocket:
+    """A socket whose writes block until `release()`; records what was written."""
+
+    def __init__(self):
+        self.frames = []
+        self.gate = asyncio.Event()
+        self.closed = False
+
+    async def send_frame(self, data, opcode):
+        await self.gate.wait()
+        self.frames.append(json.loads(data))
+
+    def release(self):
+        self.gate.set()
+
+
+def frame(kind, seq=None, **fields):
+    message = {'type': kind, **fields}
+    if seq is not None:
+        message['seq'] = seq
+    return message
+
+
+async def stalled_channel(policy, queue_size=2):
+    """An engine with one socket whose writer is stuck on a first frame, leaving `queue_size` free slots."""
+    evicted = []
+    engine = FanoutEngine(queue_size=queue_size, policy=policy, on_evict=lambda client_id, ws: evicted.append(client_id))
+    ws = StalledSocket()
+    channel = engine.register('c1', ws)
+    engine.send('c1', frame('connected', seq=0))
+    await asyncio.sleep(0)   # The writer takes it and blocks
+    return engine, channel, ws, evicted
+
+
+def queued_types(channel):
+    return [(message.type, message.seq) for message, _ in channel.queue]
+
+
+def test_coalesce_replaces_only_full_state_frames():
+    async def main():
+        engine, channel, ws, evicted = await stalled_channel(POLICY_COALESCE)
+        engine.send('c1', frame('status_update', users=1))
+        engine.send('c1', frame('broadcast', seq=1, message='Use stair B'))
+        engine.send('c1', frame('status_update', users=2))       # Replaces the queued snapshot
+        assert queued_types(channel) == [('status_update', None), ('broadcast', 1)]
+        assert channel.dropped == 1 and not evicted
+
+        ws.release()
+        await asyncio.sleep(0.01)
+        return ws.frames
+
+    written = asyncio.run(main())
+    assert [f['type'] for f in written] == ['connected', 'status_update', 'broadcast']
+    assert written[1]['users'] == 2
+
+
+def test_coalesce_never_drops_a_sequenced_notice():
+    async def main():
+        engine, channel, ws, evicted = await stalled_channel(POLICY_COALESCE)
+        engine.send('c1', frame('broadcast', seq=1, message='one'))
+        engine.send('c1', frame('admin_message', seq=2, message='two'))
+
+        # An unsequenced newcomer is the one that goes
+        assert not engine.send('c1', frame('presence'))
+        assert queued_types(channel) == [('broadcast', 1), ('admin_message', 2)] and not evicted
+
+        # Another notice cannot replace one of the same type: the socket is evicted and resumes instead
+        record = engine.broadcast(frame('admin_message', seq=3, message='three'))
+        assert evicted == ['c1'] and 'c1' not in engine.channels
+        assert (record.delivered, record.failed) == (0, 1)
+
+    asyncio.run(main())
+
+
+def test_drop_policy_drops_the_oldest_non_alarm_frame():
+    async def main():
+        engine, channel, ws, evicted = await stalled_channel(POLICY_DROP)
+        engine.send('c1', frame('fire_alert', seq=1))
+        engine.send('c1', frame('broadcast', seq=2))
+        engine.send('c1', frame('broadcast', seq=3))
+        assert queued_types(channel) == [('fire_alert', 1), ('broadcast', 3)]
+        assert channel.dropped == 1 and not evicted
+
+    asyncio.run(main())
+
+
+def test_alarms_jump_unsequenced_frames_but_not_sequenced_ones():
+    async def main():
+        engine, channel, ws, _ = await stalled_channel(POLICY_COALESCE, queue_size=8)
+        engine.send('c1', frame('broadcast', seq=1))
+        engine.send('c1', frame('status_update'))
+        engine.send('c1', frame('presence'))
+        engine.send('c1', frame('fire_alert', seq=2))
+        assert queued_types(channel) == [('broadcast', 1), ('fire_alert', 2), ('status_update', None),
+                                         ('presence', None)]
+
+    asyncio.run(main())
+
+
+def test_broadcast_record_settles_when_every_socket_is_written():
+    async def main():
+        engine = FanoutEngine()
+        sockets = [StalledSocket() for _ in range(3)]
+        for index, ws in enumerate(sockets):
+            engine.register(f'c{index}', ws)
+        record = engine.broadcast(frame('fire_alert', seq=1), audience={'c0', 'c2', 'gone'})
+        assert record.pending == 2
+        for ws in sockets:
+            ws.release()
+        await record.wait(1.0)
+        return record, sockets, engine.stats()
+
+    record, sockets, stats = asyncio.run(main())
+    assert (record.delivered, record.failed) == (2, 0) and record.latency is not None
+    assert [len(ws.frames) for ws in sockets] == [1, 0, 1]
+    assert stats['broadcasts'] == 1 and stats['targeted'] == 1
+
+
+def test_percentile():
+    assert percentile([], 50) == 0.0
+    assert percentile([5, 1, 3, 2, 4], 50) == 3
+    assert percentile(list(range(1, 101)), 99) == 99
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import pytest
+
+from fcm_dispatch import FIREBASE_UNAVAILABLE, FcmDispatcher, FirebaseUnavailable, LazyFirebaseClient
+
+
+class UnavailableError(Exception):
+    """Named like firebase_admin's transient error."""
+
+
+class UnregisteredError(Exception):
+    """Named like firebase_admin's dead-token error."""
+
+
+class ScriptedClient:
+    """FCM stand-in: `fail(token, attempt)` returns the error for that token's nth send, or None."""
+
+    def __init__(self, fail=lambda token, attempt: None):
+        self.fail = fail
+        self.calls = []
+        self.attempts = {}
+        self._lock = threading.Lock()
+
+    def send(self, tokens, data):
+        with self._lock:
+            self.calls.append(list(tokens))
+            outcomes = []
+            for token in tokens:
+                attempt = self.attempts[token] = self.attempts.get(token, 0) + 1
+                outcomes.append(self.fail(token, attempt))
+            return outcomes
+
+
+def dispatch(client, tokens, **kwargs):
+    pruned = []
+    dispatcher = FcmDispatcher(client, on_unregistered=pruned.append, backoff_base=0, **kwargs)
+    try:
+        return asyncio.run(dispatcher.dispatch(tokens, {'type': 'fire_alert'})), dispatcher, pruned
+    finally:
+        dispatcher.close()
+
+
+def test_tokens_are_sent_in_batches():
+    client = ScriptedClient()
+    result, dispatcher, _ = dispatch(client, [f't{i}' for i in range(7)], batch_size=3)
+    assert sorted(len(call) for call in client.calls) == [1, 3, 3]
+    assert (result.sent, result.failed, result.batches) == (7, 0, 3)
+    assert dispatcher.stats()['sent'] == 7
+
+
+def test_transient_failures_are_retried_and_dead_tokens_pruned():
+    def fail(token, attempt):
+        if token == 'dead':
+            return UnregisteredError()
+        if token == 'flaky' and attempt < 3:
+            return UnavailableError()
+        if token == 'down':
+            return UnavailableError()
+        return None
+
+    client = ScriptedClient(fail)
+    result, _, pruned = dispatch(client, ['ok', 'dead', 'flaky', 'down'], max_retries=3)
+    assert pruned == ['dead']
+    assert (result.sent, result.failed) == (2, 2)
+    assert client.attempts == {'ok': 1, 'dead': 1, 'flaky': 3, 'down': 4}
+    assert result.retries == 3
+
+
+def test_a_failed_request_fails_every_token_in_it():
+    class Broken:
+        def send(self, tokens, data):
+            raise PermissionError('bad credentials')
+
+    result, _, pruned = dispatch(Broken(), ['a', 'b'])
+    assert (result.sent, result.failed, result.batches) == (0, 2, 1) and pruned == []
+
+
+def test_without_the_sdk_pushes_are_skipped(tmp_path):
+    client = LazyFirebaseClient(str(tmp_path / 'serviceAccountKey.json'), wait=0.1)
+    client.initialize()
+    assert client.state == FIREBASE_UNAVAILABLE and not client.available
+    with pytest.raises(FirebaseUnavailable):
+        client.send(['a'], {})
+
+    result, dispatcher, _ = dispatch(client, ['a', 'b'])
+    assert (result.sent, result.skipped, result.batches) == (0, 2, 0)
+    assert dispatcher.stats()['firebase']['state'] == FIREBASE_UNAVAILABLE
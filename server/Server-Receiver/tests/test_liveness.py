@@ -0,0 +1,35 @@
+import asyncio
+
+import server
+from admission import IngressLimits
+
+
+def test_reaped_socket_applies_its_coalesced_status(make_server, serve):
+    # One status per 100 s: the second one stays parked until something flushes it
+    instance = make_server(ping_interval=0.2, ping_timeout=0.2,
+                           limits=IngressLimits(status_rate=0.01, status_burst=1))
+    stable_id = server.generate_stable_id('Bo', 'tok-reap')
+
+    async def scenario(client, instance):
+        # autoping off and never reading: the pings go unanswered and the socket is reaped
+        ws = await client.ws_connect('/ws/client', autoping=False)
+        await ws.send_json({'type': 'register_name', 'name': 'Bo', 'fcm_token': 'tok-reap'})
+        await ws.send_json({'type': 'status_update', 'status': 'SAFE'})
+        await ws.send_json({'type': 'status_update', 'status': 'TRAPPED'})
+        await asyncio.sleep(0.2)
+        assert instance.occupants.get(stable_id).status == 'SAFE'
+        assert stable_id in instance.status_updates._pending
+
+        for _ in range(40):
+            if not instance.occupants.get(stable_id).online:
+                break
+            await asyncio.sleep(0.1)
+        occupant = instance.occupants.get(stable_id)
+        assert not occupant.online
+        assert occupant.status == 'TRAPPED'
+        assert stable_id not in instance.status_updates._pending
+        assert stable_id not in instance.status_updates._buckets
+        assert stable_id not in instance.status_updates._timers
+        await ws.close()
+
+    serve(instance, scenario)
@@ -0,0 +1,114 @@
+import hashlib
+import os
+
+import pytest
+
+from map_store import MapStore, MapStoreError, parse_range
+
+
+def admin_headers(instance):
+    token, _ = instance.tokens.issue('admin1')
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_put_and_get_round_trip(tmp_path):
+    store = MapStore(str(tmp_path))
+    data = os.urandom(5000)
+    digest = store.put(data, 'image/png')
+    assert digest == hashlib.sha256(data).hexdigest()
+    # A fresh store has nothing cached and reads the blob back from disk
+    assert MapStore(str(tmp_path)).get(digest) == (data, 'image/png')
+    assert digest in store
+    assert store.get('0' * 64) is None
+
+
+def test_put_rejects_empty(tmp_path):
+    with pytest.raises(MapStoreError):
+        MapStore(str(tmp_path)).put(b'')
+
+
+def test_upload_multi_chunk_body_round_trip(make_server, serve):
+    data = os.urandom(3 * 1024 * 1024)
+
+    async def chunks():
+        for i in range(0, len(data), 64 * 1024):
+            yield data[i:i + 64 * 1024]
+
+    async def scenario(client, instance):
+        response = await client.post('/api/admin/maps', data=chunks(), headers={
+            **admin_headers(instance), 'Content-Type': 'image/png'})
+        assert response.status == 200
+        uploaded = await response.json()
+        assert uploaded['map_hash'] == hashlib.sha256(data).hexdigest()
+
+        response = await client.get(uploaded['map_url'])
+        assert response.status == 200
+        assert response.headers['Content-Type'] == 'image/png'
+        assert await response.read() == data
+
+    serve(make_server(), scenario)
+
+
+def test_upload_over_limit_is_413(make_server, serve, monkeypatch):
+    import server
+    monkeypatch.setattr(server, 'MAX_MAP_SIZE', 1000)
+
+    async def scenario(client, instance):
+        response = await client.post('/api/admin/maps', data=b'x' * 1001, headers={
+            **admin_headers(instance), 'Content-Type': 'image/png'})
+        assert response.status == 413
+
+    serve(make_server(), scenario)
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=900-5000', (900, 999)),
+    ('bytes=0-1,5-6', None),
+    ('bytes=abc-', None),
+    ('items=0-1', None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=-0', 'bytes=1000-', 'bytes=500-100'])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(MapStoreError):
+        parse_range(header, 1000)
+
+
+def test_serve_map_ranges(make_server, serve):
+    data = os.urandom(1000)
+
+    async def scenario(client, instance):
+        digest = instance.map_store.put(data, 'image/png')
+        response = await client.get(f'/maps/{digest}', headers={'Range': 'bytes=10-19'})
+        assert response.status == 206
+        assert await response.read() == data[10:20]
+
+        response = await client.get(f'/maps/{digest}', headers={'Range': 'bytes=-0'})
+        assert response.status == 416
+        assert response.headers['Content-Range'] == 'bytes */1000'
+
+        response = await client.get(f'/maps/{digest}', headers={'If-None-Match': f'"{digest}"'})
+        assert response.status == 304
+
+    serve(make_server(), scenario)
+
+
+def test_serve_map_from_disk(make_server, serve, tmp_path):
+    data = os.urandom(2000)
+    digest = MapStore(str(tmp_path / 'maps')).put(data, 'image/jpeg')
+
+    async def scenario(client, instance):
+        assert instance.map_store.cached(digest) is None
+        response = await client.get(f'/maps/{digest}')
+        assert response.status == 200
+        assert await response.read() == data
+        assert (await client.get('/maps/' + '0' * 64)).status == 404
+
+    serve(make_server(), scenario)
@@ -0,0 +1,79 @@
+from occupants import (EVENT_DISCONNECT, EVENT_REGISTER, EVENT_REMOVE, EVENT_STATUS, STATUS_UNKNOWN,
+                       OccupantRegistry)
+
+
+def test_register_status_and_indexes():
+    registry = OccupantRegistry()
+    events = []
+    registry.subscribe(lambda event, occupant: events.append((event, occupant.stable_id)))
+    registry.connect('c1', object())
+    registry.register('c1', 'ann', 'Ann', 'tok-1', zone='A/3/east')
+    registry.register('c2', 'bo', 'Bo', 'tok-shared', zone='B/1')
+    registry.register('c3', 'cy', 'Cy', 'tok-shared')
+    registry.set_status('ann', 'TRAPPED', 't1')
+
+    assert [o.stable_id for o in registry.with_status('TRAPPED')] == ['ann']
+    assert registry.count_by_status() == {STATUS_UNKNOWN: 2, 'TRAPPED': 1}
+    assert sorted(o.stable_id for o in registry.with_token('tok-shared')) == ['bo', 'cy']
+    assert sorted(registry.tokens()) == ['tok-1', 'tok-shared']
+    assert registry.tokens(['A/3']) == ['tok-1']
+    assert sorted(registry.tokens(['A/3'], include_unplaced=True)) == ['tok-1', 'tok-shared']
+    assert registry.user_status() == {'ann': {'status': 'TRAPPED', 'timestamp': 't1', 'name': 'Ann', 'online': True}}
+    assert events[-1] == (EVENT_STATUS, 'ann')
+
+    registry.remove_token('tok-shared')
+    assert registry.tokens() == ['tok-1'] and registry.get('bo').fcm_token is None
+    registry.remove('cy')
+    assert 'cy' not in registry and registry.stable_id_for('c3') is None
+    assert events[-1] == (EVENT_REMOVE, 'cy')
+
+
+def test_disconnect_keeps_the_person_and_ignores_stale_sockets():
+    registry = OccupantRegistry()
+    events = []
+    registry.subscribe(lambda event, occupant: events.append(event))
+    registry.register('old', 'ann', 'Ann', 'tok')
+    registry.set_status('ann', 'TRAPPED', 't1')
+    registry.register('new', 'ann', 'Ann', 'tok')    # Reconnected before the old socket was noticed dead
+    assert registry.disconnect('old') is None
+    assert registry.get('ann').online
+
+    occupant = registry.disconnect('new')
+    assert occupant is registry.get('ann')
+    assert not occupant.online and occupant.status == 'TRAPPED' and occupant.offline_since is not None
+    assert events[-1] == EVENT_DISCONNECT
+
+
+def test_remote_changes_do_not_steal_a_local_socket():
+    registry = OccupantRegistry()
+    registry.register('c1', 'ann', 'Ann', 'tok')
+    record = {'stable_id': 'ann', 'name': 'Ann', 'fcm_token': 'tok', 'zone': None, 'status': 'SAFE',
+              'timestamp': 't2', 'online': False}
+    assert registry.apply_remote(EVENT_DISCONNECT, record) is None
+    assert registry.get('ann').online
+
+    registry.apply_remote(EVENT_REGISTER, dict(record, online=True))   # Now on another worker
+    occupant = registry.get('ann')
+    assert occupant.client_id is None and occupant.status == 'SAFE'
+    assert registry.local() == []
+
+
+def test_failing_listener_does_not_stop_the_others():
+    registry = OccupantRegistry()
+    seen = []
+    registry.subscribe(lambda event, occupant: 1 / 0)
+    unsubscribe = registry.subscribe(lambda event, occupant: seen.append(event))
+    registry.register('c1', 'ann', 'Ann')
+    unsubscribe()
+    registry.set_status('ann', 'SAFE', None)
+    assert seen == [EVENT_REGISTER]
+
+
+def test_each_server_has_its_own_registry(make_server):
+    first = make_server()
+    listeners = len(first.occupants._listeners)
+    second = make_server()
+    assert second.occupants is not first.occupants
+    assert len(first.occupants._listeners) == listeners   # Building a server subscribes nothing elsewhere
+    first.occupants.register('c1', 'ann', 'Ann', 'tok')
+    assert 'ann' not in second.occupants
@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+
+from profiler import SamplingProfiler
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_reports_are_consistent_while_sampling():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy, args=(stop,), daemon=True)
+    worker.start()
+    profiler = SamplingProfiler()
+    assert profiler.start(interval=0.001, thread_id=worker.ident)
+    try:
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:   # Read while the sampler thread keeps writing
+            profiler.collapsed()
+            profiler.top_functions()
+    finally:
+        profiler.stop()
+        stop.set()
+        worker.join()
+
+    stacks, samples = profiler.snapshot()
+    assert samples > 0 and sum(stacks.values()) == samples
+    assert any(row['function'].endswith(':busy') for row in profiler.top_functions())
+    assert profiler.collapsed().count('\n') == len(stacks)
+
+
+@pytest.mark.parametrize('body', [
+    {'action': 'start', 'interval_ms': 'fast'},
+    {'action': 'start', 'seconds': [1]},
+    {'action': 'start', 'interval_ms': 'nan'},
+    ['start'],
+])
+def test_control_rejects_bad_input(make_server, serve, body):
+    async def scenario(client, instance):
+        token, _ = instance.tokens.issue('admin1')
+        response = await client.post('/api/admin/profiler', json=body, headers={'Authorization': f'Bearer {token}'})
+        assert response.status == 400
+        assert not instance.profiler.running
+
+    serve(make_server(), scenario)
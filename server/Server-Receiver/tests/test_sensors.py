@@ -0,0 +1,36 @@
+from sensors import STALE_AFTER, STATE_ALERTING, STATE_CLEARED, TREND_FALLING, TREND_RISING, SensorTracker
+
+
+def alert(level, sensor_id='ROOM_301_SENSOR', threshold=400, **fields):
+    return {'type': 'FIRE_ALERT', 'sensor_id': sensor_id, 'smoke_level': level, 'threshold': threshold,
+            'ip': '10.0.0.7', **fields}
+
+
+def test_only_transitions_are_reported():
+    tracker = SensorTracker(locate=lambda packet: 'A/3/east')
+    sensor = tracker.observe(alert(450), now=0.0)
+    assert sensor.state == STATE_ALERTING and sensor.severity == 0 and sensor.zone == 'A/3/east'
+    assert tracker.observe(alert(450), now=0.5) is None        # The same packet again: a duplicate
+    assert tracker.observe(alert(460), now=5.0) is None        # A heartbeat in the same band
+    sensor = tracker.observe(alert(650), now=10.0)             # Two bands above threshold
+    assert sensor.severity == 2 and sensor.trend == TREND_RISING and sensor.peak == 650
+    assert tracker.observe(alert(550), now=15.0).trend == TREND_FALLING
+    assert tracker.stats()['duplicates'] == 1
+    assert tracker.frame(sensor)['zones'] == ['A/3/east']
+
+
+def test_quiet_sensors_are_swept_and_can_alert_again():
+    tracker = SensorTracker()
+    tracker.observe(alert(500), now=0.0)
+    assert tracker.sweep(now=STALE_AFTER - 1) == []
+    cleared, = tracker.sweep(now=STALE_AFTER + 1)
+    assert cleared.state == STATE_CLEARED and tracker.alerting() == []
+    assert tracker.observe(alert(500), now=STALE_AFTER + 2).state == STATE_ALERTING
+
+
+def test_garbled_fields_still_alert():
+    tracker = SensorTracker()
+    assert tracker.observe(alert('high', threshold='??'), now=0.0).state == STATE_ALERTING
+    sensor = tracker.observe(alert(900, threshold=None), now=5.0)
+    assert sensor.level == 900 and sensor.threshold is None
+    assert tracker.observe(alert(float('inf'), sensor_id='OTHER'), now=6.0).level == 0
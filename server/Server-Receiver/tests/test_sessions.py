@@ -0,0 +1,87 @@
+import asyncio
+
+from sessions import ClientSessions
+
+
+def notice(text, zones=None):
+    return {'type': 'broadcast', 'message': text, 'zones': zones}
+
+
+def types(frames):
+    return [(frame['type'] if isinstance(frame, dict) else frame.type) for frame in frames]
+
+
+def seqs(frames):
+    return [frame.seq for frame in frames if not isinstance(frame, dict)]
+
+
+def test_only_replayable_frames_are_sequenced():
+    sessions = ClientSessions()
+    assert sessions.stamp({'type': 'connected'}) == {'type': 'connected'}
+    assert sessions.stamp(notice('one')).seq == 1
+    assert sessions.stamp({'type': 'fire_alert'}).seq == 2
+
+
+def test_resume_replays_every_notice_but_only_the_latest_alert():
+    sessions = ClientSessions()
+    sessions.stamp(notice('before'))
+    sessions.stamp({'type': 'fire_alert'})
+    sessions.stamp(notice('one'))
+    sessions.stamp({'type': 'clear_alert'})
+    sessions.stamp(notice('two'))
+
+    frames = sessions.open('s1', sessions.stream_id, 1)
+    assert seqs(frames) == [3, 4, 5]
+    assert types(frames) == ['broadcast', 'clear_alert', 'broadcast', 'resumed']
+    assert frames[-1]['gap'] is False and frames[-1]['replayed'] == 3
+    assert sessions.open('s2', sessions.stream_id, 5) == [sessions._resumed_frame(0, False)]
+
+
+def test_gaps_and_foreign_streams_get_a_snapshot():
+    sessions = ClientSessions(sizes={'alerts': 4, 'notices': 2})
+    sessions.stamp({'type': 'fire_alert'})
+    for i in range(4):
+        sessions.stamp(notice(str(i)))
+
+    frames = sessions.open('s1', sessions.stream_id, 1)    # Two notices fell off the ring
+    assert seqs(frames) == [4, 5] and frames[-1]['gap'] is True
+
+    frames = sessions.open('s2', 'another-stream', 3)
+    assert types(frames) == ['fire_alert', 'broadcast', 'resumed'] and frames[-1]['gap'] is True
+
+    assert types(sessions.open('s3')) == ['fire_alert']    # A first connect only learns of the fire
+
+
+def test_registering_resumes_from_where_the_last_socket_stopped():
+    sessions = ClientSessions()
+    sessions.open('old')
+    sessions.stamp(notice('seen'))
+    sessions.close('old', 'ann', written=1)
+    sessions.stamp(notice('missed'))
+    sessions.stamp(notice('elsewhere', zones=['B']))
+    sessions.stamp(notice('for A', zones=['A/3']))
+
+    sessions.open('new')
+    frames = sessions.bind('new', 'ann', area='A/3/east')
+    assert [frame.seq for frame in frames] == [2, 4]
+    assert sessions.bind('new', 'ann') == []    # Only once
+
+
+def test_reconnect_with_since_replays_missed_broadcasts(make_server, serve):
+    async def scenario(client, instance):
+        token, _ = instance.tokens.issue('admin1')
+        ws = await client.ws_connect('/ws/client')
+        connected = await ws.receive_json()
+        await ws.close()
+
+        for text in ('Use stair B', 'Assemble in car park'):
+            await client.post('/api/admin/broadcast', json={'message': text},
+                              headers={'Authorization': f'Bearer {token}'})
+
+        ws = await client.ws_connect(f"/ws/client?stream={connected['stream']}&since={connected['seq']}")
+        frames = [await asyncio.wait_for(ws.receive_json(), 2.0) for _ in range(4)]
+        await ws.close()
+        assert [frame['type'] for frame in frames] == ['connected', 'admin_message', 'admin_message', 'resumed']
+        assert [frame['message'] for frame in frames[1:3]] == ['Use stair B', 'Assemble in car park']
+
+    serve(make_server(), scenario)
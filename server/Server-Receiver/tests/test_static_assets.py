@@ -0,0 +1,98 @@
+import json
+import re
+
+import pytest
+
+from static_assets import IMMUTABLE, REVALIDATE, StaticAssets, accepted_encodings
+
+PAGE = '<html><link rel="stylesheet" href="/static/style.css"><script src="/static/app.js"></script></html>'
+STYLE = 'body { background: url("/static/images/plan.png"); }\n' + '.row { margin: 0; }\n' * 40
+SCRIPT = 'console.log("ready");\n' * 40
+WORKER = 'const VERSION = "__PRECACHE_VERSION__"; const PRECACHE = __PRECACHE_MANIFEST__;'
+
+
+@pytest.fixture
+def assets(tmp_path):
+    (tmp_path / 'images').mkdir()
+    (tmp_path / 'client.html').write_text(PAGE)
+    (tmp_path / 'style.css').write_text(STYLE)
+    (tmp_path / 'app.js').write_text(SCRIPT)
+    (tmp_path / 'images' / 'plan.png').write_bytes(b'\x89PNG' + bytes(64))
+    (tmp_path / 'sw.js').write_text(WORKER)
+    (tmp_path / '.hidden').write_text('skipped')
+    return StaticAssets(str(tmp_path)).load()
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate, br', {'gzip', 'deflate', 'br'}),
+    ('GZIP;q=0.5, br;q=0', {'gzip'}),
+    ('gzip;q=bogus', set()),
+    ('', set()),
+    (None, set()),
+])
+def test_accepted_encodings(header, expected):
+    assert accepted_encodings(header) == expected
+
+
+def test_choose_prefers_compressed_and_honours_q_zero(assets):
+    representations = assets.lookup('app.js')
+    assert assets.choose(representations, 'gzip')[0] == 'gzip'
+    assert assets.choose(representations, 'gzip;q=0')[0] is None
+    assert assets.choose(representations, None)[0] is None
+    # Too small to be worth compressing: only the identity body exists
+    assert set(assets.lookup('client.html')) == {None}
+
+
+def test_versioned_names_are_immutable_and_references_rewritten(assets):
+    style, script = assets.assets['style.css'], assets.assets['app.js']
+    assert re.fullmatch(r'style\.[0-9a-f]{12}\.css', style.versioned)
+    assert assets.lookup('style.css')[None].headers['Cache-Control'] == REVALIDATE
+    assert assets.lookup(style.versioned)[None].headers['Cache-Control'] == IMMUTABLE
+
+    page = assets.lookup('client.html')[None].body.decode()
+    assert f'/static/{style.versioned}' in page and f'/static/{script.versioned}' in page
+    css = assets.lookup('style.css')[None].body.decode()
+    assert f'/static/{assets.assets["images/plan.png"].versioned}' in css
+    assert '.hidden' not in assets.assets
+
+
+def test_etag_matches_across_encodings(assets):
+    identity = assets.lookup('app.js')[None]
+    gzipped = assets.lookup('app.js')['gzip']
+    assert identity.headers['ETag'] != gzipped.headers['ETag']
+    assert assets.not_modified(gzipped, identity.headers['ETag'])
+    assert assets.not_modified(identity, '*')
+    assert not assets.not_modified(identity, '"0000"')
+    assert not assets.not_modified(identity, None)
+
+
+def test_service_worker_gets_precache_manifest(assets):
+    worker = assets.service_worker[None].body.decode()
+    assert '__PRECACHE' not in worker
+    manifest = json.loads(re.search(r'PRECACHE = (\[.*?\]);', worker).group(1))
+    assert '/static/client.html' in manifest
+    assert f'/static/{assets.assets["style.css"].versioned}' in manifest
+    assert f'/static/{assets.assets["images/plan.png"].versioned}' in manifest
+    assert manifest == assets.precached
+    # The worker itself has no versioned route: it must keep one URL to stay registered
+    assert assets.lookup(assets.assets['sw.js'].versioned) is None
+
+
+def test_served_from_memory_with_304(make_server, serve):
+    async def scenario(client, instance):
+        response = await client.get('/static/admin.js', headers={'Accept-Encoding': 'gzip'})
+        assert response.status == 200
+        assert response.headers['Cache-Control'] == REVALIDATE
+        etag = response.headers['ETag']
+        await response.read()
+
+        response = await client.get('/static/admin.js', headers={'If-None-Match': etag})
+        assert response.status == 304
+        assert (await client.get('/static/missing.js')).status == 404
+
+        response = await client.get('/sw.js')
+        assert response.status == 200 and response.headers['Service-Worker-Allowed'] == '/'
+        stats = instance.static_assets.stats()
+        assert stats['revalidated'] == 1 and stats['misses'] == 1
+
+    serve(make_server(static_cache=True), scenario)
@@ -0,0 +1,91 @@
+import array
+import asyncio
+import os
+import time
+
+import pytest
+
+import server
+import telemetry
+from telemetry import HOUR, LEVEL_MAX, MINUTE, RAW_COLUMNS, Ring, TelemetryStore, read_segment
+
+NOW = 1_700_000_000.0
+
+
+def raw_ring(capacity):
+    return Ring(capacity, [code for _, code in RAW_COLUMNS])
+
+
+@pytest.mark.parametrize('filled', [1, 2])
+def test_ring_append_is_all_or_nothing(filled):
+    ring = raw_ring(2)
+    for i in range(filled):
+        ring.append((NOW + i, i, 0))
+    before = [array.array(column.typecode, column) for column in ring.columns]
+    with pytest.raises(OverflowError):
+        ring.append((NOW + 5, 1, 2 ** 40))   # The last column overflows after the others took the row
+    assert ring.columns == before
+    assert len({len(column) for column in ring.columns}) == 1
+
+
+def test_record_packet_clamps_levels(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    assert store.record_packet({'sensor_id': 's1', 'smoke_level': 2 ** 40, 'threshold': -5}, now=NOW)
+    assert store.series['s1'].raw.last() == (NOW, LEVEL_MAX, 0)
+    assert not store.record_packet({'sensor_id': 's1', 'smoke_level': float('inf')}, now=NOW + 5)
+    assert not store.record_packet({'sensor_id': 's1', 'smoke_level': 'high'}, now=NOW + 5)
+
+
+def test_telemetry_failure_never_blocks_the_alarm(make_server, tmp_path, monkeypatch, caplog):
+    instance = make_server(telemetry=True, telemetry_dir=str(tmp_path / 'telemetry'))
+
+    def broken(packet, now=None):
+        raise RuntimeError('disk on fire')
+    monkeypatch.setattr(instance.telemetry, 'record_packet', broken)
+
+    async def main():
+        instance.on_sensor_packet({'type': 'FIRE_ALERT', 'sensor_id': 's1', 'smoke_level': 2 ** 40},
+                                  ('10.0.0.7', 4210), NOW)
+        await asyncio.gather(*instance._background_tasks)
+
+    asyncio.run(main())
+    assert server.alert_active
+    assert 'Telemetry could not record a packet from 10.0.0.7' in caplog.text
+
+
+def test_history_reads_only_existing_segments(tmp_path, monkeypatch):
+    base = time.time() // HOUR * HOUR - 2 * HOUR
+    writer = TelemetryStore(str(tmp_path))
+    for minute in range(3):
+        writer.record('s1', 10 + minute, 50, now=base + minute * MINUTE)
+    writer.tick(base + HOUR + MINUTE)
+    asyncio.run(writer.flush())
+
+    reads = []
+    monkeypatch.setattr(telemetry, 'read_segment', lambda path, *args: reads.append(path) or read_segment(path, *args))
+    reader = TelemetryStore(str(tmp_path), writable=False)
+    history = asyncio.run(reader.history('s1', base - 10 * 86400, 1e18, 'minute'))
+    assert history['to'] <= time.time()
+    assert history['count'] == [1, 1, 1]
+    assert len(reads) == 1
+
+    # A sensor nothing is known about costs the segments on disk, not a walk to `to`
+    reads.clear()
+    history = asyncio.run(reader.history('ghost', 0, 1e18, 'hour'))
+    assert history['points'] == 0
+    assert reads and all(os.path.exists(path) for path in reads)
+
+
+def test_history_route_rejects_oversized_spans(make_server, serve, tmp_path):
+    instance = make_server(telemetry=True, telemetry_dir=str(tmp_path / 'telemetry'))
+    instance.telemetry.record('s1', 12, 50)
+
+    async def scenario(client, instance):
+        response = await client.get('/api/sensors/s1/history', params={'from': '0', 'to': '1e18'})
+        assert response.status == 400
+        response = await client.get('/api/sensors/s1/history', params={'to': '1e18'})
+        assert response.status == 200
+        history = await response.json()
+        assert history['to'] <= time.time() and history['points'] == 1
+
+    serve(instance, scenario)
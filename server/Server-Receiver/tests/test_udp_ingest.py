@@ -0,0 +1,79 @@
+import asyncio
+import json
+import logging
+import socket
+
+import pytest
+
+import wire
+from udp_ingest import SensorIngest
+
+
+def packet(sensor_id, level=500):
+    return {'type': 'FIRE_ALERT', 'smoke_level': level, 'threshold': 400, 'sensor_id': sensor_id, 'ip': '10.0.0.7'}
+
+
+def send_and_collect(datagrams, on_packet):
+    async def main():
+        ingest = await SensorIngest(on_packet, port=0, host='127.0.0.1').start()
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for data in datagrams:
+                sender.sendto(data, ('127.0.0.1', ingest.port))
+            for _ in range(100):
+                if ingest.packets >= len(datagrams):
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            sender.close()
+            ingest.close()
+        return ingest
+    return asyncio.run(main())
+
+
+def test_json_and_binary_packets_parse_alike():
+    received = []
+    datagrams = [json.dumps(packet('ROOM_1')).encode(), wire.pack_sensor(packet('ROOM_2')), b'not json', b'[1, 2]']
+    ingest = send_and_collect(datagrams, lambda p, addr, at: received.append(p))
+    assert received == [packet('ROOM_1'), packet('ROOM_2')]
+    assert ingest.binary_packets == 1
+    assert ingest.parse_errors == 2
+
+
+def test_handler_errors_are_counted_and_logged_rate_limited(caplog):
+    received = []
+
+    def on_packet(p, addr, at):
+        if p['sensor_id'].startswith('BAD'):
+            raise KeyError('zone')
+        received.append(p['sensor_id'])
+
+    datagrams = [json.dumps(packet(f'BAD_{i}')).encode() for i in range(5)] + [json.dumps(packet('OK')).encode()]
+    with caplog.at_level(logging.WARNING, logger='udp_ingest'):
+        ingest = send_and_collect(datagrams, on_packet)
+    assert received == ['OK']
+    assert ingest.handler_errors == 5
+    failures = [record for record in caplog.records if 'failed' in record.getMessage()]
+    assert len(failures) == 1
+    assert ingest._error_log.suppressed == 4
+
+
+def test_broadcast_packets_are_handled_once():
+    received = []
+
+    async def main():
+        ingest = await SensorIngest(lambda p, addr, at: received.append(p['sensor_id']), port=0).start()
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sender.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        try:
+            for i in range(3):
+                sender.sendto(json.dumps(packet(f'ROOM_{i}')).encode(), ('255.255.255.255', ingest.port))
+            await asyncio.sleep(0.2)
+        except OSError as e:
+            pytest.skip(f'no broadcast route here: {e}')
+        finally:
+            sender.close()
+            ingest.close()
+
+    asyncio.run(main())
+    assert sorted(received) == ['ROOM_0', 'ROOM_1', 'ROOM_2']
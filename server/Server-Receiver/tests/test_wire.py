@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+import wire
+from server import parse_frame
+
+msgpack = pytest.importorskip('msgpack')
+
+
+def frame(data, binary=True):
+    return SimpleNamespace(type=web.WSMsgType.BINARY if binary else web.WSMsgType.TEXT, data=data)
+
+
+def test_binary_round_trip_interns_known_keys():
+    message = {'type': 'fire_alert', 'message': 'Evacuate', 'zones': ['A/3'], 'extra': {'seq': 7}}
+    packed = wire.encode_binary(message)
+    assert len(packed) < len(str(message))
+    assert wire.decode_binary(packed) == message
+
+
+def test_binary_round_trip_timestamps_become_epoch_ms():
+    packed = wire.encode_binary({'type': 'broadcast', 'timestamp': '2024-01-01T00:00:00+00:00'})
+    assert wire.decode_binary(packed)['timestamp'] == 1704067200000
+
+
+@pytest.mark.parametrize('data', [
+    b'\x81\x91\x01\x01',            # Map keyed by an array: unhashable
+    b'\x81\x80\x01',                # Map keyed by a map
+    b'\x91' * 1023 + b'\x01',       # Deeper than expand() can recurse
+    b'\x91' * 2000 + b'\x01',       # Deeper than msgpack allows
+    b'\xc1',                        # Reserved byte
+    b'\x92\x01',                    # Truncated
+])
+def test_decode_binary_malformed_is_value_error(data):
+    with pytest.raises(ValueError):
+        wire.decode_binary(data)
+
+
+@pytest.mark.parametrize('msg', [
+    frame(b'\x81\x91\x01\x01'),
+    frame(b'\xc1'),
+    frame(wire.encode_binary(['not', 'a', 'map'])),
+    frame('{"type": ', binary=False),
+    frame('[' * 4000, binary=False),
+    frame('"just a string"', binary=False),
+])
+def test_parse_frame_rejects_malformed(msg):
+    assert parse_frame(msg) is None
+
+
+def test_parse_frame_accepts_both_encodings():
+    message = {'type': 'status_update', 'status': 'SAFE'}
+    assert parse_frame(frame(wire.encode_binary(message))) == message
+    assert parse_frame(frame('{"type": "status_update", "status": "SAFE"}', binary=False)) == message
+
+
+def test_sensor_packet_round_trip():
+    packet = {'type': 'FIRE_ALERT', 'smoke_level': 512, 'threshold': 400,
+              'sensor_id': 'ROOM_001_SENSOR', 'ip': '192.168.1.2'}
+    assert wire.unpack_sensor(wire.pack_sensor(packet)) == packet
+    with pytest.raises(ValueError):
+        wire.unpack_sensor(wire.pack_sensor(packet)[:-3])
+
+
+def test_malformed_binary_frame_keeps_socket_open(make_server, serve):
+    import asyncio
+    import server
+
+    async def scenario(client, instance):
+        ws = await client.ws_connect('/ws/client', protocols=(wire.PROTOCOL_MSGPACK,))
+        assert wire.decode_binary((await ws.receive()).data)['type'] == 'connected'
+        await ws.send_bytes(b'\x81\x91\x01\x01')
+        await ws.send_bytes(wire.encode_binary({'type': 'register_name', 'name': 'Ann', 'fcm_token': 'tok-wire'}))
+        await asyncio.sleep(0.2)
+        assert not ws.closed
+        assert instance.occupants.get(server.generate_stable_id('Ann', 'tok-wire')) is not None
+        await ws.close()
+
+    serve(make_server(), scenario)
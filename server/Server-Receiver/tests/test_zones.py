@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from auth import TOKEN_PROTOCOL
+from wire import PROTOCOL_JSON
+from zones import AudienceIndex, ZoneMap, area_path, covers, parse_targets, reaches
+
+
+def test_area_path_and_covers():
+    assert area_path('A', 3, 'east') == 'A/3/east'
+    assert area_path('A', None, '') == 'A'
+    assert area_path('ignored', 1, ' B / 2 /west') == 'B/2/west'
+    assert area_path() is None
+    assert covers('A/3', 'A/3/east') and covers('A/3', 'A/3')
+    assert not covers('A/3', 'A/30')
+
+
+def test_audience_reaches_below_and_coarser_placements():
+    index = AudienceIndex()
+    index.place('east', 'A/3/east')
+    index.place('west', 'A/3/west')
+    index.place('building', 'A')
+    index.place('other', 'B/1')
+    index.place('nowhere')
+    assert index.resolve(['A/3']) == {'east', 'west', 'building'}
+    assert index.resolve(['A/3/east']) == {'east', 'building'}
+    assert index.resolve(['B'], include_unplaced=True) == {'other', 'nowhere'}
+    for member, area in (('east', 'A/3/east'), ('building', 'A'), ('other', 'B/1')):
+        assert reaches(['A/3'], area) == (member in index.resolve(['A/3']))
+
+    index.place('east', 'B/1')   # Moved floors
+    assert index.resolve(['A/3']) == {'west', 'building'}
+    index.remove('other')
+    assert index.resolve(['B']) == {'east'}
+    assert len(index) == 4
+
+
+def test_neighbours():
+    zones = ZoneMap({'A/3/east': ['A/3/west']})
+    assert zones.neighbours('A/3/east') == ['A/3/west']
+    assert zones.neighbours('A/3/north') == ['A/3', 'A/4', 'A/2']
+    assert zones.neighbours('A/G') == []
+    assert zones.neighbours('A') == []
+
+
+def test_parse_targets():
+    assert parse_targets(None) is None
+    assert parse_targets('') is None
+    assert parse_targets('A/3, B ,A/3/') == ['A/3', 'B']
+    assert parse_targets(['B', ' A /1']) == ['A/1', 'B']
+    assert parse_targets(()) is None
+
+
+@pytest.mark.parametrize('value', [3, {'A': 1}, ['A', 3], [None], True, [['A']]])
+def test_parse_targets_rejects_other_types(value):
+    with pytest.raises(ValueError):
+        parse_targets(value)
+
+
+async def receive_types(ws, wait=0.3):
+    types = []
+    try:
+        while True:
+            types.append((await asyncio.wait_for(ws.receive_json(), wait))['type'])
+    except asyncio.TimeoutError:
+        return types
+
+
+def test_targeted_broadcast_reaches_only_its_zone(make_server, serve):
+    async def scenario(client, instance):
+        token, _ = instance.tokens.issue('admin1')
+        auth = {'Authorization': f'Bearer {token}'}
+        sockets = {}
+        for name, building in (('Ann', 'A'), ('Bo', 'B')):
+            ws = sockets[name] = await client.ws_connect('/ws/client')
+            await ws.send_json({'type': 'register_name', 'name': name, 'fcm_token': f'tok-{name}',
+                                'building': building, 'floor': 3})
+        for ws in sockets.values():
+            await receive_types(ws)
+
+        response = await client.post('/api/admin/broadcast', json={'message': 'Use stair B', 'zones': ['A/3']},
+                                     headers=auth)
+        assert response.status == 200
+        assert 'admin_message' in await receive_types(sockets['Ann'])
+        assert 'admin_message' not in await receive_types(sockets['Bo'])
+        for ws in sockets.values():
+            await ws.close()
+
+    serve(make_server(), scenario)
+
+
+def test_malformed_zones_are_refused(make_server, serve):
+    import server
+
+    async def scenario(client, instance):
+        token, _ = instance.tokens.issue('admin1')
+        auth = {'Authorization': f'Bearer {token}'}
+        for path in ('/api/admin/trigger_alarm', '/api/admin/broadcast'):
+            response = await client.post(path, json={'message': 'x', 'zones': {'A': 3}}, headers=auth)
+            assert response.status == 400
+
+        ws = await client.ws_connect('/ws/admin', protocols=(PROTOCOL_JSON, TOKEN_PROTOCOL + token))
+        await receive_types(ws)
+        await ws.send_json({'type': 'trigger_alarm', 'zones': 7})
+        frame = await asyncio.wait_for(ws.receive_json(), 2.0)
+        assert (frame['type'], frame['request']) == ('error', 'trigger_alarm')
+        await ws.close()
+        assert not server.alert_active
+
+    serve(make_server(), scenario)
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import socket
+import time
+from collections import deque
+
+from logs import RateLimitedLog
+from metrics import Histogram
+from wire import SENSOR_MAGIC, unpack_sensor
+
+log = logging.getLogger(__name__)
+
+DEFAULT_RCVBUF = 4 * 1024 * 1024  # Kernel receive buffer; absorbs bursts from many nodes
+DATAGRAM_SIZE = 2048              # Firmware packets are ~120 bytes of JSON, or ~30 in the binary layout
+DRAIN_BATCH = 256                 # Max datagrams read per readiness wakeup
+MAX_BACKLOG = 10000               # Parsed packets waiting for the loop before we start dropping
+
+
+class SensorDatagramProtocol(asyncio.DatagramProtocol):
+    """Receives sensor datagrams on the event loop and hands them to SensorIngest in batches.
+
+    On selector event loops the socket is drained directly (`drain`), reading
+    up to DRAIN_BATCH datagrams per wakeup the way recvmmsg would. Elsewhere
+    the standard transport calls `datagram_received` one packet at a time.
+    Either way, parsing and dispatch run once per loop iteration for the
+    whole batch.
+    """
+
+    def __init__(self, ingest):
+        self.ingest = ingest
+
+    def datagram_received(self, data, addr):
+        self.ingest._enqueue(data, addr, time.perf_counter())
+
+    def error_received(self, exc):
+        self.ingest.socket_errors += 1
+
+    def drain(self, sock):
+        received_at = time.perf_counter()
+        for _ in range(DRAIN_BATCH):
+            try:
+                data, addr = sock.recvfrom(DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                self.ingest.socket_errors += 1
+                return
+            self.ingest._enqueue(data, addr, received_at)
+
+
+class SensorIngest:
+    """Asyncio-native UDP listener for FIRE_ALERT / USER_MESSAGE packets.
+
+    Packets are JSON or, from compact firmware, the fixed binary layout in
+    wire.py; the first byte tells them apart and both parse to the same dict.
+    `on_packet(packet, addr, received_at)` is called synchronously on the
+    event loop for each parsed packet; it should schedule any slow work itself.
+
+    There is one socket, deliberately. The firmware broadcasts to
+    255.255.255.255, and the kernel hands a broadcast to every socket bound
+    to the port, so SO_REUSEPORT sockets would each receive (and alarm on)
+    the same packet. The socket is drained in batches instead.
+    """
+
+    def __init__(self, on_packet, port, host='', rcvbuf=DEFAULT_RCVBUF):
+        self.on_packet = on_packet
+        self.port = port
+        self.host = host
+        self.rcvbuf = rcvbuf
+        self.rcvbuf_effective = None
+        self.loop = None
+        self._sock = None
+        self._transport = None
+        self._backlog = deque()
+        self._scheduled = False
+
+        # Counters
+        self.packets = 0
+        self.binary_packets = 0
+        self.batches = 0
+        self.dropped = 0
+        self.truncated = 0
+        self.parse_errors = 0
+        self.handler_errors = 0
+        self.socket_errors = 0
+        self.batch_histogram = Histogram()   # Seconds to parse and dispatch one batch
+        self._error_log = RateLimitedLog(log)
+        self._rate_started = time.monotonic()
+        self._rate_count = 0
+        self.packets_per_sec = 0.0
+
+    def _make_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        except OSError as e:
+            log.warning("⚠️ Could not set SO_BROADCAST on the UDP socket: %s", e)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        except OSError as e:
+            log.warning("⚠️ Could not set SO_RCVBUF to %d: %s", self.rcvbuf, e)
+        # The kernel silently caps this at net.core.rmem_max; report what we really got
+        self.rcvbuf_effective = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        sock.bind((self.host, self.port))
+        sock.setblocking(False)
+        return sock
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        sock = self._make_socket()
+        protocol = SensorDatagramProtocol(self)
+        if self.port == 0:
+            self.port = sock.getsockname()[1]
+        try:
+            self.loop.add_reader(sock.fileno(), protocol.drain, sock)
+            self._sock = sock
+        except NotImplementedError:
+            # Proactor (Windows) loops have no add_reader; use a regular datagram endpoint
+            self._transport, _ = await self.loop.create_datagram_endpoint(lambda: protocol, sock=sock)
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            self.loop.remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _enqueue(self, data, addr, received_at):
+        if len(self._backlog) >= MAX_BACKLOG:
+            self.dropped += 1
+            return
+        if len(data) >= DATAGRAM_SIZE:
+            self.truncated += 1
+        self._backlog.append((data, addr, received_at))
+        if not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon(self._process_batch)
+
+    def _process_batch(self):
+        self._scheduled = False
+        started = time.perf_counter()
+        backlog = self._backlog
+        self._backlog = deque()
+        self.batches += 1
+
+        for data, addr, received_at in backlog:
+            self.packets += 1
+            try:
+                if data and data[0] == SENSOR_MAGIC:
+                    packet = unpack_sensor(data)
+                    self.binary_packets += 1
+                else:
+                    packet = json.loads(data)
+            except ValueError:
+                self.parse_errors += 1
+                continue
+            if not isinstance(packet, dict):
+                self.parse_errors += 1
+                continue
+            try:
+                self.on_packet(packet, addr, received_at)
+            except Exception as e:
+                self.handler_errors += 1
+                # Rate limited: a handler bug hit by every packet must not flood the log
+                self._error_log.warning("⚠️ UDP packet from %s failed: %s: %s", addr[0], type(e).__name__, e)
+
+        self._rate_count += len(backlog)
+        self.batch_histogram.observe(time.perf_counter() - started)
+        now = time.monotonic()
+        elapsed = now - self._rate_started
+        if elapsed >= 1.0:
+            self.packets_per_sec = self._rate_count / elapsed
+            self._rate_started = now
+            self._rate_count = 0
+
+    def stats(self):
+        elapsed = time.monotonic() - self._rate_started
+        # The rate only rolls over when packets arrive; report the live window once it goes quiet
+        rate = self.packets_per_sec if elapsed < 2.0 else self._rate_count / elapsed
+        return {
+            'port': self.port,
+            'rcvbuf_bytes': self.rcvbuf_effective,
+            'packets': self.packets,
+            'binary_packets': self.binary_packets,
+            'packets_per_sec': round(rate, 1),
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'truncated': self.truncated,
+            'parse_errors': self.parse_errors,
+            'handler_errors': self.handler_errors,
+            'socket_errors': self.socket_errors,
+            'backlog': len(self._backlog)
+        }
@@ -0,0 +1,132 @@
+import struct
+from datetime import datetime
+
+# Optional MessagePack support; without it every socket negotiates JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# WebSocket subprotocols, in the server's order of preference. Browsers ask for none and get JSON.
+PROTOCOL_MSGPACK = 'fire.msgpack.v1'
+PROTOCOL_JSON = 'fire.json.v1'
+SUBPROTOCOLS = ((PROTOCOL_MSGPACK,) if msgpack is not None else ()) + (PROTOCOL_JSON,)
+
+# Compact frames carry these as their index instead of the string.
+# Append only: a code's meaning must never change once clients know it.
+FRAME_TYPES = (
+    'connected', 'resumed', 'fire_alert', 'clear_alert', 'broadcast', 'admin_message', 'alert_cleared',
+    'alarm_escalated', 'status_update', 'status_delta', 'sensor_update', 'sensor_snapshot', 'new_user_message',
+    'register_name', 'trigger_alarm', 'clear_alarm'
+)
+FRAME_KEYS = (
+    'type', 'seq', 'stream', 'message', 'timestamp', 'zones', 'source', 'from', 'map_hash', 'map_url',
+    'map_filename', 'status', 'name', 'fcm_token', 'client_id', 'building', 'floor', 'zone', 'replayed', 'gap',
+    'prev', 'upserts', 'removes', 'user_status', 'alert_active', 'alarm_zones', 'connected_clients', 'online',
+    'sensors', 'sensor_id', 'state', 'level', 'peak', 'threshold', 'severity', 'trend', 'rate', 'packets',
+    'first_seen', 'last_seen', 'ip', 'alert_data', 'smoke_level', 'data'
+)
+# ISO-8601 strings under these keys become epoch milliseconds
+TIMESTAMP_KEYS = frozenset(('timestamp',))
+
+_TYPE_CODES = {name: code for code, name in enumerate(FRAME_TYPES)}
+_KEY_CODES = {name: code for code, name in enumerate(FRAME_KEYS)}
+
+# Binary sensor packet (all big-endian): magic, version, packet type, smoke level, threshold,
+# IPv4 address, sensor ID length, then the sensor ID in UTF-8. JSON packets start with '{', never 0xF1.
+SENSOR_MAGIC = 0xF1
+SENSOR_VERSION = 1
+SENSOR_HEADER = struct.Struct('!BBBHH4sB')
+SENSOR_TYPES = ('FIRE_ALERT',)     # Append only, like FRAME_TYPES
+_SENSOR_CODES = {name: code for code, name in enumerate(SENSOR_TYPES)}
+
+
+def _epoch_ms(value):
+    if isinstance(value, str):
+        try:
+            return int(datetime.fromisoformat(value).timestamp() * 1000)
+        except ValueError:
+            pass
+    return value
+
+
+def compact(value):
+    """A frame with known keys and types interned to small ints and ISO timestamps as epoch ms."""
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            if key == 'type':
+                item = _TYPE_CODES.get(item, item)
+            elif key in TIMESTAMP_KEYS:
+                item = _epoch_ms(item)
+            else:
+                item = compact(item)
+            out[_KEY_CODES.get(key, key)] = item
+        return out
+    if isinstance(value, list):
+        return [compact(item) for item in value]
+    return value
+
+
+def expand(value):
+    """Undo `compact` (timestamps stay epoch milliseconds)."""
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            if isinstance(key, int) and 0 <= key < len(FRAME_KEYS):
+                key = FRAME_KEYS[key]
+            if key == 'type':
+                if isinstance(item, int) and 0 <= item < len(FRAME_TYPES):
+                    item = FRAME_TYPES[item]
+            elif key not in TIMESTAMP_KEYS:
+                item = expand(item)
+            out[key] = item
+        return out
+    if isinstance(value, list):
+        return [expand(item) for item in value]
+    return value
+
+
+def encode_binary(message):
+    """A frame for a 'fire.msgpack.v1' socket."""
+    return msgpack.packb(compact(message), use_bin_type=True)
+
+
+def decode_binary(data):
+    """A frame from a 'fire.msgpack.v1' socket; ValueError if it is not valid MessagePack."""
+    if msgpack is None:
+        raise ValueError('MessagePack is not installed')
+    try:
+        return expand(msgpack.unpackb(data, raw=False, strict_map_key=False))
+    except (TypeError, RecursionError) as e:
+        # A map keyed by a list or map (unhashable), or nesting deeper than expand() can follow
+        raise ValueError(f'malformed MessagePack frame: {type(e).__name__}') from None
+
+
+def pack_sensor(packet):
+    """The binary form of a sensor packet dict (what compact firmware sends)."""
+    sensor_id = packet['sensor_id'].encode('utf-8')
+    header = SENSOR_HEADER.pack(SENSOR_MAGIC, SENSOR_VERSION, _SENSOR_CODES[packet['type']],
+                                int(packet['smoke_level']), int(packet['threshold']),
+                                bytes(int(part) for part in packet['ip'].split('.')), len(sensor_id))
+    return header + sensor_id
+
+
+def unpack_sensor(data):
+    """The same dict a JSON sensor packet parses to; ValueError if malformed."""
+    try:
+        magic, version, code, level, threshold, ip, length = SENSOR_HEADER.unpack_from(data)
+    except struct.error as e:
+        raise ValueError(str(e)) from None
+    if magic != SENSOR_MAGIC or version != SENSOR_VERSION or code >= len(SENSOR_TYPES):
+        raise ValueError('not a sensor packet this server understands')
+    sensor_id = data[SENSOR_HEADER.size:SENSOR_HEADER.size + length]
+    if len(sensor_id) != length:
+        raise ValueError('truncated sensor ID')
+    return {
+        'type': SENSOR_TYPES[code],
+        'smoke_level': level,
+        'threshold': threshold,
+        'sensor_id': sensor_id.decode('utf-8'),
+        'ip': '.'.join(map(str, ip))
+    }
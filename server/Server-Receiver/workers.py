@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+
+from backplane import BackplaneHub, SocketBackplane
+
+log = logging.getLogger(__name__)
+
+RESTART_DELAY = 1.0      # Seconds before a crashed worker is started again
+SHUTDOWN_GRACE = 5.0     # Seconds workers get to close their sockets
+
+
+def _worker_main(make_server, worker_id, hub_path):
+    server = make_server(worker_id, SocketBackplane(hub_path, worker_id))
+    server.run(reuse_port=True)
+
+
+class WorkerPool:
+    """Supervisor for N server processes sharing one HTTP port.
+
+    Each worker binds the port with SO_REUSEPORT, so the kernel spreads new
+    connections across them. Workers coordinate through a BackplaneHub on a
+    Unix socket owned by this process. `make_server(worker_id, backplane)`
+    builds each worker's FireEmergencyServer; workers are forked so the
+    factory need not be picklable. A worker that dies is restarted.
+    """
+
+    def __init__(self, make_server, count, hub_path=None):
+        self.make_server = make_server
+        self.count = count
+        self.hub_path = hub_path or os.path.join(tempfile.mkdtemp(prefix='fire-backplane-'), 'hub.sock')
+        self._context = multiprocessing.get_context('fork')
+        self.processes = {}
+        self.restarts = 0
+
+    def _start_worker(self, worker_id):
+        process = self._context.Process(target=_worker_main, name=f'fire-worker-{worker_id}',
+                                        args=(self.make_server, worker_id, self.hub_path))
+        process.start()
+        self.processes[worker_id] = process
+        log.info("✓ Worker %s started (pid %s)", worker_id, process.pid)
+
+    async def _supervise(self):
+        # Fork before the hub exists so workers inherit no event loop state; they retry until it is up
+        for worker_id in range(self.count):
+            self._start_worker(worker_id)
+        hub = await BackplaneHub(self.hub_path).start()
+        log.info("✓ Backplane hub listening on %s", self.hub_path)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        try:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), RESTART_DELAY)
+                except asyncio.TimeoutError:
+                    pass
+                for worker_id, process in list(self.processes.items()):
+                    if process.exitcode is not None and not stop.is_set():
+                        log.warning("⚠️ Worker %s exited with %s, restarting", worker_id, process.exitcode)
+                        self.restarts += 1
+                        self._start_worker(worker_id)
+        finally:
+            await asyncio.to_thread(self.stop)
+            await hub.close()
+
+    def stop(self):
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()  # aiohttp's run_app shuts down cleanly on SIGTERM
+        for process in self.processes.values():
+            process.join(SHUTDOWN_GRACE)
+            if process.is_alive():
+                process.kill()
+
+    def run(self):
+        log.info("✓ Starting %d workers", self.count)
+        asyncio.run(self._supervise())
+        try:
+            os.unlink(self.hub_path)
+        except OSError:
+            pass
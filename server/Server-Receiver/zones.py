@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+SEPARATOR = '/'
+ESCALATE_AFTER = 60.0     # Seconds a sensor alarm stays in its own zone before neighbours are paged
+ESCALATE_SEVERITY = 2     # Severity band at which neighbours are paged at once
+# Frames that also reach sockets whose location is unknown: nobody misses a fire because they never said where they are
+UNPLACED_TYPES = ('fire_alert', 'clear_alert')
+
+
+def area_path(building=None, floor=None, zone=None):
+    """'building/floor/zone' from whichever parts are known; a `zone` containing '/' is taken as a full path."""
+    if zone is not None and SEPARATOR in str(zone):
+        return normalize(zone)
+    parts = [str(part).strip() for part in (building, floor, zone) if part not in (None, '')]
+    return SEPARATOR.join(parts) or None
+
+
+def normalize(area):
+    if area is None:
+        return None
+    parts = [part.strip() for part in str(area).split(SEPARATOR) if part.strip()]
+    return SEPARATOR.join(parts) or None
+
+
+def prefixes(area):
+    """'A/3/east' -> ['A', 'A/3', 'A/3/east']"""
+    parts = area.split(SEPARATOR)
+    return [SEPARATOR.join(parts[:depth]) for depth in range(1, len(parts) + 1)]
+
+
+def covers(outer, inner):
+    """True if `inner` lies within (or is) `outer`."""
+    return inner == outer or inner.startswith(outer + SEPARATOR)
+
+
+class AudienceIndex:
+    """Members (socket or stable IDs) by area, precomputed so a targeted send costs O(audience).
+
+    A member placed at 'A/3/east' is filed under 'A', 'A/3' and 'A/3/east'.
+    Targeting an area reaches everyone placed at or below it, plus anyone
+    placed only at a coarser level above it (someone known to be "in
+    building A" is in every part of A as far as we can tell). Members with
+    no area at all are kept in `unplaced` and are included on request.
+    """
+
+    def __init__(self):
+        self._under = {}       # area -> members placed at or below it
+        self._exact = {}       # area -> members placed exactly there
+        self._placed = {}      # member -> tuple of areas
+        self.unplaced = set()
+
+    def __len__(self):
+        return len(self._placed) + len(self.unplaced)
+
+    def place(self, member, areas=None):
+        """(Re)file `member` under `areas` (one area or a list); None makes it unplaced."""
+        if isinstance(areas, str):
+            areas = (areas,)
+        areas = tuple(sorted({normalize(area) for area in areas or () if normalize(area)}))
+        if self._placed.get(member, ()) == areas and (areas or member in self.unplaced):
+            return
+        self.remove(member)
+        if not areas:
+            self.unplaced.add(member)
+            return
+        self._placed[member] = areas
+        for area in areas:
+            self._exact.setdefault(area, set()).add(member)
+            for prefix in prefixes(area):
+                self._under.setdefault(prefix, set()).add(member)
+
+    def remove(self, member):
+        self.unplaced.discard(member)
+        for area in self._placed.pop(member, ()):
+            _discard(self._exact, area, member)
+            for prefix in prefixes(area):
+                _discard(self._under, prefix, member)
+
+    def area_of(self, member):
+        return self._placed.get(member, ())
+
+    def resolve(self, targets, include_unplaced=False):
+        """Every member a send to `targets` reaches."""
+        audience = set()
+        for target in targets:
+            target = normalize(target)
+            if target is None:
+                continue
+            audience |= self._under.get(target, set())
+            for prefix in prefixes(target)[:-1]:
+                audience |= self._exact.get(prefix, set())
+        if include_unplaced:
+            audience |= self.unplaced
+        return audience
+
+    def counts(self):
+        """Members at or below each area that has any."""
+        return {area: len(members) for area, members in sorted(self._under.items())}
+
+
+def _discard(index, key, member):
+    members = index.get(key)
+    if members is not None:
+        members.discard(member)
+        if not members:
+            del index[key]
+
+
+def reaches(targets, area, include_unplaced=False):
+    """Whether a send to `targets` reaches a member at `area` (same rule as AudienceIndex.resolve)."""
+    if targets is None:
+        return True
+    if area is None:
+        return include_unplaced
+    return any(covers(target, area) or covers(area, target) for target in map(normalize, targets) if target)
+
+
+class ZoneMap:
+    """Site layout: which zones neighbour which, and where each sensor is.
+
+    Loaded from a JSON file such as:
+
+        {"zones": {"A/3/east": ["A/3/west", "A/4/east"]},
+         "sensors": {"ROOM_301_SENSOR": "A/3/east"}}
+
+    A zone without listed neighbours escalates to the rest of its floor and
+    the floors directly above and below. Sensors not in the file can say
+    where they are in their packets (`zone`, or `building`/`floor`/`zone`);
+    a sensor with no known location raises a site-wide alarm as before.
+    """
+
+    def __init__(self, zones=None, sensors=None):
+        self.neighbour_map = {normalize(zone): [normalize(other) for other in others]
+                              for zone, others in (zones or {}).items()}
+        self.sensor_zones = {sensor_id: normalize(zone) for sensor_id, zone in (sensors or {}).items()}
+
+    @classmethod
+    def load(cls, path):
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path, encoding='utf-8') as f:
+            layout = json.load(f)
+        zone_map = cls(layout.get('zones'), layout.get('sensors'))
+        log.info("✓ Zone map loaded: %d zone(s), %d sensor(s)", len(zone_map.neighbour_map), len(zone_map.sensor_zones))
+        return zone_map
+
+    def locate_sensor(self, packet):
+        """Area of the sensor that sent `packet`, or None if unknown."""
+        area = area_path(packet.get('building'), packet.get('floor'), packet.get('zone'))
+        return area or self.sensor_zones.get(packet.get('sensor_id'))
+
+    def neighbours(self, area):
+        """Areas an alarm in `area` escalates to."""
+        listed = self.neighbour_map.get(area)
+        if listed is not None:
+            return list(listed)
+        parts = area.split(SEPARATOR)
+        if len(parts) < 2:
+            return []   # A whole building has no neighbours we know of
+        building, floor = parts[0], parts[1]
+        result = [SEPARATOR.join((building, floor))] if len(parts) > 2 else []
+        try:
+            level = int(floor)
+        except ValueError:
+            return result
+        return result + [SEPARATOR.join((building, str(level + step))) for step in (1, -1)]
+
+    def to_dict(self):
+        return {'zones': self.neighbour_map, 'sensors': self.sensor_zones}
+
+
+def parse_targets(value):
+    """Zones from a request: a list or a comma-separated string; None (everyone) if empty.
+
+    ValueError for anything else (a number, an object, a list holding non-strings).
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    elif not isinstance(value, (list, tuple)) or not all(isinstance(area, str) for area in value):
+        raise ValueError('zones must be a string or a list of strings')
+    targets = sorted({normalize(area) for area in value if normalize(area)})
+    return targets or None